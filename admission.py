@@ -0,0 +1,203 @@
+import collections
+import math
+import threading
+import time
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job cannot be admitted; retry_after is a suggested wait in seconds"""
+
+    MESSAGES = {
+        'session': 'You already have translations running; please wait for them to finish',
+        'busy': 'The server is busy; please try again shortly',
+        'backend': 'The translation service is struggling; please try again shortly',
+    }
+
+    def __init__(self, reason, retry_after):
+        super().__init__(self.MESSAGES.get(reason, 'Too many requests'))
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """Capacity held by one admitted job until release()"""
+
+    def __init__(self, controller, session_id, chars):
+        self.controller = controller
+        self.session_id = session_id
+        self.chars = chars
+        self.admitted_at = time.monotonic()
+        self.released = False
+
+    def resize(self, chars):
+        """Replace the estimated character cost with the actual one"""
+        self.controller._resize(self, chars)
+
+    def release(self):
+        """Return the job's capacity; safe to call more than once"""
+        self.controller._release(self)
+
+
+class AdmissionController:
+    """Bounds the work a process accepts: jobs in flight, characters in flight and jobs per session
+
+    Requests over capacity wait in a bounded FIFO for up to max_wait
+    seconds; when the wait queue is full, or the wait runs out, they are
+    rejected with a Retry-After estimated from recent job durations.
+    Uploads are admitted before their body is read, on a character cost
+    estimated from the request size (estimate_chars), and resized once the
+    text has been extracted. While
+    the translation backend is failing (health() reports the recent error
+    rate), the job limit shrinks in proportion so a struggling backend is
+    not buried under retries.
+    """
+
+    def __init__(self, max_jobs=16, max_chars=2000000, max_session_jobs=2, max_waiting=8, max_wait=30.0,
+                 degraded_error_rate=0.2, health=None, chars_per_byte=0.3):
+        self.max_jobs = max_jobs
+        self.max_chars = max_chars
+        self.max_session_jobs = max_session_jobs
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.degraded_error_rate = degraded_error_rate
+        self.health = health
+        self.chars_per_byte = chars_per_byte
+        self._condition = threading.Condition()
+        self._waiters = collections.deque()
+        self._sessions = collections.Counter()
+        self.in_flight = 0
+        self.chars_in_flight = 0
+        # Exponentially weighted job duration, seeds Retry-After before any job has finished
+        self.avg_job_seconds = 10.0
+
+        # Metrics
+        self.accepted = 0
+        self.parked = 0
+        self.rejected = collections.Counter()
+        self.max_waiting_seen = 0
+
+    def job_limit(self):
+        """Jobs allowed in flight, reduced while the backend is failing"""
+        error_rate = self._error_rate()
+        if error_rate >= self.degraded_error_rate:
+            return max(1, int(self.max_jobs * (1.0 - error_rate)))
+        return self.max_jobs
+
+    def _error_rate(self):
+        if self.health is None:
+            return 0.0
+        try:
+            return self.health() or 0.0
+        except Exception:
+            return 0.0
+
+    def estimate_chars(self, content_length):
+        """Character cost of an upload whose text is not known yet, from its size in bytes"""
+        return int((content_length or 0) * self.chars_per_byte)
+
+    def admit(self, session_id, chars, on_wait=None):
+        """Reserve capacity for a job, waiting in the bounded queue if needed; returns an AdmissionTicket
+
+        on_wait(position) is called when the request has to wait.
+        """
+        with self._condition:
+            if self.max_session_jobs and self._sessions[session_id] >= self.max_session_jobs:
+                self._reject('session', self.avg_job_seconds)
+            if not self._waiters and self._fits(chars):
+                return self._take(session_id, chars)
+            if len(self._waiters) >= self.max_waiting:
+                self._reject(self._busy_reason(), self._retry_after(chars))
+
+            waiter = object()
+            self._waiters.append(waiter)
+            self.parked += 1
+            self.max_waiting_seen = max(self.max_waiting_seen, len(self._waiters))
+            if on_wait is not None:
+                on_wait(len(self._waiters))
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while not (self._waiters[0] is waiter and self._fits(chars)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject(self._busy_reason(), self._retry_after(chars))
+                    # Backend health can recover without a release, so re-check periodically
+                    self._condition.wait(min(remaining, 1.0))
+                return self._take(session_id, chars)
+            finally:
+                self._waiters.remove(waiter)
+                self._condition.notify_all()
+
+    def _fits(self, chars):
+        if self.max_jobs and self.in_flight >= self.job_limit():
+            return False
+        # A single document larger than the budget is admitted on its own rather than never
+        if self.max_chars and self.chars_in_flight and self.chars_in_flight + chars > self.max_chars:
+            return False
+        return True
+
+    def _take(self, session_id, chars):
+        self.in_flight += 1
+        self.chars_in_flight += chars
+        self._sessions[session_id] += 1
+        self.accepted += 1
+        return AdmissionTicket(self, session_id, chars)
+
+    def _resize(self, ticket, chars):
+        with self._condition:
+            if ticket.released:
+                return
+            self.chars_in_flight += chars - ticket.chars
+            ticket.chars = chars
+            # A smaller actual cost can let a waiting request in
+            self._condition.notify_all()
+
+    def _release(self, ticket):
+        with self._condition:
+            if ticket.released:
+                return
+            ticket.released = True
+            self.in_flight -= 1
+            self.chars_in_flight -= ticket.chars
+            self._sessions[ticket.session_id] -= 1
+            if self._sessions[ticket.session_id] <= 0:
+                del self._sessions[ticket.session_id]
+            duration = time.monotonic() - ticket.admitted_at
+            self.avg_job_seconds = 0.8 * self.avg_job_seconds + 0.2 * duration
+            self._condition.notify_all()
+
+    def _busy_reason(self):
+        return 'backend' if self._error_rate() >= self.degraded_error_rate else 'busy'
+
+    def _retry_after(self, chars=0):
+        """Seconds until enough capacity is likely free: queued jobs drain at limit/avg duration per second"""
+        ahead = len(self._waiters) + 1
+        estimate = self.avg_job_seconds * ahead / max(1, self.job_limit())
+        if self.max_chars and self.chars_in_flight + chars > self.max_chars:
+            # The character budget frees up as running jobs finish, at roughly one average job duration
+            estimate = max(estimate, self.avg_job_seconds)
+        return min(300, max(1, math.ceil(estimate)))
+
+    def _reject(self, reason, retry_after):
+        """Count and raise a rejection (lock must be held)"""
+        self.rejected[reason] += 1
+        raise AdmissionRejected(reason, min(300, max(1, math.ceil(retry_after))))
+
+    def stats(self):
+        with self._condition:
+            return {
+                'in_flight': self.in_flight,
+                'job_limit': self.job_limit(),
+                'max_jobs': self.max_jobs,
+                'chars_in_flight': self.chars_in_flight,
+                'max_chars': self.max_chars,
+                'waiting': len(self._waiters),
+                'max_waiting': self.max_waiting,
+                'max_waiting_seen': self.max_waiting_seen,
+                'sessions': len(self._sessions),
+                'accepted': self.accepted,
+                'parked': self.parked,
+                'rejected': dict(self.rejected),
+                'backend_error_rate': round(self._error_rate(), 3),
+                'avg_job_s': round(self.avg_job_seconds, 2),
+                'retry_after_s': self._retry_after(),
+            }
@@ -1,9 +1,16 @@
+import io
 import os
+import sys
 import logging
-from flask import Flask
+from flask import Flask, Request
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from history_writer import HistoryWriter
+from progress import ProgressTracker
+from profiling import JobProfiler
+from cancellation import CancellationRegistry
+from admission import AdmissionController
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -11,10 +18,25 @@ logging.basicConfig(level=logging.DEBUG)
 class Base(DeclarativeBase):
     pass
 
+
+class UploadRequest(Request):
+    """Request that keeps small file uploads in a BytesIO
+
+    werkzeug parses every upload into a SpooledTemporaryFile; the in-memory
+    upload path needs a BytesIO it can take the buffer of without copying.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= app.config['SMALL_UPLOAD_BYTES']:
+            return io.BytesIO()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
 db = SQLAlchemy(model_class=Base)
 
 # Create the app
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
@@ -23,6 +45,11 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['DOWNLOAD_FOLDER'] = 'downloads'
 
+# Uploads up to this size are processed in memory, without disk round trips (0 disables)
+app.config['SMALL_UPLOAD_BYTES'] = int(os.environ.get("SMALL_UPLOAD_BYTES", 500 * 1024))
+# Seconds a download waits for a result another worker is still persisting
+app.config['DOWNLOAD_PENDING_WAIT'] = float(os.environ.get("DOWNLOAD_PENDING_WAIT", 2.0))
+
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
@@ -30,8 +57,106 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
 }
 
+# Configure write-behind batching for history inserts
+app.config['HISTORY_QUEUE_SIZE'] = int(os.environ.get("HISTORY_QUEUE_SIZE", 1000))
+app.config['HISTORY_BATCH_SIZE'] = int(os.environ.get("HISTORY_BATCH_SIZE", 50))
+app.config['HISTORY_FLUSH_INTERVAL'] = float(os.environ.get("HISTORY_FLUSH_INTERVAL", 1.0))
+
+# Post-render PDF compaction (object dedup, stream compression, object streams)
+app.config['PDF_COMPACT'] = os.environ.get("PDF_COMPACT", "1") == "1"
+
+# Artifact storage: disk quota and eviction for translated PDFs (0 disables a limit)
+app.config['ARTIFACT_QUOTA_MB'] = int(os.environ.get("ARTIFACT_QUOTA_MB", 0))
+app.config['ARTIFACT_MAX_AGE_HOURS'] = float(os.environ.get("ARTIFACT_MAX_AGE_HOURS", 0))
+app.config['ARTIFACT_PROTECT_HOURS'] = float(os.environ.get("ARTIFACT_PROTECT_HOURS", 24))
+app.config['ARTIFACT_JANITOR_INTERVAL'] = int(os.environ.get("ARTIFACT_JANITOR_INTERVAL", 300))
+
+# Background jobs and fast preview of the first pages
+app.config['JOB_WORKERS'] = int(os.environ.get("JOB_WORKERS", 2))
+app.config['SCHEDULER_SMALL_COST'] = float(os.environ.get("SCHEDULER_SMALL_COST", 10))
+app.config['SCHEDULER_LARGE_COST'] = float(os.environ.get("SCHEDULER_LARGE_COST", 100))
+app.config['SCHEDULER_AGING_RATE'] = float(os.environ.get("SCHEDULER_AGING_RATE", 1.0))
+app.config['PREVIEW_PAGES'] = int(os.environ.get("PREVIEW_PAGES", 2))
+app.config['PREVIEW_CHARS'] = int(os.environ.get("PREVIEW_CHARS", 6000))
+
+# Job distribution: 'local' runs jobs on this process's scheduler, 'db' queues them in the
+# database for any host's workers (`flask --app main queue-worker`); leases and heartbeats in seconds
+app.config['JOB_QUEUE'] = os.environ.get("JOB_QUEUE", "local")
+app.config['JOB_QUEUE_EMBEDDED'] = os.environ.get("JOB_QUEUE_EMBEDDED", "1") == "1"
+app.config['JOB_LEASE'] = float(os.environ.get("JOB_LEASE", 60))
+app.config['JOB_HEARTBEAT'] = float(os.environ.get("JOB_HEARTBEAT", 10))
+app.config['JOB_MAX_ATTEMPTS'] = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+app.config['JOB_QUEUE_POLL'] = float(os.environ.get("JOB_QUEUE_POLL", 1.0))
+
+# Cancellation: per-job deadline in seconds (0 disables) and stopping jobs whose page was closed
+app.config['JOB_DEADLINE'] = float(os.environ.get("JOB_DEADLINE", 0))
+app.config['CANCEL_ON_DISCONNECT'] = os.environ.get("CANCEL_ON_DISCONNECT", "1") == "1"
+app.config['DISCONNECT_GRACE'] = float(os.environ.get("DISCONNECT_GRACE", 10))
+
+# Admission control: per-process limits on accepted work, with a bounded wait queue (0 disables a limit)
+app.config['ADMISSION_MAX_JOBS'] = int(os.environ.get("ADMISSION_MAX_JOBS", 16))
+app.config['ADMISSION_MAX_CHARS'] = int(os.environ.get("ADMISSION_MAX_CHARS", 2000000))
+app.config['ADMISSION_SESSION_JOBS'] = int(os.environ.get("ADMISSION_SESSION_JOBS", 2))
+app.config['ADMISSION_MAX_WAITING'] = int(os.environ.get("ADMISSION_MAX_WAITING", 8))
+app.config['ADMISSION_MAX_WAIT'] = float(os.environ.get("ADMISSION_MAX_WAIT", 30))
+app.config['ADMISSION_DEGRADED_ERROR_RATE'] = float(os.environ.get("ADMISSION_DEGRADED_ERROR_RATE", 0.2))
+app.config['ADMISSION_CHARS_PER_BYTE'] = float(os.environ.get("ADMISSION_CHARS_PER_BYTE", 0.3))
+
+# Local source-language detection: characters sampled from the start of each page
+app.config['LANG_DETECT_SAMPLE_CHARS'] = int(os.environ.get("LANG_DETECT_SAMPLE_CHARS", 2000))
+
+# Opt-in profiling: operators send PROFILE_HEADER with PROFILING_TOKEN, or 1-in-N jobs are sampled
+app.config['PROFILING_ENABLED'] = os.environ.get("PROFILING_ENABLED", "0") == "1"
+app.config['PROFILING_TOKEN'] = os.environ.get("PROFILING_TOKEN")
+app.config['PROFILING_SAMPLE_RATE'] = int(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+app.config['PROFILING_SAMPLE_MEMORY'] = os.environ.get("PROFILING_SAMPLE_MEMORY", "0") == "1"
+app.config['PROFILE_DIR'] = os.environ.get("PROFILE_DIR", "profiles")
+app.config['PROFILE_HEADER'] = 'X-Profile-Token'
+
+# Per-job span timelines, stored with history; the slow-job view is only served when ADMIN_TOKEN is set
+app.config['JOB_TRACE'] = os.environ.get("JOB_TRACE", "1") == "1"
+app.config['ADMIN_TOKEN'] = os.environ.get("ADMIN_TOKEN")
+app.config['ADMIN_HEADER'] = 'X-Admin-Token'
+
+# Configure progress streaming (Server-Sent Events)
+app.config['PROGRESS_HEARTBEAT'] = float(os.environ.get("PROGRESS_HEARTBEAT", 15))
+app.config['PROGRESS_TTL'] = int(os.environ.get("PROGRESS_TTL", 600))
+app.config['PROGRESS_STREAM_WINDOW'] = float(os.environ.get("PROGRESS_STREAM_WINDOW", 30))
+
+
+def backend_error_rate():
+    """Recent translation backend error rate, without importing the client before first use"""
+    client_module = sys.modules.get('translation_client')
+    return client_module.translation_error_rate() if client_module is not None else 0.0
+
+
 # Initialize the app with the extension
 db.init_app(app)
+history_writer = HistoryWriter(app, db)
+progress_tracker = ProgressTracker(ttl=app.config['PROGRESS_TTL'])
+cancellations = CancellationRegistry(
+    deadline=app.config['JOB_DEADLINE'],
+    disconnect_grace=app.config['DISCONNECT_GRACE'],
+    cancel_on_disconnect=app.config['CANCEL_ON_DISCONNECT'],
+    listeners=progress_tracker.listeners
+)
+admission = AdmissionController(
+    max_jobs=app.config['ADMISSION_MAX_JOBS'],
+    max_chars=app.config['ADMISSION_MAX_CHARS'],
+    max_session_jobs=app.config['ADMISSION_SESSION_JOBS'],
+    max_waiting=app.config['ADMISSION_MAX_WAITING'],
+    max_wait=app.config['ADMISSION_MAX_WAIT'],
+    degraded_error_rate=app.config['ADMISSION_DEGRADED_ERROR_RATE'],
+    health=backend_error_rate,
+    chars_per_byte=app.config['ADMISSION_CHARS_PER_BYTE']
+)
+job_profiler = JobProfiler(
+    output_dir=app.config['PROFILE_DIR'],
+    enabled=app.config['PROFILING_ENABLED'],
+    token=app.config['PROFILING_TOKEN'],
+    sample_rate=app.config['PROFILING_SAMPLE_RATE'],
+    sample_memory=app.config['PROFILING_SAMPLE_MEMORY']
+)
 
 # Create upload and download directories if they don't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -41,6 +166,22 @@ with app.app_context():
     # Import models and routes
     import models
     import routes
+
+
+def init_db():
+    """Create all database tables
     
-    # Create all database tables
-    db.create_all()
+    Kept out of the import path so workers start without a schema round trip;
+    called by the gunicorn on_starting hook, run_local.py and `flask init-db`.
+    """
+    with app.app_context():
+        db.create_all()
+        # Do not hand pooled connections from a pre-fork master to workers
+        db.engine.dispose()
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create all database tables"""
+    init_db()
+    print("Database initialized")
@@ -0,0 +1,385 @@
+import concurrent.futures
+import contextlib
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process runs its own janitor
+    fcntl = None
+
+
+class ArtifactStore:
+    """Hash-sharded storage for uploads and translated PDFs
+
+    An artifact named ``translated_<uuid>_report.pdf`` lives at
+    ``<kind dir>/<h[0:2]>/<h[2:4]>/translated_<uuid>_report.pdf`` where ``h``
+    is the SHA-1 of the name, so no directory grows past a few hundred
+    entries. The hash only spreads names over shards; the store is not
+    content-addressed, and writing a name again replaces its file. Writes
+    go to a hidden temp file in the same shard and are renamed into place,
+    so readers never see a partial PDF.
+
+    A background janitor removes stale temp files and orphaned uploads, and
+    evicts downloads that are past the maximum age or, least recently used
+    first, while the store is over its quota. Artifacts named by the
+    ``protected`` callback (recent history rows) are never evicted.
+    """
+
+    TEMP_PREFIX = '.'
+
+    def __init__(self, directories, quota_bytes=0, max_age=0, min_age=300, upload_ttl=6 * 3600,
+                 janitor_interval=300, protected=None, app=None):
+        self.directories = dict(directories)
+        self.quota_bytes = quota_bytes
+        self.max_age = max_age
+        self.min_age = min_age
+        self.upload_ttl = upload_ttl
+        self.janitor_interval = janitor_interval
+        self.protected = protected
+        self.app = app
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._pid = None
+        # Artifacts held in memory until the background writer has persisted them
+        self._pending = {}
+        self._writer = None
+        self._writer_pid = None
+
+        # Metrics
+        self.usage = {kind: {'files': 0, 'bytes': 0} for kind in self.directories}
+        self.writes = 0
+        self.async_writes = 0
+        self.async_failed = 0
+        self.pending_hits = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.expired_files = 0
+        self.orphans_removed = 0
+        self.temps_removed = 0
+        self.protected_files = 0
+        self.scans = 0
+        self.last_scan_at = None
+        self.last_scan_ms = 0.0
+
+        for directory in self.directories.values():
+            os.makedirs(directory, exist_ok=True)
+
+    def _shard(self, kind, name):
+        if os.path.basename(name) != name or name.startswith(self.TEMP_PREFIX):
+            raise ValueError(f"Invalid artifact name: {name!r}")
+        digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+        return os.path.join(self.directories[kind], digest[:2], digest[2:4])
+
+    def path(self, kind, name):
+        """Sharded path of an artifact (its directory is created if needed)"""
+        shard = self._shard(kind, name)
+        os.makedirs(shard, exist_ok=True)
+        return os.path.join(shard, name)
+
+    @contextlib.contextmanager
+    def writing(self, kind, name):
+        """Yield a temp path to write the artifact to; it is renamed into place on success"""
+        self._ensure_janitor()
+        final_path = self.path(kind, name)
+        temp_path = os.path.join(os.path.dirname(final_path), f"{self.TEMP_PREFIX}{name}.{uuid.uuid4().hex}.tmp")
+        try:
+            yield temp_path
+            try:
+                replaced = os.path.getsize(final_path)
+            except FileNotFoundError:
+                replaced = None
+            os.replace(temp_path, final_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.writes += 1
+        with self._lock:
+            # A rewrite (a requeued job, a retried preview) replaces the old file rather than adding one
+            if replaced is None:
+                self.usage[kind]['files'] += 1
+            self.usage[kind]['bytes'] += os.path.getsize(final_path) - (replaced or 0)
+
+    def save(self, kind, name, file_storage):
+        """Atomically store an uploaded file (anything with a save(path) method); returns its path"""
+        with self.writing(kind, name) as temp_path:
+            file_storage.save(temp_path)
+        return self.path(kind, name)
+
+    def put_async(self, kind, name, data):
+        """Keep an artifact's bytes readable from memory and persist them in the background"""
+        with self._lock:
+            self._pending[(kind, name)] = data
+            if self._writer is None or self._writer_pid != os.getpid():
+                self._writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='artifact-writer')
+                self._writer_pid = os.getpid()
+            writer = self._writer
+        writer.submit(self._persist, kind, name, data)
+
+    def _persist(self, kind, name, data):
+        try:
+            with self.writing(kind, name) as temp_path:
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+            self.async_writes += 1
+        except Exception as e:
+            self.async_failed += 1
+            logging.error(f"Could not persist {kind}/{name}: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop((kind, name), None)
+
+    def pending_data(self, kind, name):
+        """Bytes of an artifact that is not on disk yet, or None"""
+        with self._lock:
+            data = self._pending.get((kind, name))
+        if data is not None:
+            self.pending_hits += 1
+        return data
+
+    def wait_for(self, kind, name, timeout):
+        """Poll for an artifact another process is still persisting; returns its path or None"""
+        deadline = time.monotonic() + timeout
+        while True:
+            path = self.find(kind, name)
+            if path is not None or time.monotonic() >= deadline:
+                return path
+            time.sleep(0.05)
+
+    def find(self, kind, name):
+        """Path of an existing artifact, or None; marks it as recently used
+
+        Files from before sharding are still found at the top of the kind's directory.
+        """
+        try:
+            candidates = (os.path.join(self._shard(kind, name), name), os.path.join(self.directories[kind], name))
+        except ValueError:
+            return None
+        for candidate in candidates:
+            try:
+                # Access time drives LRU eviction; many filesystems do not update it on read
+                os.utime(candidate, (time.time(), os.stat(candidate).st_mtime))
+                return candidate
+            except FileNotFoundError:
+                continue
+        return None
+
+    def delete(self, path):
+        """Remove an artifact by path, if it exists"""
+        if path is None:
+            return False
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        kind = self._kind_of(path)
+        if kind is not None:
+            with self._lock:
+                self.usage[kind]['files'] = max(0, self.usage[kind]['files'] - 1)
+                self.usage[kind]['bytes'] = max(0, self.usage[kind]['bytes'] - size)
+        return True
+
+    def _kind_of(self, path):
+        path = os.path.abspath(path)
+        for kind, directory in self.directories.items():
+            if path.startswith(os.path.abspath(directory) + os.sep):
+                return kind
+        return None
+
+    def _ensure_janitor(self):
+        """Start the janitor thread lazily (and again after a fork)"""
+        if self.janitor_interval <= 0:
+            return
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run_janitor, name='artifact-janitor', daemon=True)
+            self._thread.start()
+
+    def _run_janitor(self):
+        # First pass soon after startup so usage stats are accurate early on
+        wait = min(5.0, self.janitor_interval)
+        while not self._stop_event.wait(wait):
+            try:
+                self.collect()
+            except Exception as e:
+                logging.error(f"Artifact janitor failed: {e}")
+            wait = self.janitor_interval
+
+    def stop(self):
+        self._stop_event.set()
+
+    @contextlib.contextmanager
+    def _janitor_lock(self):
+        """Hold a lock file so only one process sweeps the store at a time; yields False if busy"""
+        if fcntl is None:
+            yield True
+            return
+        lock_path = os.path.join(self.directories[next(iter(self.directories))], '.janitor.lock')
+        with open(lock_path, 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _protected_names(self):
+        if self.protected is None:
+            return set()
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    return set(self.protected())
+            return set(self.protected())
+        except Exception as e:
+            # Without the list nothing may be evicted safely; only temp and orphan cleanup runs
+            logging.warning(f"Could not load protected artifacts, skipping eviction: {e}")
+            return None
+
+    def _scan(self):
+        """Every file in the store as (kind, path, name, size, last used, modified)"""
+        entries = []
+        for kind, directory in self.directories.items():
+            for dirpath, _, filenames in os.walk(directory):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((kind, path, name, st.st_size, max(st.st_atime, st.st_mtime), st.st_mtime))
+        return entries
+
+    def collect(self):
+        """One janitor pass: clean up, recount usage and evict; returns the files removed"""
+        with self._janitor_lock() as acquired:
+            if not acquired:
+                return 0
+            start_time = time.perf_counter()
+            now = time.time()
+            removed = 0
+            live = []
+            for entry in self._scan():
+                kind, path, name, size, used, modified = entry
+                if name == '.janitor.lock':
+                    continue
+                if name.startswith(self.TEMP_PREFIX):
+                    # Temp files from crashed writers
+                    if now - modified > 3600 and self._remove(path):
+                        self.temps_removed += 1
+                        removed += 1
+                    continue
+                if kind == 'uploads' and now - modified > self.upload_ttl:
+                    # Jobs delete their upload when they finish; anything this old was orphaned
+                    if self._remove(path):
+                        self.orphans_removed += 1
+                        removed += 1
+                    continue
+                live.append(entry)
+
+            removed += self._evict(live, now)
+
+            usage = {kind: {'files': 0, 'bytes': 0} for kind in self.directories}
+            for kind, path, name, size, used, modified in live:
+                if os.path.exists(path):
+                    usage[kind]['files'] += 1
+                    usage[kind]['bytes'] += size
+            with self._lock:
+                self.usage = usage
+
+            self.scans += 1
+            self.last_scan_at = now
+            self.last_scan_ms = (time.perf_counter() - start_time) * 1000
+            if removed:
+                logging.info(f"Artifact janitor removed {removed} file(s) in {self.last_scan_ms:.1f}ms")
+            return removed
+
+    def _evict(self, entries, now):
+        """Remove expired downloads, then least recently used ones until under quota"""
+        if not self.max_age and not self.quota_bytes:
+            return 0
+        protected = self._protected_names()
+        if protected is None:
+            return 0
+
+        removed = 0
+        protected_files = 0
+        total = sum(entry[3] for entry in entries)
+        candidates = []
+        for entry in entries:
+            kind, path, name, size, used, modified = entry
+            if kind != 'downloads' or now - modified < self.min_age:
+                continue
+            if name in protected:
+                protected_files += 1
+                continue
+            if self.max_age and now - used > self.max_age:
+                if self._remove(path):
+                    self.expired_files += 1
+                    self.evicted_bytes += size
+                    total -= size
+                    removed += 1
+                continue
+            candidates.append(entry)
+
+        if self.quota_bytes and total > self.quota_bytes:
+            for kind, path, name, size, used, modified in sorted(candidates, key=lambda entry: entry[4]):
+                if total <= self.quota_bytes:
+                    break
+                if self._remove(path):
+                    self.evicted_files += 1
+                    self.evicted_bytes += size
+                    total -= size
+                    removed += 1
+            if total > self.quota_bytes:
+                logging.warning(f"Artifact store still over quota ({total} > {self.quota_bytes} bytes); "
+                                f"remaining files are recent or referenced by recent history")
+        self.protected_files = protected_files
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def stats(self):
+        with self._lock:
+            usage = {kind: dict(counts) for kind, counts in self.usage.items()}
+        total = sum(counts['bytes'] for counts in usage.values())
+        return {
+            'usage': usage,
+            'total_bytes': total,
+            'quota_bytes': self.quota_bytes,
+            'quota_used_percent': round(100.0 * total / self.quota_bytes, 1) if self.quota_bytes else None,
+            'writes': self.writes,
+            'pending_writes': len(self._pending),
+            'async_writes': self.async_writes,
+            'async_failed': self.async_failed,
+            'pending_hits': self.pending_hits,
+            'evicted_files': self.evicted_files,
+            'expired_files': self.expired_files,
+            'evicted_bytes': self.evicted_bytes,
+            'orphans_removed': self.orphans_removed,
+            'temps_removed': self.temps_removed,
+            'protected_files': self.protected_files,
+            'scans': self.scans,
+            'last_scan_at': self.last_scan_at,
+            'last_scan_ms': round(self.last_scan_ms, 1),
+        }
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: hedged requests and backend failover in the pooled translation client.
+
+Two local stub backends add a long delay to a small share of requests. Chunks
+are translated one at a time from several threads, with hedging off, hedged
+against the same backend and hedged against a secondary backend. Reports
+per-chunk p50/p99 latency and the extra backend requests hedging costs.
+
+    python benchmarks/bench_hedging.py --chunks 600 --tail-ms 1000 --tail-prob 0.02
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from stub_backend import start_stub_backend
+from translation_client import AsyncTranslationClient
+
+SAMPLE_CHUNK = "The quick brown fox jumps over the lazy dog. " * 40
+
+
+def run_chunks(urls, chunks, concurrency, hedge_percentile, hedge_budget):
+    """Translate chunks one by one from several threads; returns (latencies, failed, client stats)"""
+    client = AsyncTranslationClient(','.join(urls), max_connections=concurrency * 2,
+                                    max_keepalive=concurrency * 2, max_concurrency=concurrency,
+                                    hedge_percentile=hedge_percentile, hedge_budget=hedge_budget)
+    latencies = []
+    failed = [0]
+
+    def chunk(_):
+        start = time.perf_counter()
+        try:
+            client.run(client.translate(SAMPLE_CHUNK, 'en', 'hi'))
+        except Exception:
+            failed[0] += 1
+        latencies.append(time.perf_counter() - start)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(chunk, range(chunks)))
+        return latencies, failed[0], client.stats()
+    finally:
+        client.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=600)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--tail-ms', type=float, default=1000)
+    parser.add_argument('--tail-prob', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='503 rate of the primary backend')
+    parser.add_argument('--hedge-percentile', type=float, default=95)
+    parser.add_argument('--hedge-budget', type=float, default=0.1)
+    args = parser.parse_args()
+
+    options = dict(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                   tail_latency=args.tail_ms / 1000, tail_probability=args.tail_prob)
+    primary = start_stub_backend(error_rate=args.error_rate, **options)
+    secondary = start_stub_backend(**options)
+    print(f"Stub backends at {primary.url} and {secondary.url}: {args.chunks} chunks, "
+          f"{args.tail_prob:.0%} delayed by {args.tail_ms:g}ms")
+
+    for name, urls, hedge_percentile in (
+        ('no hedging', [primary.url], 0),
+        ('no hedging+fail', [primary.url, secondary.url], 0),
+        ('hedged, same', [primary.url], args.hedge_percentile),
+        ('hedged, second', [primary.url, secondary.url], args.hedge_percentile),
+    ):
+        primary.stats.reset()
+        secondary.stats.reset()
+        latencies, failed, stats = run_chunks(urls, args.chunks, args.concurrency, hedge_percentile,
+                                              args.hedge_budget)
+        # Cancelled hedges and losing duplicates still reach the backend
+        sent = sum(server.stats.snapshot()['requests'] + server.stats.snapshot()['errors']
+                   for server in (primary, secondary))
+        print(f"{name:<16} p50={percentile(latencies, 0.5) * 1000:7.1f}ms  p99={percentile(latencies, 0.99) * 1000:7.1f}ms  "
+              f"max={max(latencies) * 1000:7.1f}ms  failed={failed:3d}  extra requests={(sent - args.chunks) / args.chunks:6.1%}  "
+              f"hedges={stats['hedges']} (won {stats['hedge_wins']})  failovers={stats['failovers']}")
+
+    primary.shutdown()
+    secondary.shutdown()
+
+
+if __name__ == "__main__":
+    main()
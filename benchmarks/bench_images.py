@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cost of carrying source images into the translated PDF.
+
+Generates an image-heavy PDF and renders its (untranslated) text three ways:
+
+    none         images dropped, the old behaviour
+    passthrough  encoded image streams copied by xref, no decoding
+    reencode     every image decoded to pixels and compressed again
+
+and reports extraction time, render time and output size for each.
+
+    python benchmarks/bench_images.py --pages 20 --images-per-page 3
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# The benchmark never translates; avoid constructing a googletrans client
+os.environ.setdefault('TRANSLATE_BACKEND', 'http')
+
+import fitz  # PyMuPDF
+
+import pdf_images
+from pdf_processor import PDFProcessor
+
+# create_pdf looks embed_images up on the module at call time, so modes can swap it
+passthrough_embed = pdf_images.embed_images
+
+FILLER = ("Quarterly results were in line with expectations and the figures below summarise "
+          "revenue by region, headcount and the main operating costs for the period. ") * 3
+
+
+def image_bytes(width, height, noisy):
+    """RGB image (photo-like noise or flat), JPEG-encoded where PyMuPDF supports it"""
+    samples = os.urandom(width * height * 3) if noisy else bytes(width * height * 3)
+    pixmap = fitz.Pixmap(fitz.csRGB, width, height, samples, False)
+    try:
+        return pixmap.tobytes('jpg')
+    except ValueError:
+        return pixmap.tobytes('png')
+
+
+def make_image_pdf(path, pages, images_per_page, image_px):
+    """Write a PDF with text paragraphs between photos, plus a logo repeated on every page"""
+    doc = fitz.open()
+    logo = image_bytes(64, 64, noisy=False)
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(480, 30, 540, 90), stream=logo)
+        top = 100
+        slot = (page.rect.height - top - 40) / images_per_page
+        for index in range(images_per_page):
+            page.insert_textbox(fitz.Rect(72, top, 540, top + 60), f"Page {number + 1}, figure {index + 1}. " + FILLER,
+                                fontsize=8)
+            page.insert_image(fitz.Rect(150, top + 65, 460, top + slot - 10), stream=image_bytes(image_px, image_px, noisy=True))
+            top += slot
+    doc.save(path)
+    doc.close()
+
+
+def embed_reencoded(source_path, output_path, placements):
+    """Baseline: decode each image to a pixmap and let PyMuPDF compress it again"""
+    if not placements:
+        return 0
+    source = fitz.open(source_path)
+    target = fitz.open(output_path)
+    try:
+        for page_index, x, y, width, height, xref in placements:
+            page = target[page_index]
+            top = page.rect.height - y - height
+            page.insert_image(fitz.Rect(x, top, x + width, top + height), pixmap=fitz.Pixmap(source, xref),
+                              keep_proportion=False)
+        target.save(output_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+    finally:
+        target.close()
+        source.close()
+    return len(placements)
+
+
+def run_mode(mode, source_path, output_path, processor, runs):
+    processor.keep_images = mode != 'none'
+    pdf_images.embed_images = embed_reencoded if mode == 'reencode' else passthrough_embed
+    extract_times, render_times = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        pages = processor.extract_pages(source_path)
+        extract_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        processor.create_pdf(processor.join_pages(pages), output_path, 'bench.pdf', 'en', source_pdf=source_path)
+        render_times.append(time.perf_counter() - start)
+    return {
+        'extract_ms': statistics.median(extract_times) * 1000,
+        'render_ms': statistics.median(render_times) * 1000,
+        'bytes': os.path.getsize(output_path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--images-per-page', type=int, default=3)
+    parser.add_argument('--image-px', type=int, default=600, help='Width and height of each generated image')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    processor = PDFProcessor()
+    with tempfile.TemporaryDirectory() as workdir:
+        source_path = os.path.join(workdir, 'source.pdf')
+        make_image_pdf(source_path, args.pages, args.images_per_page, args.image_px)
+        print(f"Source: {args.pages} pages, {args.pages * (args.images_per_page + 1)} image placements, "
+              f"{os.path.getsize(source_path) / 1024:.0f} KiB\n")
+
+        print(f"{'mode':<12} {'extract ms':>11} {'render ms':>10} {'output KiB':>11}")
+        for mode in ('none', 'passthrough', 'reencode'):
+            result = run_mode(mode, source_path, os.path.join(workdir, f'{mode}.pdf'), processor, args.runs)
+            print(f"{mode:<12} {result['extract_ms']:11.1f} {result['render_ms']:10.1f} {result['bytes'] / 1024:11.0f}")
+
+
+if __name__ == "__main__":
+    main()
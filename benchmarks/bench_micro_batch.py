@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cross-job micro-batching of small chunks in the pooled translation client.
+
+Many concurrent one-page jobs, each a single short chunk, are translated
+through the shared client with batching off and with a batch window, against
+the local stub backend. Reports backend requests per 1000 translated
+characters and per-job latency.
+
+    python benchmarks/bench_micro_batch.py --jobs 400 --concurrency 32 --window-ms 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from stub_backend import start_stub_backend
+from translation_client import AsyncTranslationClient
+
+SAMPLE_SEGMENT = "A one-page letter confirming the meeting on Tuesday at ten. "
+
+
+def run_jobs(url, jobs, concurrency, segment_chars, window, max_connections):
+    """Translate one small chunk per job from many threads; returns (per-job latencies, client stats)"""
+    client = AsyncTranslationClient(url, max_connections=max_connections, max_keepalive=max_connections,
+                                    max_concurrency=max_connections, batch_window=window)
+    text = (SAMPLE_SEGMENT * (segment_chars // len(SAMPLE_SEGMENT) + 1))[:segment_chars]
+    latencies = []
+
+    def job(index):
+        start = time.perf_counter()
+        results = client.run(client.translate_many([f"{index}. {text}"], 'en', 'hi'))
+        if isinstance(results[0], Exception):
+            raise results[0]
+        latencies.append(time.perf_counter() - start)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(job, range(jobs)))
+        return latencies, client.stats()
+    finally:
+        client.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=32, help='Jobs running at once')
+    parser.add_argument('--segment-chars', type=int, default=400, help='Characters per job')
+    parser.add_argument('--window-ms', type=float, default=5)
+    parser.add_argument('--max-connections', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    server = start_stub_backend(latency=args.latency_ms / 1000)
+    print(f"Stub backend at {server.url}: {args.jobs} jobs of {args.segment_chars} chars, "
+          f"{args.concurrency} concurrent jobs")
+
+    for name, window in (('unbatched', 0.0), (f'batched {args.window_ms:g}ms', args.window_ms / 1000)):
+        server.stats.reset()
+        start = time.perf_counter()
+        latencies, client_stats = run_jobs(server.url, args.jobs, args.concurrency, args.segment_chars, window,
+                                           args.max_connections)
+        wall = time.perf_counter() - start
+        backend = server.stats.snapshot()
+        per_kchar = backend['requests'] * 1000 / backend['chars'] if backend['chars'] else 0.0
+        print(f"{name:<16} wall={wall:6.2f}s  requests={backend['requests']:5d}  req/1k chars={per_kchar:5.2f}  "
+              f"p50={percentile(latencies, 0.5) * 1000:7.1f}ms  p99={percentile(latencies, 0.99) * 1000:7.1f}ms  "
+              f"mean={statistics.mean(latencies) * 1000:7.1f}ms")
+        if client_stats['batching']:
+            print(f"{'':<16} {client_stats['batching']}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: how long a fresh worker process takes to import the app
+and serve its first responses, and which heavy modules the import pulls in.
+
+Each measurement runs in a new interpreter so nothing is cached in-process.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+HEAVY_MODULES = ('fitz', 'reportlab.platypus', 'googletrans', 'httpx', 'sqlalchemy')
+
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from app import app, init_db
+init_db()
+client = app.test_client()
+timings = {}
+for path in %(paths)r:
+    t0 = time.perf_counter()
+    response = client.get(path)
+    response.get_data()
+    timings[path] = {'status': response.status_code, 'ms': (time.perf_counter() - t0) * 1000}
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_response_ms': (time.perf_counter() - start) * 1000,
+    'requests': timings,
+    'loaded': {name: name in sys.modules for name in %(heavy)r},
+}))
+'''
+
+
+def measure(paths, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    code = PROBE % {'paths': paths, 'heavy': HEAVY_MODULES}
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def top_imports(limit):
+    """Largest cumulative import times reported by -X importtime"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=ROOT,
+                            env=dict(os.environ, DATABASE_URL='sqlite://'), capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.split('|')]
+        rows.append((int(cumulative_us), name))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--paths', default='/static/css/style.css,/api/metrics,/',
+                        help='Comma-separated paths requested after import, in order')
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list')
+    args = parser.parse_args()
+
+    paths = args.paths.split(',')
+    with tempfile.TemporaryDirectory() as workdir:
+        database_url = f"sqlite:///{os.path.join(workdir, 'startup.db')}"
+        results = [measure(paths, database_url) for _ in range(args.runs)]
+
+    print(f"Cold start over {args.runs} fresh interpreters (median):")
+    print(f"  import main:          {statistics.median(r['import_ms'] for r in results):8.1f} ms")
+    for path in paths:
+        print(f"  first GET {path:<12} {statistics.median(r['requests'][path]['ms'] for r in results):8.1f} ms "
+              f"(status {results[-1]['requests'][path]['status']})")
+    print(f"  import to last response: {statistics.median(r['first_response_ms'] for r in results):6.1f} ms")
+    print("  heavy modules loaded after serving:",
+          ', '.join(name for name, loaded in results[-1]['loaded'].items() if loaded) or 'none')
+
+    print(f"\nSlowest imports (cumulative, -X importtime):")
+    for cumulative_us, name in top_imports(args.top):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
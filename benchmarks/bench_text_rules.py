@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark: compiled text rules vs. the previous chained passes.
+
+Times translation clean-up and ReportLab formatting on generated multi-MB
+English, Telugu and Hindi documents, old implementation against text_rules,
+and the markup escape against a fused regex pass with per-match dispatch.
+
+    python benchmarks/bench_text_rules.py --mb 5
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import text_rules
+
+WORDS = {
+    'en': "the report shows that revenue grew in every region while costs stayed flat over the year".split(),
+    'te': "ఒకప్పుడు నది దగ్గర ఒక చిన్న గ్రామం ఉండేది అక్కడ రైతులు గోధుమలు పండించేవారు".split(),
+    'hi': "एक समय की बात है नदी के पास एक छोटा सा गाँव था जहाँ किसान गेहूँ उगाते थे".split(),
+}
+POETIC = {'en': [], 'te': list(text_rules.TELUGU_POETIC_WORDS), 'hi': []}
+ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;'}
+ESCAPE_PATTERN = re.compile('[&<>]')
+
+
+# Previous implementation, kept here as the baseline
+def legacy_clean_for_translation(text):
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+    text = re.sub(r' +', ' ', text)
+    text = re.sub(r'\b\d+\s*$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^Page \d+.*$', '', text, flags=re.MULTILINE)
+    return text.strip()
+
+
+def legacy_format_for_pdf(text):
+    text = text.replace('&', '&amp;')
+    text = text.replace('<', '&lt;')
+    text = text.replace('>', '&gt;')
+    if any(ord(char) in range(0x0C00, 0x0C7F) for char in text):
+        formatted_lines = []
+        for line in text.split('\n'):
+            line = line.strip()
+            if line:
+                if any(word in line for word in text_rules.TELUGU_POETIC_WORDS):
+                    formatted_lines.append(f"<i>{line}</i>")
+                else:
+                    formatted_lines.append(line)
+        return '<br/>'.join(formatted_lines)
+    return text.replace('\n', '<br/>')
+
+
+def fused_escape(text):
+    """The alternative to chained str.replace: one scan, dispatching on the matched character"""
+    return ESCAPE_PATTERN.sub(lambda match: ESCAPES[match.group()], text)
+
+
+def make_document(language, size_bytes, seed=1):
+    """Paragraphs of 4-line stanzas with page headers, page numbers and stray whitespace"""
+    rng = random.Random(seed)
+    vocabulary = WORDS[language]
+    paragraphs = []
+    size = 0
+    page = 1
+    while size < size_bytes:
+        lines = []
+        for _ in range(4):
+            words = [rng.choice(vocabulary) for _ in range(10)]
+            if POETIC[language] and rng.random() < 0.3:
+                words[rng.randrange(10)] = rng.choice(POETIC[language])
+            line = ' '.join(words)
+            if rng.random() < 0.1:
+                line = line.replace(' ', '  ', 2) + ' & <b>'
+            lines.append(line)
+        if rng.random() < 0.05:
+            lines.append(str(page))
+            lines.insert(0, f"Page {page} of 999")
+            page += 1
+        paragraph = '\n'.join(lines)
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode('utf-8')) + 3
+    return '\n\n\n'.join(paragraphs)
+
+
+def timed(fn, arg, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mb', type=float, default=5.0, help='Size of each generated document')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'language':<9} {'stage':<10} {'before ms':>10} {'after ms':>10} {'speedup':>8}  output")
+    for language in ('en', 'te', 'hi'):
+        document = make_document(language, int(args.mb * 1024 * 1024))
+        before, old_clean = timed(legacy_clean_for_translation, document, args.runs)
+        after, new_clean = timed(text_rules.clean_for_translation, document, args.runs)
+        same = 'identical' if old_clean == new_clean else f'differs ({len(old_clean)} vs {len(new_clean)} chars)'
+        print(f"{language:<9} {'cleanup':<10} {before * 1000:10.1f} {after * 1000:10.1f} {before / after:7.2f}x  {same}")
+
+        # create_pdf formats one paragraph at a time
+        paragraphs = [p for p in new_clean.split('\n\n') if p.strip()]
+        before, old_pdf = timed(lambda ps: [legacy_format_for_pdf(p) for p in ps], paragraphs, args.runs)
+        after, new_pdf = timed(lambda ps: [text_rules.default_engine.format_for_pdf(p) for p in ps], paragraphs, args.runs)
+        same = 'identical' if old_pdf == new_pdf else 'differs'
+        print(f"{language:<9} {'format':<10} {before * 1000:10.1f} {after * 1000:10.1f} {before / after:7.2f}x  {same}")
+
+        # 'before' is the fused regex here, 'after' the chained str.replace text_rules uses
+        before, fused = timed(lambda ps: [fused_escape(p) for p in ps], paragraphs, args.runs)
+        after, chained = timed(lambda ps: [text_rules.escape_markup(p) for p in ps], paragraphs, args.runs)
+        same = 'identical' if fused == chained else 'differs'
+        print(f"{language:<9} {'escape':<10} {before * 1000:10.1f} {after * 1000:10.1f} {before / after:7.2f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
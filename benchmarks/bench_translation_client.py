@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-job sync clients vs. the shared pooled async translation client.
+
+Runs against the local stub backend and reports wall time, per-chunk latency
+and the number of TCP connections the backend accepted.
+
+    python benchmarks/bench_translation_client.py --jobs 20 --chunks 8
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import httpx
+
+from stub_backend import start_stub_backend
+from translation_client import AsyncTranslationClient
+
+SAMPLE_CHUNK = "The quick brown fox jumps over the lazy dog. " * 80
+
+
+def run_per_job_clients(url, jobs, chunks, concurrency):
+    """Current behaviour: a fresh sync client per job, chunks translated one after another"""
+    latencies = []
+
+    def job(_):
+        with httpx.Client() as client:
+            for _ in range(chunks):
+                start = time.perf_counter()
+                response = client.post(f"{url}/translate_a/single",
+                                       params={'client': 'gtx', 'sl': 'en', 'tl': 'hi', 'dt': 't'},
+                                       data={'q': SAMPLE_CHUNK})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(job, range(jobs)))
+    return latencies
+
+
+def run_pooled_client(url, jobs, chunks, concurrency, max_connections):
+    """Shared pooled client: every job's chunks awaited on one event loop"""
+    client = AsyncTranslationClient(url, max_connections=max_connections, max_keepalive=max_connections,
+                                    max_concurrency=max_connections)
+    latencies = []
+
+    def record(index, start, end, result):
+        # Per chunk, including time spent waiting for a connection slot
+        latencies.append(end - start)
+
+    def job(_):
+        results = client.run(client.translate_many([SAMPLE_CHUNK] * chunks, 'en', 'hi', on_span=record))
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            raise errors[0]
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(job, range(jobs)))
+    finally:
+        client.close()
+    return latencies
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(name, server, wall, latencies):
+    stats = server.stats.snapshot()
+    print(f"{name:<18} wall={wall:6.2f}s  mean_chunk={statistics.mean(latencies) * 1000:7.1f}ms  "
+          f"p99_chunk={percentile(latencies, 0.99) * 1000:7.1f}ms  "
+          f"requests={stats['requests']:5d}  connections={stats['connections']:4d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=20)
+    parser.add_argument('--chunks', type=int, default=8, help='Chunks per job')
+    parser.add_argument('--concurrency', type=int, default=4, help='Jobs running at once')
+    parser.add_argument('--max-connections', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    server = start_stub_backend(latency=args.latency_ms / 1000)
+    print(f"Stub backend at {server.url}: {args.jobs} jobs x {args.chunks} chunks, "
+          f"{args.concurrency} concurrent jobs")
+
+    for name, runner in (
+        ('per-job sync', lambda: run_per_job_clients(server.url, args.jobs, args.chunks, args.concurrency)),
+        ('pooled async', lambda: run_pooled_client(server.url, args.jobs, args.chunks, args.concurrency,
+                                                   args.max_connections)),
+    ):
+        server.stats.reset()
+        start = time.perf_counter()
+        latencies = runner()
+        report(name, server, time.perf_counter() - start, latencies)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Offline HTTP load test for the Flask app.
+
+Starts the local stub translation backend and a gunicorn (or werkzeug) server
+for main:app pointed at it, then replays a mix of synthetic PDFs through
+/upload, /download/<filename> and /api/history. Reports p50/p95/p99 latency,
+throughput and error rate per endpoint.
+
+    python benchmarks/loadtest.py --concurrency 8 --duration 60
+    python benchmarks/loadtest.py --rate 5 --duration 60 --mix small-en-hi:3,large-en-te:1
+
+With --queue-workers the app only accepts uploads and queues jobs in the shared
+SQLite database (JOB_QUEUE=db); that many separate `flask queue-worker`
+processes run them. --kill-worker-after SIGKILLs one worker mid-run to check that
+its jobs are requeued once their lease expires.
+
+    python benchmarks/loadtest.py --queue-workers 3 --kill-worker-after 20 --duration 60
+"""
+
+import argparse
+import http.cookiejar
+import io
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from stub_backend import start_stub_backend
+
+SAMPLE_TEXT = {
+    'latin': ("The committee reviewed the annual report and approved the budget for the next year. "
+              "Every department must submit its plan before the end of the quarter. "),
+    'devanagari': ("समिति ने वार्षिक रिपोर्ट की समीक्षा की और अगले वर्ष के बजट को मंजूरी दी। "
+                   "हर विभाग को तिमाही के अंत से पहले अपनी योजना जमा करनी होगी। "),
+    'telugu': ("కమిటీ వార్షిక నివేదికను సమీక్షించి వచ్చే సంవత్సరం బడ్జెట్‌ను ఆమోదించింది. "
+               "ప్రతి విభాగం త్రైమాసికం ముగిసేలోపు తన ప్రణాళికను సమర్పించాలి. "),
+}
+SCRIPT_FOR_LANGUAGE = {'en': 'latin', 'es': 'latin', 'fr': 'latin', 'de': 'latin', 'hi': 'devanagari', 'te': 'telugu'}
+FONT_FOR_SCRIPT = {'devanagari': 'NotoSansDevanagari-Regular.ttf', 'telugu': 'NotoSerifTelugu-Regular.ttf'}
+SIZES = {'small': 1, 'medium': 5, 'large': 20}
+DEFAULT_MIX = 'small-en-hi:4,small-en-te:2,medium-en-hi:2,small-hi-en:1,large-en-te:1'
+
+
+def make_pdf(pages, language, fonts_dir):
+    """Render a synthetic PDF of the given length in the source language's script"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    script = SCRIPT_FOR_LANGUAGE.get(language, 'latin')
+    font_name = 'Helvetica'
+    if script in FONT_FOR_SCRIPT:
+        font_path = os.path.join(fonts_dir, FONT_FOR_SCRIPT[script])
+        if os.path.exists(font_path):
+            font_name = f"LoadTest-{script}"
+            if font_name not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(TTFont(font_name, font_path))
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    sentence = SAMPLE_TEXT[script]
+    for page in range(pages):
+        pdf.setFont(font_name, 11)
+        y = 800
+        for line in range(40):
+            pdf.drawString(50, y, (sentence * 2)[line % 40:line % 40 + 90])
+            y -= 18
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def parse_mix(spec):
+    """Parse 'size-src-dest:weight,...' into weighted scenarios"""
+    scenarios = []
+    for part in spec.split(','):
+        name, _, weight = part.partition(':')
+        size, source, target = name.split('-')
+        scenarios.append({'name': name, 'pages': SIZES[size], 'source': source, 'target': target,
+                          'weight': float(weight or 1)})
+    return scenarios
+
+
+def encode_multipart(fields, files):
+    """Build a multipart/form-data body"""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f'Content-Type: application/pdf\r\n\r\n'.encode())
+        body.write(data)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Recorder:
+    """Collects latency samples and outcomes per endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            entry = self.samples.setdefault(endpoint, {'latencies': [], 'errors': 0})
+            entry['latencies'].append(seconds)
+            if not ok:
+                entry['errors'] += 1
+
+    def report(self, elapsed):
+        rows = {}
+        for endpoint, entry in sorted(self.samples.items()):
+            latencies = sorted(entry['latencies'])
+            count = len(latencies)
+
+            def pct(p):
+                return latencies[min(count - 1, int(p / 100.0 * count))] * 1000
+
+            rows[endpoint] = {
+                'requests': count,
+                'throughput_rps': round(count / elapsed, 2),
+                'error_rate': round(entry['errors'] / count, 4),
+                'p50_ms': round(pct(50), 1),
+                'p95_ms': round(pct(95), 1),
+                'p99_ms': round(pct(99), 1),
+                'max_ms': round(latencies[-1] * 1000, 1),
+            }
+        return rows
+
+
+class VirtualUser:
+    """One browser session: its own cookie jar, uploads and follow-up requests"""
+
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect()
+        )
+
+    def request(self, endpoint, path, data=None, headers=None):
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers or {})
+        start = time.perf_counter()
+        status, location, body = None, None, b''
+        try:
+            with self.opener.open(request, timeout=300) as response:
+                status = response.status
+                body = response.read()
+        except urllib.error.HTTPError as e:
+            status = e.code
+            location = e.headers.get('Location')
+            body = e.read()
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - start
+        return status, location, body, elapsed
+
+    def run_scenario(self, scenario, pdf_data):
+        status, _, _, elapsed = self.request('GET /', '/')
+        self.recorder.record('GET /', elapsed, status == 200)
+
+        body, content_type = encode_multipart(
+            {'source_language': scenario['source'], 'target_language': scenario['target'],
+             'task_id': str(uuid.uuid4())},
+            {'file': (f"loadtest_{scenario['name']}.pdf", pdf_data)}
+        )
+        status, location, _, elapsed = self.request('POST /upload', '/upload', data=body,
+                                                    headers={'Content-Type': content_type})
+        if status == 429:
+            # Shed by admission control: fast, deliberate rejections are reported apart from failures
+            self.recorder.record('POST /upload (429)', elapsed, True)
+            return
+        # Successful uploads redirect to the download; failures redirect back to the index
+        ok = status in (301, 302, 303) and location is not None and '/download/' in location
+        self.recorder.record('POST /upload', elapsed, ok)
+        if ok:
+            path = location[location.index('/download/'):]
+            status, _, _, elapsed = self.request('GET /download/<filename>', path)
+            self.recorder.record('GET /download/<filename>', elapsed, status == 200)
+
+        status, _, body, elapsed = self.request('GET /api/history', '/api/history')
+        ok = status == 200
+        if ok:
+            try:
+                ok = 'error' not in json.loads(body)
+            except ValueError:
+                ok = False
+        self.recorder.record('GET /api/history', elapsed, ok)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def app_env(args, stub_url, workdir):
+    env = dict(os.environ)
+    env.update({
+        'TRANSLATE_BACKEND': 'http',
+        'TRANSLATE_BACKEND_URL': stub_url,
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        'SESSION_SECRET': 'loadtest',
+    })
+    if args.queue_workers:
+        env.update({
+            'JOB_QUEUE': 'db',
+            'JOB_QUEUE_EMBEDDED': '0',
+            'JOB_LEASE': str(args.job_lease),
+            'JOB_HEARTBEAT': str(max(1.0, args.job_lease / 5)),
+        })
+    return env
+
+
+def start_queue_workers(args, stub_url, workdir):
+    """Launch separate queue worker processes sharing the app's database"""
+    command = [sys.executable, '-m', 'flask', '--app', 'main', 'queue-worker', '--threads', str(args.app_threads)]
+    return [subprocess.Popen(command, cwd=ROOT, env=app_env(args, stub_url, workdir),
+                             stdout=subprocess.DEVNULL if not args.verbose else None,
+                             stderr=subprocess.DEVNULL if not args.verbose else None)
+            for _ in range(args.queue_workers)]
+
+
+def start_app(args, stub_url, workdir):
+    """Launch the app in a subprocess against the stub backend"""
+    port = free_port()
+    env = app_env(args, stub_url, workdir)
+    if args.server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(args.app_workers), '--threads', str(args.app_threads),
+                   '--timeout', '300', '--log-level', 'warning', 'main:app']
+    else:
+        command = [sys.executable, '-c',
+                   f"from app import init_db; init_db(); from main import app; "
+                   f"app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    process = subprocess.Popen(command, cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL if not args.verbose else None,
+                               stderr=subprocess.DEVNULL if not args.verbose else None)
+
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App server exited with code {process.returncode}")
+        try:
+            urllib.request.urlopen(base_url + '/api/metrics', timeout=2).read()
+            return process, base_url
+        except Exception:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("App server did not start within 60s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help='Weighted scenarios as size-source-target:weight (sizes: small, medium, large)')
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--concurrency', type=int, default=4, help='Closed loop: virtual users running at once')
+    load.add_argument('--rate', type=float, help='Open loop: scenario arrivals per second (Poisson)')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to generate load')
+    parser.add_argument('--server', choices=('gunicorn', 'werkzeug'), default='gunicorn')
+    parser.add_argument('--app-workers', type=int, default=2)
+    parser.add_argument('--app-threads', type=int, default=4)
+    parser.add_argument('--backend-latency-ms', type=float, default=50)
+    parser.add_argument('--backend-error-rate', type=float, default=0.0)
+    parser.add_argument('--queue-workers', type=int, default=0,
+                        help='Queue jobs in the database and run them in this many separate worker processes')
+    parser.add_argument('--kill-worker-after', type=float,
+                        help='SIGKILL one queue worker after this many seconds')
+    parser.add_argument('--job-lease', type=float, default=15, help='Queue lease in seconds with --queue-workers')
+    parser.add_argument('--url', help='Use an already running app instead of starting one')
+    parser.add_argument('--json', help='Also write the report to this file')
+    parser.add_argument('--verbose', action='store_true', help='Show app server output')
+    args = parser.parse_args()
+
+    scenarios = parse_mix(args.mix)
+    fonts_dir = os.path.join(ROOT, 'fonts')
+    pdfs = {s['name']: make_pdf(s['pages'], s['source'], fonts_dir) for s in scenarios}
+    weights = [s['weight'] for s in scenarios]
+
+    stub = start_stub_backend(latency=args.backend_latency_ms / 1000, error_rate=args.backend_error_rate)
+    workdir = tempfile.mkdtemp(prefix='pdf-loadtest-')
+    process = None
+    queue_workers = []
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        process, base_url = start_app(args, stub.url, workdir)
+        # Started after the app, whose startup created the schema
+        queue_workers = start_queue_workers(args, stub.url, workdir)
+    if queue_workers and args.kill_worker_after is not None:
+        def kill_worker():
+            queue_workers[0].send_signal(signal.SIGKILL)
+            print(f"Killed queue worker {queue_workers[0].pid} after {args.kill_worker_after:.0f}s")
+        threading.Timer(args.kill_worker_after, kill_worker).start()
+
+    recorder = Recorder()
+    stop_at = time.time() + args.duration
+    mode = f"rate={args.rate}/s" if args.rate else f"concurrency={args.concurrency}"
+    print(f"Load testing {base_url} for {args.duration:.0f}s ({mode}), backend stub at {stub.url}")
+
+    def one_scenario():
+        scenario = random.choices(scenarios, weights)[0]
+        VirtualUser(base_url, recorder).run_scenario(scenario, pdfs[scenario['name']])
+
+    start = time.perf_counter()
+    try:
+        if args.rate:
+            with ThreadPoolExecutor(max_workers=256) as pool:
+                while time.time() < stop_at:
+                    pool.submit(one_scenario)
+                    time.sleep(random.expovariate(args.rate))
+        else:
+            def closed_loop():
+                while time.time() < stop_at:
+                    one_scenario()
+            threads = [threading.Thread(target=closed_loop) for _ in range(args.concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    finally:
+        elapsed = time.perf_counter() - start
+        queue_stats = None
+        if queue_workers:
+            try:
+                queue_stats = json.loads(urllib.request.urlopen(base_url + '/api/metrics', timeout=10).read())['queue']
+            except Exception as e:
+                print(f"Could not read queue metrics: {e}")
+        for worker in queue_workers:
+            worker.terminate()
+        for worker in queue_workers:
+            worker.wait(timeout=300)
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = recorder.report(elapsed)
+    print(f"\n{'endpoint':<28}{'reqs':>7}{'rps':>8}{'err%':>8}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'maxms':>9}")
+    for endpoint, row in report.items():
+        print(f"{endpoint:<28}{row['requests']:>7}{row['throughput_rps']:>8.2f}{row['error_rate'] * 100:>8.2f}"
+              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+    print(f"\nBackend stub: {stub.stats.snapshot()}")
+    if queue_stats is not None:
+        print(f"Queue: {queue_stats.get('states')}, oldest queued {queue_stats.get('oldest_queued_s')}s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'elapsed_s': elapsed, 'mode': mode, 'mix': args.mix, 'endpoints': report,
+                       'backend': stub.stats.snapshot(), 'queue': queue_stats}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
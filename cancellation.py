@@ -0,0 +1,141 @@
+import collections
+import threading
+import time
+
+
+class JobCancelled(Exception):
+    """Raised at a checkpoint once a job has been cancelled or has run past its deadline"""
+
+    MESSAGES = {
+        'cancelled': 'Translation cancelled',
+        'disconnected': 'Translation cancelled because the page was closed',
+        'deadline': 'Translation took too long and was stopped',
+        'lease_lost': 'Translation was handed to another worker',
+    }
+
+    def __init__(self, reason, stage=None):
+        super().__init__(self.MESSAGES.get(reason, f'Translation stopped ({reason})'))
+        self.reason = reason
+        self.stage = stage
+
+
+class CancelToken:
+    """Cooperative cancellation flag and deadline shared by everything working on one job
+
+    The pipeline calls check() between chunks and stages; nothing is
+    interrupted mid-request, so a cancelled job stops within one chunk.
+    """
+
+    def __init__(self, deadline=None, abandoned=None):
+        # time.monotonic() value after which the job is stopped, or None
+        self.deadline = deadline
+        self.reason = None
+        self._abandoned = abandoned
+
+    def cancel(self, reason='cancelled'):
+        """Request cancellation; the first reason given wins"""
+        if self.reason is None:
+            self.reason = reason
+
+    @property
+    def cancelled(self):
+        if self.reason is None:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                self.reason = 'deadline'
+            elif self._abandoned is not None and self._abandoned():
+                self.reason = 'disconnected'
+        return self.reason is not None
+
+    def check(self, stage=None):
+        """Raise JobCancelled if the job should stop"""
+        if self.cancelled:
+            raise JobCancelled(self.reason, stage)
+
+
+class CancellationRegistry:
+    """Cancel tokens of running jobs, keyed by task id
+
+    A job is cancelled explicitly through cancel(), by its deadline, or
+    once every progress subscriber has been gone for disconnect_grace
+    seconds (EventSource reconnects within a few seconds, so a short gap is
+    not treated as a closed tab). listeners(task_id) reports how many
+    progress streams are currently open for a task.
+    """
+
+    def __init__(self, deadline=0, disconnect_grace=10.0, cancel_on_disconnect=True, listeners=None, ttl=6 * 3600):
+        self.deadline = deadline
+        self.disconnect_grace = disconnect_grace
+        self.cancel_on_disconnect = cancel_on_disconnect
+        self.listeners = listeners
+        self.ttl = ttl
+        self._jobs = {}
+        self._disconnected = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.registered = 0
+        self.cancel_requests = 0
+        self.stopped = collections.Counter()
+        self.stopped_at_stage = collections.Counter()
+
+    def register(self, task_id, session_id):
+        """Create the token for a new job"""
+        now = time.monotonic()
+        token = CancelToken(deadline=now + self.deadline if self.deadline else None,
+                            abandoned=lambda: self._abandoned(task_id))
+        with self._lock:
+            # Jobs that never reached finish() (a crashed request) must not pile up
+            for stale in [t for t, (_, _, started) in self._jobs.items() if now - started > self.ttl]:
+                self._jobs.pop(stale)
+                self._disconnected.pop(stale, None)
+            self._jobs[task_id] = (token, session_id, now)
+            self._disconnected.pop(task_id, None)
+            self.registered += 1
+        return token
+
+    def cancel(self, task_id, session_id=None, reason='cancelled'):
+        """Cancel a running job; with a session id, only that session's job. Returns True if found"""
+        with self._lock:
+            entry = self._jobs.get(task_id)
+        if entry is None or (session_id is not None and entry[1] != session_id):
+            return False
+        self.cancel_requests += 1
+        entry[0].cancel(reason)
+        return True
+
+    def disconnected(self, task_id):
+        """Note that a progress stream for the task closed before the job finished"""
+        if not self.cancel_on_disconnect:
+            return
+        with self._lock:
+            if task_id in self._jobs:
+                self._disconnected[task_id] = time.monotonic()
+
+    def _abandoned(self, task_id):
+        since = self._disconnected.get(task_id)
+        if since is None or time.monotonic() - since < self.disconnect_grace:
+            return False
+        return self.listeners is None or self.listeners(task_id) == 0
+
+    def finish(self, task_id, error=None):
+        """Forget a job; a JobCancelled error is counted by reason and stage (once per job)"""
+        with self._lock:
+            entry = self._jobs.pop(task_id, None)
+            self._disconnected.pop(task_id, None)
+        if entry is not None and isinstance(error, JobCancelled):
+            self.stopped[error.reason] += 1
+            self.stopped_at_stage[error.stage or 'unknown'] += 1
+
+    def stats(self):
+        with self._lock:
+            active = len(self._jobs)
+            disconnected = len(self._disconnected)
+        return {
+            'active': active,
+            'disconnected': disconnected,
+            'registered': self.registered,
+            'cancel_requests': self.cancel_requests,
+            'stopped': dict(self.stopped),
+            'stopped_at_stage': dict(self.stopped_at_stage),
+            'deadline_s': self.deadline,
+        }
@@ -0,0 +1,23 @@
+# Gunicorn reads this file automatically when started from the project root.
+import os
+import subprocess
+import sys
+
+# Progress streams keep a request open for up to PROGRESS_STREAM_WINDOW seconds;
+# threaded workers let uploads and downloads run alongside them
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+
+def on_starting(server):
+    """Create database tables once, before any worker boots"""
+    # With the local queue, progress, cancellation and admission state live in the
+    # process that took the upload, so a second worker would answer for jobs it cannot see
+    if os.environ.get('JOB_QUEUE', 'local') != 'db' and server.num_workers > 1:
+        server.log.warning(f"JOB_QUEUE=local keeps job state in one process; running 1 worker instead of "
+                           f"{server.num_workers} (set JOB_QUEUE=db to run several)")
+        server.num_workers = 1
+
+    # In a child process, so the master never imports the app (and its database
+    # connections and threads) that every worker then inherits through fork
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'main', 'init-db'], check=True)
@@ -0,0 +1,189 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+
+class HistoryWriter:
+    """Write-behind queue that batches history inserts off the request path"""
+
+    def __init__(self, app=None, db=None, max_queue_size=1000, batch_size=50, flush_interval=1.0, retry_delay=0.5):
+        self.app = app
+        self.db = db
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Pause before a failed batch is retried, for transient errors such as a dropped connection
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._pid = None
+
+        # Metrics
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.row_fallbacks = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        """Bind the writer to the Flask app and read its configuration"""
+        self.app = app
+        self.db = db
+        self.max_queue_size = app.config.get('HISTORY_QUEUE_SIZE', self.max_queue_size)
+        self.batch_size = app.config.get('HISTORY_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('HISTORY_FLUSH_INTERVAL', self.flush_interval)
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        atexit.register(self.shutdown)
+
+    def _ensure_started(self):
+        """Start the background writer lazily (and again after a fork)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Queue contents belong to the parent process
+                self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._pid = os.getpid()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, model, **fields):
+        """Queue a row for insertion; returns False if the buffer is full"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((model, fields))
+            self.submitted += 1
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logging.warning(f"History queue full ({self.max_queue_size}), dropping {model.__name__} record")
+            return False
+
+    def pending(self, model, **filters):
+        """Return queued (not yet committed) records matching the filters"""
+        with self._queue.mutex:
+            items = list(self._queue.queue)
+        return [
+            fields for queued_model, fields in items
+            if queued_model is model and all(fields.get(k) == v for k, v in filters.items())
+        ]
+
+    def _drain(self, first=None):
+        """Collect up to batch_size queued records"""
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._flush_batch(self._drain(first))
+
+    def _insert(self, records):
+        """Add records and commit them in one transaction; rolls back and re-raises on failure"""
+        try:
+            for model, fields in records:
+                entry = model()
+                for key, value in fields.items():
+                    setattr(entry, key, value)
+                self.db.session.add(entry)
+            self.db.session.commit()
+        except Exception:
+            self.db.session.rollback()
+            raise
+
+    def _flush_batch(self, batch):
+        """Insert a batch of records in a single transaction
+
+        A failed batch is retried once after retry_delay; if it fails again
+        the records are inserted one by one, so a single bad row only loses
+        itself.
+        """
+        if not batch:
+            return
+        start_time = time.perf_counter()
+        with self.app.app_context():
+            try:
+                try:
+                    self._insert(batch)
+                except Exception as e:
+                    logging.warning(f"History batch flush failed ({len(batch)} records), retrying: {e}")
+                    self.retries += 1
+                    time.sleep(self.retry_delay)
+                    self._insert(batch)
+                self.written += len(batch)
+            except Exception as e:
+                logging.warning(f"History batch retry failed ({len(batch)} records), inserting row by row: {e}")
+                self.row_fallbacks += 1
+                for record in batch:
+                    try:
+                        self._insert([record])
+                        self.written += 1
+                    except Exception as row_error:
+                        logging.error(f"Dropping {record[0].__name__} record that cannot be written: {row_error}")
+                        self.failed += 1
+            finally:
+                self.db.session.remove()
+
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        self.flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+        logging.debug(f"Flushed {len(batch)} history records in {elapsed_ms:.1f}ms")
+
+    def flush(self):
+        """Synchronously write everything currently queued"""
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            self._flush_batch(batch)
+
+    def shutdown(self, timeout=5.0):
+        """Stop the background thread and flush remaining records"""
+        self._stop_event.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        if self.app is not None and self._pid == os.getpid():
+            self.flush()
+
+    def stats(self):
+        """Return queue and flush metrics"""
+        return {
+            'queued': self._queue.qsize(),
+            'max_queue_size': self.max_queue_size,
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'retries': self.retries,
+            'row_fallbacks': self.row_fallbacks,
+            'flushes': self.flushes,
+            'last_flush_ms': round(self.last_flush_ms, 2),
+            'max_flush_ms': round(self.max_flush_ms, 2),
+            'avg_flush_ms': round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+        }
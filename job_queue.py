@@ -0,0 +1,457 @@
+import concurrent.futures
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, insert, select, update, delete
+
+from cancellation import CancelToken, JobCancelled
+
+
+class JobQueue:
+    """Durable job queue in the application database, shared by every host
+
+    Rows move from queued to running to done, failed or cancelled. A worker
+    claims the queued row with the lowest sort key by switching it to
+    running under its worker id with a lease. On PostgreSQL the candidate
+    is locked with FOR UPDATE SKIP LOCKED, so concurrent claimers never wait
+    on each other; on other databases (SQLite) a conditional
+    UPDATE ... WHERE state = 'queued' decides the race. Workers heartbeat to
+    extend their leases, and rows whose lease ran out because the worker
+    died go back to the queue, up to max_attempts claims.
+
+    The host that enqueued a job relays its progress events from the row
+    into the local progress tracker and resolves the Future returned by
+    submit(), so request handlers do not care which host runs the job.
+    Hosts serving a progress stream stamp watched_at on the row while the
+    stream is open; the worker cancels a job whose streams have all been
+    gone for disconnect_grace seconds, whichever host they were on.
+    """
+
+    TERMINAL_STATES = ('done', 'failed', 'cancelled')
+
+    def __init__(self, table, engine, publish=None, lease=60, heartbeat_interval=10, poll_interval=1.0,
+                 max_attempts=3, aging_rate=1.0, progress_interval=0.5, retention=24 * 3600, watch_ttl=600,
+                 listeners=None, disconnect_grace=0):
+        self.table = table
+        # Zero-argument callable returning the SQLAlchemy engine
+        self.engine = engine
+        self.publish = publish
+        self.lease = lease
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.aging_rate = aging_rate
+        self.progress_interval = progress_interval
+        self.retention = retention
+        self.watch_ttl = watch_ttl
+        # listeners(task_id) counts this process's open progress streams; 0 grace disables disconnect cancels
+        self.listeners = listeners
+        self.disconnect_grace = disconnect_grace
+        self._lock = threading.Lock()
+
+        # Worker side
+        self._worker_pid = None
+        self._worker_id = None
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._running = {}
+        self._last_progress = {}
+        self._last_maintenance = 0.0
+
+        # Enqueuing side
+        self._watched = {}
+        self._relay = None
+        self._relay_pid = None
+
+        # Metrics
+        self.enqueued = 0
+        self.claimed = 0
+        self.claim_conflicts = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.lost_leases = 0
+        self.requeued = 0
+        self.expired = 0
+        self.relayed_events = 0
+
+    # Enqueuing side
+
+    def submit(self, task_id, session_id, payload, cost, token=None):
+        """Insert a queued row and return a Future resolved when a worker finishes it
+
+        The Future yields the handler's result, or raises JobCancelled or
+        RuntimeError. If token gets cancelled (deadline, closed page), the
+        cancellation is passed on to whichever worker holds the job.
+        """
+        now = datetime.utcnow()
+        with self.engine().begin() as conn:
+            conn.execute(insert(self.table).values(
+                task_id=task_id,
+                session_id=session_id,
+                state='queued',
+                # Lower runs first: small jobs ahead of large ones, and every row gains aging_rate per second waited
+                sort_key=cost + self.aging_rate * time.time(),
+                payload=json.dumps(payload, ensure_ascii=False),
+                attempts=0,
+                progress_seq=0,
+                created_at=now
+            ))
+        self.enqueued += 1
+        future = concurrent.futures.Future()
+        self._watch(task_id, future, token)
+        return future
+
+    def follow(self, task_id):
+        """Relay a task's progress into this process, e.g. for a progress stream opened on another host"""
+        self._watch(task_id)
+
+    def request_cancel(self, task_id, session_id=None, reason='cancelled'):
+        """Cancel a queued job outright or flag a running one for its worker; returns True if found"""
+        t = self.table
+        now = datetime.utcnow()
+        owned = [t.c.task_id == task_id] + ([t.c.session_id == session_id] if session_id is not None else [])
+        with self.engine().begin() as conn:
+            dropped = conn.execute(update(t).where(*owned, t.c.state == 'queued').values(
+                state='cancelled', cancel_reason=reason, finished_at=now,
+                result=json.dumps({'reason': reason, 'stage': 'queued'})
+            )).rowcount
+            flagged = conn.execute(update(t).where(*owned, t.c.state == 'running', t.c.cancel_reason.is_(None))
+                                   .values(cancel_reason=reason)).rowcount
+        return bool(dropped or flagged)
+
+    def _watch(self, task_id, future=None, token=None):
+        with self._lock:
+            entry = self._watched.get(task_id)
+            if entry is None:
+                entry = self._watched[task_id] = {'seq': 0, 'futures': [], 'token': None, 'cancel_sent': False,
+                                                  'since': time.monotonic()}
+            if future is not None:
+                entry['futures'].append(future)
+            if token is not None:
+                entry['token'] = token
+            if self._relay is None or not self._relay.is_alive() or self._relay_pid != os.getpid():
+                self._relay_pid = os.getpid()
+                self._relay = threading.Thread(target=self._run_relay, name='job-queue-relay', daemon=True)
+                self._relay.start()
+
+    def _run_relay(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self._relay_once()
+            except Exception as e:
+                logging.warning(f"Job queue relay failed: {e}")
+
+    def _relay_once(self):
+        """Publish new progress, pass on local cancellations and resolve finished jobs"""
+        with self._lock:
+            watched = dict(self._watched)
+        if not watched:
+            return
+        t = self.table
+        with self.engine().connect() as conn:
+            rows = conn.execute(select(t.c.task_id, t.c.state, t.c.progress_seq, t.c.progress_event,
+                                       t.c.progress_data, t.c.result, t.c.error)
+                                .where(t.c.task_id.in_(list(watched)))).mappings().all()
+
+        self._touch_watched([row['task_id'] for row in rows if row['state'] in ('queued', 'running')])
+
+        found = set()
+        for row in rows:
+            task_id = row['task_id']
+            entry = watched[task_id]
+            found.add(task_id)
+            if row['progress_seq'] > entry['seq'] and row['progress_event']:
+                entry['seq'] = row['progress_seq']
+                self._publish(task_id, row['progress_event'], **json.loads(row['progress_data'] or '{}'))
+                self.relayed_events += 1
+
+            token = entry['token']
+            if row['state'] in ('queued', 'running') and token is not None and not entry['cancel_sent'] \
+                    and token.cancelled:
+                entry['cancel_sent'] = True
+                self.request_cancel(task_id, reason=token.reason)
+
+            if row['state'] in self.TERMINAL_STATES:
+                self._resolve(task_id, entry, row)
+
+        now = time.monotonic()
+        with self._lock:
+            for task_id, entry in watched.items():
+                if task_id not in found and now - entry['since'] > self.watch_ttl:
+                    self._watched.pop(task_id, None)
+
+    def _touch_watched(self, task_ids):
+        """Record that progress streams for these tasks are open on this host"""
+        if not self.disconnect_grace or self.listeners is None:
+            return
+        listened = [task_id for task_id in task_ids if self.listeners(task_id)]
+        if not listened:
+            return
+        t = self.table
+        with self.engine().begin() as conn:
+            conn.execute(update(t).where(t.c.task_id.in_(listened)).values(watched_at=datetime.utcnow()))
+
+    def _resolve(self, task_id, entry, row):
+        if row['state'] == 'done':
+            outcome = json.loads(row['result'] or 'null')
+        elif row['state'] == 'cancelled':
+            info = json.loads(row['result'] or '{}')
+            outcome = JobCancelled(info.get('reason', 'cancelled'), info.get('stage'))
+            # Jobs cancelled while queued never reached a worker to report it
+            self._publish(task_id, 'cancelled', reason=outcome.reason, stage=outcome.stage, message=str(outcome))
+        else:
+            outcome = RuntimeError(row['error'] or 'Job failed')
+            self._publish(task_id, 'error', message=f"Translation failed: {outcome}")
+
+        with self._lock:
+            self._watched.pop(task_id, None)
+        for future in entry['futures']:
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def _publish(self, task_id, event, **data):
+        if self.publish is not None:
+            self.publish(task_id, event, **data)
+
+    # Worker side
+
+    def start_workers(self, handler, threads=1):
+        """Start consumer threads and the lease heartbeat in this process (again after a fork)
+
+        handler(row, token) runs one claimed job and returns a JSON-serializable
+        result; token is cancelled when the job is cancelled elsewhere.
+        """
+        with self._lock:
+            if self._worker_pid == os.getpid() and any(thread.is_alive() for thread in self._threads):
+                return
+            self._worker_pid = os.getpid()
+            self._worker_id = f"{socket.gethostname()}:{os.getpid()}"
+            self._stop_event = threading.Event()
+            self._running = {}
+            self._threads = [threading.Thread(target=self._consume, args=(handler,), name=f'job-queue-worker-{i}',
+                                              daemon=True) for i in range(threads)]
+            self._threads.append(threading.Thread(target=self._run_heartbeat, name='job-queue-heartbeat', daemon=True))
+            for thread in self._threads:
+                thread.start()
+        logging.info(f"Job queue worker {self._worker_id} started with {threads} thread(s)")
+
+    def stop_workers(self, timeout=None):
+        """Stop claiming new jobs and wait for running ones to finish"""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _consume(self, handler):
+        while not self._stop_event.is_set():
+            try:
+                self._maintain()
+                row = self.claim()
+            except Exception as e:
+                logging.warning(f"Job queue claim failed: {e}")
+                row = None
+            if row is None:
+                self._stop_event.wait(self.poll_interval)
+                continue
+
+            token = CancelToken()
+            self._running[row['id']] = token
+            try:
+                result = handler(row, token)
+                self.finish(row['id'], 'done', result=result)
+            except JobCancelled as e:
+                # After a lost lease the row belongs to another worker; it records the outcome
+                if e.reason != 'lease_lost':
+                    self.finish(row['id'], 'cancelled', result={'reason': e.reason, 'stage': e.stage})
+            except Exception as e:
+                self.finish(row['id'], 'failed', error=str(e))
+            finally:
+                self._running.pop(row['id'], None)
+                self._last_progress.pop(row['id'], None)
+
+    def claim(self):
+        """Atomically take the next queued job for this worker; returns the row as a dict, or None"""
+        t = self.table
+        now = datetime.utcnow()
+        claim_values = dict(state='running', worker_id=self._worker_id, attempts=t.c.attempts + 1, started_at=now,
+                            heartbeat_at=now, lease_expires_at=now + timedelta(seconds=self.lease))
+        engine = self.engine()
+        with engine.begin() as conn:
+            next_rows = select(t.c.id).where(t.c.state == 'queued').order_by(t.c.sort_key)
+            if engine.dialect.name == 'postgresql':
+                # Rows locked by other claimers are skipped, not waited on
+                job_id = conn.execute(next_rows.limit(1).with_for_update(skip_locked=True)).scalar()
+                if job_id is None:
+                    return None
+                conn.execute(update(t).where(t.c.id == job_id).values(**claim_values))
+            else:
+                # No SKIP LOCKED: the conditional update only succeeds for one claimer per row
+                job_id = None
+                for candidate in conn.execute(next_rows.limit(5)).scalars().all():
+                    if conn.execute(update(t).where(t.c.id == candidate, t.c.state == 'queued')
+                                    .values(**claim_values)).rowcount == 1:
+                        job_id = candidate
+                        break
+                    self.claim_conflicts += 1
+                if job_id is None:
+                    return None
+            row = conn.execute(select(t).where(t.c.id == job_id)).mappings().first()
+        self.claimed += 1
+        return dict(row)
+
+    def record_progress(self, job_id, event, data):
+        """Store a job's latest progress event for the relay; chunk progress is throttled"""
+        now = time.monotonic()
+        if event == 'translating' and now - self._last_progress.get(job_id, 0.0) < self.progress_interval:
+            return
+        self._last_progress[job_id] = now
+        t = self.table
+        try:
+            with self.engine().begin() as conn:
+                # A worker that lost its lease must not overwrite the new owner's progress
+                conn.execute(update(t).where(t.c.id == job_id, t.c.worker_id == self._worker_id).values(
+                    progress_seq=t.c.progress_seq + 1, progress_event=event,
+                    progress_data=json.dumps(data, default=str)
+                ))
+        except Exception as e:
+            logging.debug(f"Could not record progress for queued job {job_id}: {e}")
+
+    def finish(self, job_id, state, result=None, error=None):
+        """Record a job's outcome, unless its lease has meanwhile passed to another worker"""
+        t = self.table
+        try:
+            with self.engine().begin() as conn:
+                updated = conn.execute(update(t).where(t.c.id == job_id, t.c.worker_id == self._worker_id,
+                                                       t.c.state == 'running').values(
+                    state=state, finished_at=datetime.utcnow(), lease_expires_at=None, error=error,
+                    result=json.dumps(result, ensure_ascii=False) if result is not None else None
+                )).rowcount
+        except Exception as e:
+            logging.error(f"Could not record outcome of queued job {job_id}: {e}")
+            return
+        if not updated:
+            self.lost_leases += 1
+            logging.warning(f"Queued job {job_id} finished after its lease was lost; outcome not recorded")
+        elif state == 'done':
+            self.completed += 1
+        elif state == 'cancelled':
+            self.cancelled += 1
+        else:
+            self.failed += 1
+
+    def _run_heartbeat(self):
+        while not self._stop_event.wait(self.heartbeat_interval):
+            job_ids = list(self._running)
+            if not job_ids:
+                continue
+            try:
+                for job_id, reason in self.heartbeat(job_ids).items():
+                    token = self._running.get(job_id)
+                    if token is not None:
+                        token.cancel(reason)
+            except Exception as e:
+                logging.warning(f"Job queue heartbeat failed: {e}")
+
+    def heartbeat(self, job_ids):
+        """Extend this worker's leases; returns {job id: reason} for jobs that should stop
+
+        A job stops with reason 'lease_lost' when its lease could not be
+        renewed (it expired and the row was requeued, possibly to another
+        worker), when it was cancelled elsewhere, or when its progress
+        streams were open at some point and none has been seen for
+        disconnect_grace seconds.
+        """
+        t = self.table
+        now = datetime.utcnow()
+        not_renewed = set()
+        with self.engine().begin() as conn:
+            for job_id in job_ids:
+                if not conn.execute(update(t).where(t.c.id == job_id, t.c.worker_id == self._worker_id,
+                                                    t.c.state == 'running')
+                                    .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=self.lease))
+                                    ).rowcount:
+                    not_renewed.add(job_id)
+            rows = conn.execute(select(t.c.id, t.c.worker_id, t.c.cancel_reason, t.c.watched_at)
+                                .where(t.c.id.in_(job_ids))).all()
+        stop = {}
+        for row in rows:
+            if row.id in not_renewed:
+                # Still ours means the job finished since the snapshot; anything else is a lost lease
+                if row.worker_id != self._worker_id:
+                    stop[row.id] = 'lease_lost'
+            elif row.cancel_reason is not None:
+                stop[row.id] = row.cancel_reason
+            elif self.disconnect_grace and row.watched_at is not None \
+                    and now - row.watched_at > timedelta(seconds=self.disconnect_grace):
+                stop[row.id] = 'disconnected'
+        lost = sorted(job_id for job_id, reason in stop.items() if reason == 'lease_lost')
+        if lost:
+            self.lost_leases += len(lost)
+            logging.warning(f"Lost the lease on queued job(s) {lost}; stopping them here")
+        return stop
+
+    def _maintain(self):
+        """Requeue jobs of dead workers and purge old rows, at most twice per lease period"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_maintenance < self.lease / 2:
+                return
+            self._last_maintenance = now
+        self.requeue_expired()
+
+    def requeue_expired(self):
+        """Put running jobs whose lease ran out back in the queue; returns how many were requeued"""
+        t = self.table
+        now = datetime.utcnow()
+        expired = and_(t.c.state == 'running', t.c.lease_expires_at < now)
+        with self.engine().begin() as conn:
+            gave_up = conn.execute(update(t).where(expired, t.c.attempts >= self.max_attempts).values(
+                state='failed', worker_id=None, finished_at=now,
+                error=f'Worker stopped responding ({self.max_attempts} attempts)'
+            )).rowcount
+            requeued = conn.execute(update(t).where(expired).values(
+                state='queued', worker_id=None, lease_expires_at=None
+            )).rowcount
+            if self.retention:
+                conn.execute(delete(t).where(t.c.state.in_(self.TERMINAL_STATES),
+                                             t.c.finished_at < now - timedelta(seconds=self.retention)))
+        if requeued or gave_up:
+            logging.warning(f"Requeued {requeued} job(s) from unresponsive workers, gave up on {gave_up}")
+        self.requeued += requeued
+        self.expired += gave_up
+        return requeued
+
+    def stats(self):
+        result = {
+            'worker_id': self._worker_id if self._worker_pid == os.getpid() else None,
+            'running_here': len(self._running) if self._worker_pid == os.getpid() else 0,
+            'watching': len(self._watched),
+            'enqueued': self.enqueued,
+            'claimed': self.claimed,
+            'claim_conflicts': self.claim_conflicts,
+            'completed': self.completed,
+            'failed': self.failed,
+            'cancelled': self.cancelled,
+            'lost_leases': self.lost_leases,
+            'requeued': self.requeued,
+            'expired': self.expired,
+            'relayed_events': self.relayed_events,
+        }
+        t = self.table
+        try:
+            with self.engine().connect() as conn:
+                result['states'] = {state: count for state, count in
+                                    conn.execute(select(t.c.state, func.count()).group_by(t.c.state)).all()}
+                oldest = conn.execute(select(func.min(t.c.created_at)).where(t.c.state == 'queued')).scalar()
+            result['oldest_queued_s'] = round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0.0
+        except Exception as e:
+            result['error'] = str(e)
+        return result
@@ -0,0 +1,540 @@
+import io
+import json
+import logging
+import contextlib
+import time
+import signal
+import threading
+import click
+from datetime import datetime, timedelta
+from app import app, db, history_writer, progress_tracker, cancellations
+from models import TranslationHistory, DocumentVersion, QueuedJob, JobTimeline
+from scheduler import FairShareScheduler
+from job_queue import JobQueue
+from artifact_store import ArtifactStore
+from lang_detect import detect_pages, summarize_detections
+from cancellation import JobCancelled
+from tracing import JobTrace, traced
+
+
+class TranslationJob:
+    """Everything needed to run one document through the translation pipeline"""
+
+    def __init__(self, task_id, session_id, file_id, original_filename, upload_path,
+                 source_lang, target_lang, file_size, download_url=None, parent_id=None, upload_data=None):
+        self.task_id = task_id
+        self.session_id = session_id
+        self.file_id = file_id
+        self.original_filename = original_filename
+        self.upload_path = upload_path
+        # Small uploads stay in memory instead of going through upload_path
+        self.upload_data = upload_data
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.file_size = file_size
+        self.download_url = download_url
+        self.parent_id = parent_id
+        self.cost = 1.0
+        self.profile = None
+        # Per-page source languages, set only for mixed-language documents
+        self.page_languages = None
+        # Set when the job is registered for cancellation; checked between stages
+        self.cancel_token = None
+        # Extra progress sink, used by queue workers to report back to the enqueuing host
+        self.on_event = None
+        # Admission ticket holding this job's share of the process's capacity
+        self.admission = None
+        # Span timeline (JobTrace), stored with the history row when the job finishes
+        self.trace = None
+        # perf_counter() value when the job was handed to a scheduler or queue
+        self.queued_at = None
+
+    def estimate_cost(self, page_count, char_count):
+        """Scheduling cost from cheap pre-translation measurements"""
+        self.cost = page_count + char_count / 2000.0
+        return self.cost
+
+    @property
+    def source(self):
+        """The uploaded PDF, as bytes for in-memory jobs or as a file path"""
+        return self.upload_data if self.upload_data is not None else self.upload_path
+
+    @property
+    def translated_filename(self):
+        return f"translated_{self.file_id}_{self.original_filename}"
+
+    @property
+    def preview_filename(self):
+        return f"preview_{self.file_id}_{self.original_filename}"
+
+    def publish(self, event, **data):
+        progress_tracker.publish(self.task_id, event, **data)
+        if self.on_event is not None:
+            self.on_event(event, data)
+
+    def check_cancelled(self, stage):
+        """Raise JobCancelled if the job was cancelled or is past its deadline"""
+        if self.cancel_token is not None:
+            self.cancel_token.check(stage)
+
+    def release_admission(self):
+        """Give the job's admitted capacity back; safe to call more than once"""
+        if self.admission is not None:
+            self.admission.release()
+
+
+def detect_source_language(job, pages):
+    """Resolve an 'auto' source language locally from the extracted pages
+
+    Sets the job's source language to the document's main language and, for
+    mixed-language documents, its per-page languages. Returns the per-page
+    language list, or None if no language could be detected.
+    """
+    with traced(job.trace, 'detect_language'):
+        detections = detect_pages(pages, sample_chars=app.config['LANG_DETECT_SAMPLE_CHARS'])
+        language, confidence, page_languages = summarize_detections(detections, pages)
+    if language is None:
+        return None
+
+    job.source_lang = language
+    languages = {}
+    for page_language in page_languages:
+        languages[page_language] = languages.get(page_language, 0) + 1
+    if len(languages) > 1:
+        job.page_languages = page_languages
+    logging.info(f"Detected source language {language} ({confidence:.2f}); pages per language: {languages}")
+    job.publish('detected', language=language, confidence=confidence, languages=languages,
+                page_languages=page_languages)
+    return page_languages
+
+
+def language_sections(job, processor, pages):
+    """Per-language (text, source language) sections for mixed documents, else None"""
+    if not job.page_languages:
+        return None
+    return processor.language_sections(pages, job.page_languages)
+
+
+def find_previous_version(session_id, original_filename, source_lang, target_lang, parent_id=None):
+    """Find the earlier translation a revised upload should reuse, if any
+
+    An explicit parent id wins; otherwise the latest version of the same
+    filename and language pair in this session is used.
+    """
+    if parent_id:
+        version = DocumentVersion.query.filter_by(id=parent_id, session_id=session_id).first()
+        if version is not None and (version.source_language, version.target_language) == (source_lang, target_lang):
+            return {'id': version.id, 'segments': json.loads(version.segments or '{}'),
+                    'page_hashes': json.loads(version.page_hashes or '[]')}
+        return None
+
+    filters = dict(session_id=session_id, original_filename=original_filename,
+                   source_language=source_lang, target_language=target_lang)
+
+    # Versions still waiting in the write-behind queue are newer than anything committed
+    pending = history_writer.pending(DocumentVersion, **filters)
+    if pending:
+        latest = pending[-1]
+        return {'id': None, 'segments': json.loads(latest['segments']),
+                'page_hashes': json.loads(latest['page_hashes'])}
+
+    version = DocumentVersion.query.filter_by(**filters).order_by(DocumentVersion.created_at.desc()).first()
+    if version is None:
+        return None
+    return {'id': version.id, 'segments': json.loads(version.segments or '{}'),
+            'page_hashes': json.loads(version.page_hashes or '[]')}
+
+
+@contextlib.contextmanager
+def profiled(job):
+    """Profile the enclosed stage if this job was selected for profiling"""
+    if job.profile is None:
+        yield
+        return
+    with job.profile.segment():
+        yield
+
+
+def finish_profile(job):
+    """Write the job's profile reports, if it has one"""
+    if job.profile is not None:
+        job.profile.finish()
+
+
+def make_processor(job):
+    """PDFProcessor that publishes its pipeline events to the job's progress channel"""
+    from pdf_processor import PDFProcessor
+    return PDFProcessor(progress_callback=job.publish, cancel_token=job.cancel_token, trace=job.trace)
+
+
+def record_timeline(job):
+    """Queue the job's span timeline for storage next to its history row"""
+    if job.trace is None:
+        return
+    history_writer.submit(
+        JobTimeline,
+        task_id=job.task_id,
+        session_id=job.session_id,
+        original_filename=job.original_filename,
+        translated_filename=job.translated_filename,
+        source_language=job.source_lang,
+        target_language=job.target_lang,
+        total_ms=job.trace.total_ms(),
+        stages=json.dumps(job.trace.stage_ms()),
+        critical_path=json.dumps(job.trace.critical_path(), ensure_ascii=False),
+        spans=json.dumps(job.trace.to_dict(), ensure_ascii=False),
+        created_at=datetime.utcnow()
+    )
+
+
+def stop_cancelled_job(job, error):
+    """Report a cancelled job and remove what it had written so far"""
+    logging.info(f"Job {job.task_id} stopped during {error.stage or 'unknown stage'}: {error.reason}")
+    job.publish('cancelled', reason=error.reason, stage=error.stage, message=str(error))
+    artifact_store.delete(artifact_store.find('downloads', job.preview_filename))
+    artifact_store.delete(job.upload_path)
+    cancellations.finish(job.task_id, error)
+
+
+def run_preview(job, processor, pages):
+    """Translate and render only the first pages of a document
+
+    Returns the preview's paragraph segments so the full job can reuse them.
+    """
+    with traced(job.trace, 'preview'):
+        return _run_preview(job, processor, pages)
+
+
+def _run_preview(job, processor, pages):
+    max_pages = app.config['PREVIEW_PAGES']
+    max_chars = app.config['PREVIEW_CHARS']
+
+    sections = language_sections(job, processor, pages[:max_pages]) or [(processor.join_pages(pages[:max_pages]), job.source_lang)]
+    preview_sections = []
+    remaining = max_chars
+    for section_text, section_lang in sections:
+        if len(section_text) > remaining:
+            # Cut at a paragraph boundary so the preview's segments stay reusable
+            cut = section_text.rfind('\n\n', 0, remaining)
+            section_text = section_text[:cut if cut > 0 else remaining]
+        preview_sections.append((section_text, section_lang))
+        remaining -= len(section_text)
+        if remaining <= 0:
+            break
+
+    preview_chars = sum(len(text) for text, _ in preview_sections)
+    logging.info(f"Preview: translating {preview_chars} chars from the first {min(max_pages, len(pages))} page(s)")
+    translated_text, segments, _ = processor.translate_incremental(None, job.source_lang, job.target_lang,
+                                                                   sections=preview_sections)
+
+    with artifact_store.writing('downloads', job.preview_filename) as preview_path, \
+            traced(job.trace, 'create_pdf'):
+        processor.create_pdf(translated_text, preview_path, job.original_filename, job.target_lang,
+                             source_pdf=job.source)
+    job.check_cancelled('preview')
+    return segments
+
+
+def run_translation_job(job, processor=None, pages=None, text_content=None, seed_segments=None):
+    """Translate, render and record a full document; returns a result summary"""
+    processor = processor or make_processor(job)
+    if job.trace is not None and job.queued_at is not None:
+        job.trace.record('queue_wait', job.queued_at, time.perf_counter())
+    try:
+        # Jobs cancelled while queued stop before doing any work
+        job.check_cancelled('queued')
+        if pages is None:
+            pages, text_content = processor.extract_document(job.source)
+        elif text_content is None:
+            text_content = processor.join_pages(pages)
+        if job.source_lang == 'auto' and detect_source_language(job, pages) is None:
+            raise ValueError('Could not detect the language of the document')
+
+        # Link revised uploads to their earlier version so unchanged paragraphs are reused
+        with traced(job.trace, 'previous_version'):
+            previous = find_previous_version(job.session_id, job.original_filename,
+                                             job.source_lang, job.target_lang, parent_id=job.parent_id)
+        page_hashes = [processor.fingerprint(page) for page in pages]
+        known_segments = dict(previous['segments']) if previous else {}
+        if seed_segments:
+            known_segments.update(seed_segments)
+
+        # Translate text
+        logging.info(f"Starting translation from {job.source_lang} to {job.target_lang}")
+        translated_text, segments, reuse = processor.translate_incremental(
+            text_content, job.source_lang, job.target_lang, previous_segments=known_segments,
+            sections=language_sections(job, processor, pages)
+        )
+        if previous:
+            previous_pages = set(previous['page_hashes'])
+            reuse['unchanged_pages'] = sum(1 for h in page_hashes if h in previous_pages)
+            reuse['pages'] = len(page_hashes)
+            logging.info(f"Reused {reuse['reused_paragraphs']}/{reuse['paragraphs']} paragraphs "
+                         f"({reuse['reused_chars']}/{reuse['total_chars']} chars) from previous version")
+
+        # Generate translated PDF
+        logging.info("Generating translated PDF...")
+        compaction = None
+        if job.upload_data is not None:
+            # Small job: render into memory, serve from there and persist in the background
+            buffer = io.BytesIO()
+            with traced(job.trace, 'create_pdf'):
+                processor.create_pdf(translated_text, buffer, job.original_filename, job.target_lang,
+                                     source_pdf=job.upload_data)
+            if app.config['PDF_COMPACT']:
+                with traced(job.trace, 'compact_pdf'):
+                    compaction = processor.compact_pdf(buffer)
+            job.check_cancelled('rendering')
+            artifact_store.put_async('downloads', job.translated_filename, buffer.getvalue())
+        else:
+            with artifact_store.writing('downloads', job.translated_filename) as translated_path:
+                with traced(job.trace, 'create_pdf'):
+                    processor.create_pdf(translated_text, translated_path, job.original_filename, job.target_lang,
+                                         source_pdf=job.upload_path)
+                if app.config['PDF_COMPACT']:
+                    with traced(job.trace, 'compact_pdf'):
+                        compaction = processor.compact_pdf(translated_path)
+                # Raising here discards the rendered temp file
+                job.check_cancelled('rendering')
+
+        # Last checkpoint before anything is recorded, e.g. for a queued job whose lease moved on
+        job.check_cancelled('recording')
+
+        # Queue the history insert; the background writer commits it in batches
+        with traced(job.trace, 'db_write'):
+            history_writer.submit(
+                TranslationHistory,
+                session_id=job.session_id,
+                original_filename=job.original_filename,
+                translated_filename=job.translated_filename,
+                source_language=job.source_lang,
+                target_language=job.target_lang,
+                file_size=job.file_size,
+                created_at=datetime.utcnow()
+            )
+            history_writer.submit(
+                DocumentVersion,
+                session_id=job.session_id,
+                parent_id=previous['id'] if previous else None,
+                original_filename=job.original_filename,
+                translated_filename=job.translated_filename,
+                source_language=job.source_lang,
+                target_language=job.target_lang,
+                page_hashes=json.dumps(page_hashes),
+                segments=json.dumps(segments, ensure_ascii=False),
+                total_paragraphs=reuse['paragraphs'],
+                reused_paragraphs=reuse['reused_paragraphs'],
+                created_at=datetime.utcnow()
+            )
+        record_timeline(job)
+
+        job.publish('done', download_url=job.download_url, compaction=compaction, reuse=reuse)
+        return {'translated_filename': job.translated_filename, 'compaction': compaction,
+                'reuse': reuse, 'reused_previous': previous is not None}
+
+    except JobCancelled as e:
+        if e.reason == 'lease_lost':
+            # The job was requeued to another worker, which now owns its upload, preview and progress
+            logging.warning(f"Job {job.task_id} stopped during {e.stage or 'unknown stage'}: lease lost")
+            job.upload_path = None
+        else:
+            stop_cancelled_job(job, e)
+        raise
+    except Exception as e:
+        logging.error(f"Translation error: {str(e)}")
+        job.publish('error', message=f'Translation failed: {str(e)}')
+        raise
+    finally:
+        # Clean up uploaded file immediately
+        artifact_store.delete(job.upload_path)
+        job.upload_data = None
+        cancellations.finish(job.task_id)
+        job.release_admission()
+
+
+class JobRunner:
+    """Runs translation jobs through the fair-share scheduler inside the app context"""
+
+    def __init__(self, workers=2, small_cost=10, large_cost=100, aging_rate=1.0):
+        self.scheduler = FairShareScheduler(workers=workers, small_cost=small_cost, large_cost=large_cost,
+                                            aging_rate=aging_rate, name='translation-job')
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def submit(self, job, **kwargs):
+        """Queue a job to run through run_translation_job; returns a Future"""
+        self.submitted += 1
+        job.queued_at = time.perf_counter()
+        job.publish('queued', priority=self.scheduler.classify(job.cost))
+        return self.scheduler.submit(job.session_id, job.cost, self._run, job, kwargs)
+
+    def _run(self, job, kwargs):
+        try:
+            with app.app_context(), profiled(job):
+                result = run_translation_job(job, **kwargs)
+            self.completed += 1
+            return result
+        except JobCancelled:
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            finish_profile(job)
+
+    def stats(self):
+        return dict(self.scheduler.stats(), submitted=self.submitted, completed=self.completed, failed=self.failed,
+                    cancelled=self.cancelled)
+
+
+def job_payload(job, seed_segments=None):
+    """JSON-serializable description of a job for the database queue"""
+    deadline = job.cancel_token.deadline if job.cancel_token is not None else None
+    return {
+        'session_id': job.session_id,
+        'file_id': job.file_id,
+        'original_filename': job.original_filename,
+        'upload_path': job.upload_path,
+        'source_lang': job.source_lang,
+        'target_lang': job.target_lang,
+        'file_size': job.file_size,
+        'download_url': job.download_url,
+        'parent_id': job.parent_id,
+        'page_languages': job.page_languages,
+        'seed_segments': seed_segments,
+        'trace': job.trace.to_dict() if job.trace is not None else None,
+        'enqueued_at': time.time(),
+        # Wall-clock time, since the job may run on another host
+        'deadline': time.time() + (deadline - time.monotonic()) if deadline is not None else None,
+    }
+
+
+def run_queued_job(row, token):
+    """Queue worker handler: rebuild the job from its row and run the pipeline"""
+    payload = json.loads(row['payload'])
+    job = TranslationJob(
+        task_id=row['task_id'],
+        session_id=payload['session_id'],
+        file_id=payload['file_id'],
+        original_filename=payload['original_filename'],
+        upload_path=payload['upload_path'],
+        source_lang=payload['source_lang'],
+        target_lang=payload['target_lang'],
+        file_size=payload['file_size'],
+        download_url=payload['download_url'],
+        parent_id=payload['parent_id']
+    )
+    job.page_languages = payload['page_languages']
+    if payload.get('trace') is not None:
+        # Continue the timeline started on the enqueuing host (offsets assume synced clocks)
+        job.trace = JobTrace.from_dict(payload['trace'])
+        job.queued_at = time.perf_counter() - (time.time() - payload['enqueued_at'])
+    if payload['deadline'] is not None:
+        token.deadline = time.monotonic() + (payload['deadline'] - time.time())
+    job.cancel_token = token
+    job.on_event = lambda event, data: job_queue.record_progress(row['id'], event, data)
+    logging.info(f"Running queued job {job.task_id} (attempt {row['attempts']})")
+    with app.app_context():
+        return run_translation_job(job, seed_segments=payload['seed_segments'])
+
+
+def submit_job(job, **kwargs):
+    """Run a job on this process's scheduler, or queue it for any host's workers; returns a Future"""
+    if job_queue is None:
+        return job_runner.submit(job, **kwargs)
+
+    if app.config['JOB_QUEUE_EMBEDDED'] and app.config['JOB_WORKERS'] > 0:
+        job_queue.start_workers(run_queued_job, threads=app.config['JOB_WORKERS'])
+    job.publish('queued', priority=job_runner.scheduler.classify(job.cost))
+    future = job_queue.submit(job.task_id, job.session_id, job_payload(job, kwargs.get('seed_segments')),
+                              job.cost, token=job.cancel_token)
+
+    def on_done(done):
+        error = done.exception()
+        if isinstance(error, JobCancelled):
+            stop_cancelled_job(job, error)
+        # Jobs cancelled while queued or abandoned by dead workers leave their upload behind
+        artifact_store.delete(job.upload_path)
+        cancellations.finish(job.task_id, error)
+        job.release_admission()
+        finish_profile(job)
+
+    future.add_done_callback(on_done)
+    return future
+
+
+def cancel_job(task_id, session_id):
+    """Cancel a job wherever it is queued or running; returns True if it was found"""
+    found = cancellations.cancel(task_id, session_id=session_id)
+    if job_queue is not None:
+        found = job_queue.request_cancel(task_id, session_id=session_id) or found
+    return found
+
+
+def queue_engine():
+    with app.app_context():
+        return db.engine
+
+
+def recent_artifact_names():
+    """Translated files referenced by recent history rows, including rows not yet written"""
+    cutoff = datetime.utcnow() - timedelta(hours=app.config['ARTIFACT_PROTECT_HOURS'])
+    rows = TranslationHistory.query.with_entities(TranslationHistory.translated_filename) \
+        .filter(TranslationHistory.created_at >= cutoff)
+    names = {row.translated_filename for row in rows}
+    names.update(fields['translated_filename'] for fields in history_writer.pending(TranslationHistory))
+    return names
+
+
+artifact_store = ArtifactStore(
+    {'uploads': app.config['UPLOAD_FOLDER'], 'downloads': app.config['DOWNLOAD_FOLDER']},
+    quota_bytes=app.config['ARTIFACT_QUOTA_MB'] * 1024 * 1024,
+    max_age=app.config['ARTIFACT_MAX_AGE_HOURS'] * 3600,
+    janitor_interval=app.config['ARTIFACT_JANITOR_INTERVAL'],
+    protected=recent_artifact_names,
+    app=app
+)
+
+job_runner = JobRunner(
+    workers=app.config['JOB_WORKERS'],
+    small_cost=app.config['SCHEDULER_SMALL_COST'],
+    large_cost=app.config['SCHEDULER_LARGE_COST'],
+    aging_rate=app.config['SCHEDULER_AGING_RATE']
+)
+
+job_queue = None
+if app.config['JOB_QUEUE'] == 'db':
+    job_queue = JobQueue(
+        QueuedJob.__table__,
+        queue_engine,
+        publish=progress_tracker.publish,
+        lease=app.config['JOB_LEASE'],
+        heartbeat_interval=app.config['JOB_HEARTBEAT'],
+        poll_interval=app.config['JOB_QUEUE_POLL'],
+        max_attempts=app.config['JOB_MAX_ATTEMPTS'],
+        aging_rate=app.config['SCHEDULER_AGING_RATE'],
+        watch_ttl=app.config['PROGRESS_TTL'],
+        listeners=progress_tracker.listeners,
+        disconnect_grace=app.config['DISCONNECT_GRACE'] if app.config['CANCEL_ON_DISCONNECT'] else 0
+    )
+
+
+@app.cli.command('queue-worker')
+@click.option('--threads', type=int, default=None, help='Jobs run at once (default: JOB_WORKERS)')
+def queue_worker_command(threads):
+    """Claim and run jobs from the database queue until interrupted"""
+    if job_queue is None:
+        raise click.ClickException('Set JOB_QUEUE=db to run a queue worker')
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    job_queue.start_workers(run_queued_job, threads=threads or app.config['JOB_WORKERS'])
+    try:
+        while not stop.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    click.echo('Finishing running jobs...')
+    job_queue.stop_workers()
@@ -0,0 +1,196 @@
+import collections
+import math
+import re
+
+# Scripts that identify a supported language on their own
+SCRIPT_LANGUAGES = {
+    'cyrillic': 'ru',
+    'arabic': 'ar',
+    'devanagari': 'hi',
+    'telugu': 'te',
+    'hangul': 'ko',
+    'kana': 'ja',
+    'han': 'zh',
+}
+
+# Inclusive code point ranges per script; anything else alphabetic is ignored
+SCRIPT_RANGES = (
+    ('latin', 0x0041, 0x005A), ('latin', 0x0061, 0x007A), ('latin', 0x00C0, 0x024F),
+    ('cyrillic', 0x0400, 0x04FF),
+    ('arabic', 0x0600, 0x06FF), ('arabic', 0x0750, 0x077F), ('arabic', 0xFB50, 0xFDFF), ('arabic', 0xFE70, 0xFEFF),
+    ('devanagari', 0x0900, 0x097F),
+    ('telugu', 0x0C00, 0x0C7F),
+    ('hangul', 0x1100, 0x11FF), ('hangul', 0x3130, 0x318F), ('hangul', 0xAC00, 0xD7AF),
+    ('kana', 0x3040, 0x30FF),
+    ('han', 0x3400, 0x4DBF), ('han', 0x4E00, 0x9FFF),
+)
+
+# Seed text for the Latin-script languages; trigram profiles are built from it on first use
+LATIN_SAMPLES = {
+    'en': "The document describes the results of the work and the changes that were made during the year. "
+          "All of the people who have been working on this project should read it with care, because it is "
+          "important for the future of the company and for those who will use these services. We would like "
+          "to thank everyone for their help and we hope that you find the information in this report useful. "
+          "Please contact us if there is anything that you do not understand or which should be changed.",
+    'es': "El documento describe los resultados del trabajo y los cambios que se hicieron durante el año. "
+          "Todas las personas que han trabajado en este proyecto deben leerlo con atención, porque es muy "
+          "importante para el futuro de la empresa y para quienes van a utilizar estos servicios. Queremos "
+          "agradecer a todos por su ayuda y esperamos que la información de este informe les sea útil. "
+          "Por favor, póngase en contacto con nosotros si hay algo que no entiende o que se deba cambiar.",
+    'fr': "Le document décrit les résultats du travail et les changements qui ont été faits pendant l'année. "
+          "Toutes les personnes qui ont travaillé sur ce projet doivent le lire avec attention, parce qu'il est "
+          "très important pour l'avenir de l'entreprise et pour ceux qui vont utiliser ces services. Nous "
+          "voulons remercier tout le monde pour leur aide et nous espérons que les informations de ce rapport "
+          "vous seront utiles. Veuillez nous contacter s'il y a quelque chose que vous ne comprenez pas.",
+    'de': "Das Dokument beschreibt die Ergebnisse der Arbeit und die Änderungen, die während des Jahres "
+          "gemacht wurden. Alle Menschen, die an diesem Projekt gearbeitet haben, sollten es sorgfältig lesen, "
+          "weil es für die Zukunft des Unternehmens und für diejenigen, die diese Dienste nutzen werden, sehr "
+          "wichtig ist. Wir möchten uns bei allen für ihre Hilfe bedanken und hoffen, dass Sie die Informationen "
+          "in diesem Bericht nützlich finden. Bitte kontaktieren Sie uns, wenn Sie etwas nicht verstehen.",
+    'it': "Il documento descrive i risultati del lavoro e i cambiamenti che sono stati fatti durante l'anno. "
+          "Tutte le persone che hanno lavorato a questo progetto dovrebbero leggerlo con attenzione, perché è "
+          "molto importante per il futuro della società e per coloro che useranno questi servizi. Vogliamo "
+          "ringraziare tutti per il loro aiuto e speriamo che le informazioni di questo rapporto vi siano utili. "
+          "Per favore contattateci se c'è qualcosa che non capite o che dovrebbe essere cambiato.",
+    'pt': "O documento descreve os resultados do trabalho e as mudanças que foram feitas durante o ano. "
+          "Todas as pessoas que trabalharam neste projeto devem lê-lo com atenção, porque é muito importante "
+          "para o futuro da empresa e para aqueles que vão utilizar estes serviços. Queremos agradecer a todos "
+          "pela sua ajuda e esperamos que as informações deste relatório sejam úteis para você. Por favor, "
+          "entre em contato conosco se houver algo que você não entende ou que deveria ser mudado.",
+}
+
+# Share of CJK ideographs+kana that must be kana before the text counts as Japanese
+KANA_SHARE_FOR_JAPANESE = 0.1
+
+_profiles = None
+_word_re = re.compile(r"[^\W\d_]+")
+
+
+def script_of(char):
+    """Name of the script a character belongs to, or None"""
+    code = ord(char)
+    for script, low, high in SCRIPT_RANGES:
+        if low <= code <= high:
+            return script
+    return None
+
+
+def script_histogram(text):
+    """Count letters per script"""
+    counts = collections.Counter()
+    for char in text:
+        if char.isalpha() or 0x0900 <= ord(char) <= 0x0C7F:  # Indic vowel signs are not isalpha()
+            script = script_of(char)
+            if script is not None:
+                counts[script] += 1
+    return counts
+
+
+def trigrams(text):
+    """Character trigrams of the lowercased words in text, padded at word boundaries"""
+    counts = collections.Counter()
+    for word in _word_re.findall(text.lower()):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            counts[padded[i:i + 3]] += 1
+    return counts
+
+
+def _latin_profiles():
+    """Log-probability trigram profiles for the Latin-script languages, built once"""
+    global _profiles
+    if _profiles is None:
+        profiles = {}
+        for language, sample in LATIN_SAMPLES.items():
+            counts = trigrams(sample)
+            total = sum(counts.values())
+            # Add-one smoothing over the sample's own vocabulary, with a floor for unseen trigrams
+            denominator = total + len(counts) + 1
+            profiles[language] = ({gram: math.log((n + 1) / denominator) for gram, n in counts.items()},
+                                  math.log(1 / denominator))
+        _profiles = profiles
+    return _profiles
+
+
+def _detect_latin(text, candidates):
+    """Best Latin-script language and its probability among the candidates"""
+    grams = trigrams(text)
+    if not grams:
+        return None, 0.0
+    scores = {}
+    for language, (profile, unseen) in _latin_profiles().items():
+        if candidates is None or language in candidates:
+            scores[language] = sum(n * profile.get(gram, unseen) for gram, n in grams.items())
+    if not scores:
+        return None, 0.0
+    best = max(scores, key=scores.get)
+    total = sum(math.exp(score - scores[best]) for score in scores.values())
+    return best, 1.0 / total
+
+
+def detect_language(text, candidates=None, min_letters=20):
+    """Detect the language of a piece of text locally
+
+    The dominant Unicode script decides the language for scripts used by a
+    single supported language; Latin text is scored against trigram
+    profiles. Returns (language code, confidence), or (None, 0.0) when the
+    text has too few letters to tell.
+    """
+    histogram = script_histogram(text)
+    letters = sum(histogram.values())
+    if letters < min_letters:
+        return None, 0.0
+
+    # Japanese mixes kana with ideographs; count both towards the CJK decision
+    cjk = histogram['han'] + histogram['kana']
+    if cjk and histogram['kana'] >= KANA_SHARE_FOR_JAPANESE * cjk:
+        histogram['kana'] += histogram.pop('han', 0)
+
+    script, count = histogram.most_common(1)[0]
+    share = count / letters
+    if script == 'latin':
+        language, probability = _detect_latin(text, candidates)
+        return language, round(share * probability, 3)
+
+    language = SCRIPT_LANGUAGES[script]
+    if candidates is not None and language not in candidates:
+        return None, 0.0
+    return language, round(share, 3)
+
+
+def detect_pages(pages, candidates=None, sample_chars=2000):
+    """Detect the language of every page from a sample of its text
+
+    Each page is judged on its first sample_chars characters, which keeps
+    detection cheap on long documents. Returns one entry per page.
+    """
+    detections = []
+    for number, page in enumerate(pages, start=1):
+        language, confidence = detect_language(page[:sample_chars], candidates)
+        detections.append({'page': number, 'language': language, 'confidence': confidence})
+    return detections
+
+
+def summarize_detections(detections, pages):
+    """Pick the document language and assign undetected pages to it
+
+    The document language is the one covering the most characters. Pages
+    with too little text to detect take the language of the page before
+    them (or the document language), so they stay in the same batch.
+    Returns the document language, its confidence and the per-page language list.
+    """
+    weights = collections.Counter()
+    confidence = collections.defaultdict(list)
+    for detection, page in zip(detections, pages):
+        if detection['language'] is not None:
+            weights[detection['language']] += len(page)
+            confidence[detection['language']].append(detection['confidence'])
+    if not weights:
+        return None, 0.0, [None] * len(pages)
+
+    language = weights.most_common(1)[0][0]
+    page_languages = []
+    for detection in detections:
+        page_languages.append(detection['language'] or (page_languages[-1] if page_languages else language))
+    scores = confidence[language]
+    return language, round(sum(scores) / len(scores), 3), page_languages
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import re
+
+# Separator line placed before every packed segment but the first; numbered so
+# a response whose markers were dropped, merged or reordered is detected
+_MARKER = '\n[[{}]]\n'
+_MARKER_PATTERN = re.compile(r'\s*\[\[\s*(\d+)\s*\]\]\s*')
+
+
+class MicroBatcher:
+    """Coalesces small chunks from concurrent jobs into shared backend requests
+
+    Chunks for the same (source, target) pair that arrive within window
+    seconds of each other are packed into one request, separated by
+    numbered marker lines, and the response is split back at the markers.
+    A batch is sent early once it reaches max_chars or max_segments. If
+    the response does not split into exactly the packed segments, or the
+    packed request fails, every segment is retried on its own, so batching
+    never makes a chunk fail that would have succeeded alone. Translations
+    are stripped of surrounding whitespace whether they were sent packed or
+    alone.
+
+    Runs on the translation client's event loop; send(text, source, target)
+    is the coroutine that performs one backend request, and skip_error is
+    raised for chunks whose job stopped while they waited.
+    """
+
+    def __init__(self, send, window=0.005, max_chars=4500, max_segments=32, skip_error=Exception):
+        self.send = send
+        self.skip_error = skip_error
+        self.window = window
+        self.max_chars = max_chars
+        self.max_segments = max_segments
+        # (source, target) -> list of (text, future, should_stop) waiting for the window to close
+        self._pending = {}
+        self._sizes = {}
+        self._timers = {}
+
+        # Metrics
+        self.segments = 0
+        self.batches = 0
+        self.batched_segments = 0
+        self.fallbacks = 0
+        self.requests_saved = 0
+        self.skipped = 0
+
+    def accepts(self, text):
+        """True if a chunk is small enough to share a request and cannot be confused with a marker"""
+        return len(text) <= self.max_chars // 2 and _MARKER_PATTERN.search(text) is None
+
+    async def translate(self, text, source_lang, target_lang, should_stop=None):
+        """Queue a chunk for the next batch of its language pair and wait for its translation"""
+        key = (source_lang, target_lang)
+        future = asyncio.get_running_loop().create_future()
+        size = self._sizes.get(key, 0) + len(text) + len(_MARKER)
+        if key in self._pending and size > self.max_chars:
+            # Would overflow the open batch: send that one now and start a new one
+            self._flush(key)
+            size = len(text) + len(_MARKER)
+        if key not in self._pending:
+            self._pending[key] = []
+            self._timers[key] = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+        self._pending[key].append((text, future, should_stop))
+        self._sizes[key] = size
+        self.segments += 1
+        if len(self._pending[key]) >= self.max_segments:
+            self._flush(key)
+        return await future
+
+    def _flush(self, key):
+        items = self._pending.pop(key, None)
+        self._sizes.pop(key, None)
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if items:
+            asyncio.ensure_future(self._send_batch(key, items))
+
+    async def _send_batch(self, key, items):
+        live = []
+        for text, future, should_stop in items:
+            if should_stop is not None and should_stop():
+                # The job stopped while its chunk was waiting for the window
+                self.skipped += 1
+                if not future.done():
+                    future.set_exception(self.skip_error())
+            else:
+                live.append((text, future))
+        if not live:
+            return
+        if len(live) == 1:
+            await self._send_one(key, *live[0])
+            return
+
+        self.batches += 1
+        self.batched_segments += len(live)
+        packed = live[0][0] + ''.join(_MARKER.format(i) + text for i, (text, _) in enumerate(live) if i)
+        try:
+            pieces = self.split(await self.send(packed, *key), len(live))
+        except Exception as e:
+            logging.debug(f"Packed request of {len(live)} segments failed ({e}); sending them one by one")
+            pieces = None
+        if pieces is None:
+            # The packed request was wasted on top of one request per segment
+            self.fallbacks += 1
+            self.requests_saved -= 1
+            await asyncio.gather(*(self._send_one(key, text, future) for text, future in live))
+            return
+        self.requests_saved += len(live) - 1
+        for (_, future), piece in zip(live, pieces):
+            if not future.done():
+                future.set_result(piece)
+
+    async def _send_one(self, key, text, future):
+        try:
+            result = await self.send(text, *key)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result.strip())
+
+    @staticmethod
+    def split(translated, count):
+        """Pieces of a packed translation, or None unless markers 1..count-1 all came back in order"""
+        parts = _MARKER_PATTERN.split(translated)
+        pieces, numbers = parts[0::2], parts[1::2]
+        if numbers != [str(i) for i in range(1, count)]:
+            return None
+        return [piece.strip() for piece in pieces]
+
+    def stats(self):
+        return {
+            'window_ms': round(self.window * 1000, 1),
+            'segments': self.segments,
+            'batches': self.batches,
+            'batched_segments': self.batched_segments,
+            'fallbacks': self.fallbacks,
+            'requests_saved': self.requests_saved,
+            'skipped': self.skipped,
+            'pending': sum(len(items) for items in self._pending.values()),
+        }
@@ -13,3 +13,77 @@ class TranslationHistory(db.Model):
     
     def __repr__(self):
         return f'<TranslationHistory {self.original_filename} -> {self.translated_filename}>'
+
+
+class DocumentVersion(db.Model):
+    """Per-paragraph fingerprints of a translated document, used to reuse work on revisions"""
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(128), nullable=False, index=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('document_version.id'))
+    original_filename = db.Column(db.String(255), nullable=False)
+    translated_filename = db.Column(db.String(255), nullable=False)
+    source_language = db.Column(db.String(10), nullable=False)
+    target_language = db.Column(db.String(10), nullable=False)
+    page_hashes = db.Column(db.Text)  # JSON list of per-page fingerprints
+    segments = db.Column(db.Text)  # JSON map of paragraph fingerprint -> translation
+    total_paragraphs = db.Column(db.Integer)
+    reused_paragraphs = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DocumentVersion {self.original_filename} ({self.reused_paragraphs}/{self.total_paragraphs} reused)>'
+
+
+class JobTimeline(db.Model):
+    """Span timeline of a finished job, written with its TranslationHistory row"""
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.String(64), nullable=False, index=True)
+    session_id = db.Column(db.String(128), nullable=False)
+    original_filename = db.Column(db.String(255), nullable=False)
+    translated_filename = db.Column(db.String(255), nullable=False, index=True)
+    source_language = db.Column(db.String(10), nullable=False)
+    target_language = db.Column(db.String(10), nullable=False)
+    total_ms = db.Column(db.Float, nullable=False)  # upload to history write
+    stages = db.Column(db.Text)  # JSON map of top-level stage -> ms
+    critical_path = db.Column(db.Text)  # JSON list of the spans that determined total_ms
+    spans = db.Column(db.Text)  # JSON trace (see tracing.JobTrace.to_dict)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_job_timeline_slowest', 'created_at', 'total_ms'),
+    )
+    
+    def __repr__(self):
+        return f'<JobTimeline {self.task_id} {self.total_ms:.0f}ms>'
+
+
+class QueuedJob(db.Model):
+    """A translation job in the shared database queue (JOB_QUEUE=db), claimed by any host's workers"""
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.String(64), nullable=False, unique=True)
+    session_id = db.Column(db.String(128), nullable=False)
+    state = db.Column(db.String(16), nullable=False, default='queued')  # queued, running, done, failed, cancelled
+    sort_key = db.Column(db.Float, nullable=False)  # cost + aging rate * enqueue time; lowest is claimed first
+    payload = db.Column(db.Text, nullable=False)  # JSON job description
+    worker_id = db.Column(db.String(128))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    lease_expires_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    cancel_reason = db.Column(db.String(16))
+    watched_at = db.Column(db.DateTime)  # last time a progress stream for the job was open on any host
+    progress_seq = db.Column(db.Integer, nullable=False, default=0)
+    progress_event = db.Column(db.String(32))
+    progress_data = db.Column(db.Text)  # JSON data of the latest progress event
+    result = db.Column(db.Text)  # JSON result summary
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_queued_job_claim', 'state', 'sort_key'),
+        db.Index('ix_queued_job_lease', 'state', 'lease_expires_at'),
+    )
+    
+    def __repr__(self):
+        return f'<QueuedJob {self.task_id} {self.state}>'
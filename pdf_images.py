@@ -0,0 +1,178 @@
+# Image pass-through from the source PDF to the rendered translation.
+# Imported lazily by PDFProcessor, so PyMuPDF and ReportLab are loaded here directly.
+import io
+import logging
+import os
+import re
+import fitz  # PyMuPDF
+from reportlab.platypus import Flowable
+
+# Paragraph standing in for a source image while the text goes through translation
+IMAGE_MARKER = re.compile(r'\[\[image:(\d+):(\d+)x(\d+)\]\]')
+
+# Images smaller than this (in points) are usually rules, bullets or spacers
+MIN_IMAGE_SIZE = 16
+
+_REFERENCE = re.compile(r'\b(\d+) (\d+) R\b')
+
+
+def image_marker(xref, width, height):
+    return f"[[image:{xref}:{int(round(width))}x{int(round(height))}]]"
+
+
+def page_text_with_images(page, min_size=MIN_IMAGE_SIZE):
+    """Page text with image markers placed before the first text block below each image
+
+    Returns None for pages without images, so their text is extracted as before.
+    """
+    images = []
+    for info in page.get_image_info(xrefs=True):
+        x0, y0, x1, y1 = info['bbox']
+        # xref 0 is an inline image, which has no stream to copy
+        if info.get('xref') and x1 - x0 >= min_size and y1 - y0 >= min_size:
+            images.append((y0, image_marker(info['xref'], x1 - x0, y1 - y0)))
+    if not images:
+        return None
+    images.sort(key=lambda image: image[0])
+
+    parts = []
+    remaining = iter(images)
+    pending = next(remaining, None)
+    for block in page.get_text('blocks'):
+        if block[6] != 0:  # image block
+            continue
+        while pending is not None and pending[0] <= block[1]:
+            parts.append(f"\n\n{pending[1]}\n\n")
+            pending = next(remaining, None)
+        parts.append(block[4])
+    while pending is not None:
+        parts.append(f"\n\n{pending[1]}\n\n")
+        pending = next(remaining, None)
+    return "".join(parts)
+
+
+class ImagePlaceholder(Flowable):
+    """Reserves space for a source image in the story and records where it lands"""
+
+    def __init__(self, xref, width, height, max_width, max_height, placements):
+        super().__init__()
+        scale = min(1.0, max_width / width, max_height / height)
+        self.xref = xref
+        self.width = width * scale
+        self.height = height * scale
+        self.placements = placements
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        x, y = self.canv.absolutePosition(0, 0)
+        self.placements.append((self.canv.getPageNumber() - 1, x, y, self.width, self.height, self.xref))
+
+
+def _split_strings(definition):
+    """Split PDF object source into (is_string, text) runs, so literal and hex strings are left alone"""
+    runs = []
+    start = i = 0
+    while i < len(definition):
+        if definition.startswith('<<', i):
+            i += 2
+            continue
+        char = definition[i]
+        if char == '<':
+            end = definition.find('>', i)
+            end = len(definition) if end < 0 else end + 1
+        elif char == '(':
+            # Literal strings may hold balanced parentheses and backslash escapes
+            depth, end = 0, i
+            while end < len(definition):
+                if definition[end] == '\\':
+                    end += 2
+                    continue
+                if definition[end] == '(':
+                    depth += 1
+                elif definition[end] == ')':
+                    depth -= 1
+                    if depth == 0:
+                        break
+                end += 1
+            end = min(end + 1, len(definition))
+        else:
+            i += 1
+            continue
+        runs.append((False, definition[start:i]))
+        runs.append((True, definition[i:end]))
+        start = i = end
+    runs.append((False, definition[start:]))
+    return runs
+
+
+def copy_object(source, target, xref, copied):
+    """Copy an object and everything it references into target, keeping streams encoded
+
+    Stream bytes are copied raw, so JPEG, JPX, JBIG2 and Flate images are
+    never decoded or recompressed. Indirect references are rewritten outside
+    string literals only. Returns the object's xref in target.
+    """
+    if xref in copied:
+        return copied[xref]
+    new_xref = target.get_new_xref()
+    copied[xref] = new_xref  # registered first so reference cycles terminate
+
+    def remap(match):
+        referenced = int(match.group(1))
+        # A reference to an object the source does not have reads as null
+        if not 0 < referenced < source.xref_length():
+            return 'null'
+        return f"{copy_object(source, target, referenced, copied)} 0 R"
+
+    definition = ''.join(text if is_string else _REFERENCE.sub(remap, text)
+                         for is_string, text in _split_strings(source.xref_object(xref, compressed=True)))
+    target.update_object(new_xref, definition)
+    if source.xref_is_stream(xref):
+        # Writing an uncompressed stream drops the filter keys; restore them for the raw bytes
+        filters = [(key, target.xref_get_key(new_xref, key)) for key in ('Filter', 'DecodeParms')]
+        target.update_stream(new_xref, source.xref_stream_raw(xref), new=True, compress=False)
+        for key, (kind, value) in filters:
+            if kind != 'null':
+                target.xref_set_key(new_xref, key, value)
+    return new_xref
+
+
+def embed_images(source_path, output_path, placements):
+    """Draw recorded placeholder positions into the rendered PDF with the source images
+
+    The source may be a path or the PDF's bytes, the output a path or an
+    io.BytesIO buffer. Each source image is copied once, however many times
+    it is placed. Returns the number of distinct image objects copied.
+    """
+    from pdf_processor import PDFProcessor
+
+    if not placements or (isinstance(source_path, str) and not os.path.exists(source_path)):
+        return 0
+
+    in_memory = isinstance(output_path, io.BytesIO)
+    source = PDFProcessor.open_pdf(source_path)
+    target = fitz.open(stream=output_path.getvalue(), filetype='pdf') if in_memory else fitz.open(output_path)
+    copied = {}
+    try:
+        for page_index, x, y, width, height, xref in placements:
+            page = target[page_index]
+            # ReportLab measures from the bottom-left corner, PyMuPDF from the top-left
+            top = page.rect.height - y - height
+            try:
+                image_xref = copy_object(source, target, xref, copied)
+                page.insert_image(fitz.Rect(x, top, x + width, top + height), xref=image_xref, keep_proportion=False)
+            except Exception as e:
+                logging.warning(f"Could not carry image {xref} into the translated PDF: {e}")
+        if in_memory:
+            data = target.tobytes()
+            output_path.seek(0)
+            output_path.truncate()
+            output_path.write(data)
+        else:
+            target.save(output_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+    finally:
+        target.close()
+        source.close()
+    return len(copied)
@@ -1,27 +1,100 @@
-import fitz  # PyMuPDF
-from googletrans import Translator
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfutils
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase import pdfmetrics
-from reportlab.lib.fonts import addMapping
+# PyMuPDF, ReportLab and googletrans are imported on first use so that importing
+# this module (and therefore the web app) stays cheap for workers that have not
+# processed a document yet.
+import io
 import logging
 import re
+import hashlib
 import os
+import threading
 import urllib.request
-import concurrent.futures
 import time
+import text_rules
+from cancellation import JobCancelled
+from tracing import traced
+
+class CompactionStats:
+    """Process-wide totals for the post-render compaction pass, updated from job threads"""
 
-class PDFProcessor:
     def __init__(self):
-        self.translator = Translator()
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+
+    def record(self, size_before, size_after):
+        with self._lock:
+            self.jobs += 1
+            self.bytes_before += size_before
+            self.bytes_after += size_after
+
+    def stats(self):
+        with self._lock:
+            return {'jobs': self.jobs, 'bytes_before': self.bytes_before, 'bytes_after': self.bytes_after}
+
+
+class PDFProcessor:
+    # Placeholder rendered in place of sections the backend could not translate
+    TRANSLATION_ERROR = "[Translation error for this section]"
+    
+    # Fonts are registered with ReportLab once per process, not per processor
+    _fonts_ready = False
+    
+    # Shared by every processor in the process
+    compaction = CompactionStats()
+    
+    def __init__(self, progress_callback=None, cancel_token=None, trace=None):
+        # 'googletrans' uses a per-processor sync client; 'http' uses the shared pooled async client
+        self.backend = os.environ.get('TRANSLATE_BACKEND', 'googletrans')
+        self.translator = None
+        if self.backend == 'googletrans':
+            from googletrans import Translator
+            self.translator = Translator()
+        self.progress_callback = progress_callback
+        # Checked between chunks so a cancelled job stops sending requests
+        self.cancel_token = cancel_token
+        # JobTrace the pipeline stages are recorded in, if any
+        self.trace = trace
+        # Carry embedded images from the source PDF into the translation
+        self.keep_images = os.environ.get('PDF_IMAGES', '1') == '1'
         self.setup_unicode_fonts()
     
+    def _report(self, event, **data):
+        """Forward a pipeline event to the progress callback, if any"""
+        if self.progress_callback is not None:
+            try:
+                self.progress_callback(event, **data)
+            except Exception as e:
+                logging.debug(f"Progress callback failed: {e}")
+    
+    def check_cancelled(self, stage='translating'):
+        """Raise JobCancelled if this processor's job has been stopped"""
+        if self.cancel_token is not None:
+            self.cancel_token.check(stage)
+    
+    def _should_stop(self):
+        return self.cancel_token is not None and self.cancel_token.cancelled
+    
+    def _span(self, name, **attrs):
+        """Record a pipeline stage in the job's trace, if it has one"""
+        return traced(self.trace, name, **attrs)
+    
+    def _chunk_spans(self, chunks):
+        """on_span callback recording each chunk request under the current span, or None"""
+        if self.trace is None:
+            return None
+        parent = self.trace.current()
+        
+        def on_span(index, start, end, result):
+            self.trace.record('chunk', start, end, parent=parent, index=index, chars=len(chunks[index]),
+                              ok=not isinstance(result, Exception))
+        return on_span
+    
     def setup_unicode_fonts(self):
         """Setup Unicode fonts for Hindi, Telugu and other languages"""
+        if PDFProcessor._fonts_ready:
+            return
+        
         try:
             # Create fonts directory if it doesn't exist
             fonts_dir = "fonts"
@@ -35,6 +108,7 @@ class PDFProcessor:
             
             # Register fonts
             self.register_fonts(fonts_dir)
+            PDFProcessor._fonts_ready = True
             
         except Exception as e:
             logging.warning(f"Could not setup Unicode fonts: {e}")
@@ -85,6 +159,9 @@ class PDFProcessor:
     
     def register_fonts(self, fonts_dir):
         """Register downloaded fonts with ReportLab"""
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        
         try:
             # Register Noto Sans (Latin)
             noto_sans_path = os.path.join(fonts_dir, 'NotoSans-Regular.ttf')
@@ -136,6 +213,7 @@ class PDFProcessor:
         
         # Check if the font is actually registered, fallback to Helvetica if not
         try:
+            from reportlab.pdfbase import pdfmetrics
             registered_fonts = pdfmetrics.getRegisteredFontNames()
             if font_name not in registered_fonts:
                 logging.warning(f"Font {font_name} not registered, using Helvetica")
@@ -145,98 +223,273 @@ class PDFProcessor:
             
         return font_name
         
-    def extract_text(self, pdf_path):
-        """Extract text from PDF using PyMuPDF"""
+    @staticmethod
+    def open_pdf(source):
+        """Open a PDF given as a file path or as in-memory bytes"""
+        import fitz  # PyMuPDF
+        
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            # PyMuPDF reads the buffer in place; nothing is written to disk
+            return fitz.open(stream=source, filetype='pdf')
+        return fitz.open(source)
+    
+    def extract_pages(self, pdf_path):
+        """Extract text from each page of a PDF using PyMuPDF
+        
+        pdf_path may also be the PDF's bytes. With image pass-through on,
+        pages with images get a marker paragraph per image that create_pdf
+        replaces with the original image.
+        """
         try:
-            doc = fitz.open(pdf_path)
-            text_content = ""
-            
+            doc = self.open_pdf(pdf_path)
+            pages = []
             for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text = page.get_text()
-                text_content += text + "\n\n"
-            
+                with self._span('extract_page', page=page_num + 1):
+                    page = doc.load_page(page_num)
+                    text = None
+                    if self.keep_images:
+                        from pdf_images import page_text_with_images
+                        text = page_text_with_images(page)
+                    pages.append(page.get_text() if text is None else text)
             doc.close()
-            return text_content.strip()
+            return pages
             
         except Exception as e:
             logging.error(f"Error extracting text from PDF: {str(e)}")
             raise Exception(f"Failed to extract text from PDF: {str(e)}")
     
+    def extract_text(self, pdf_path):
+        """Extract text from PDF using PyMuPDF"""
+        return self.extract_document(pdf_path)[1]
+    
+    def extract_document(self, pdf_path):
+        """Extract per-page text and the joined document text"""
+        with self._span('extract') as span:
+            pages = self.extract_pages(pdf_path)
+            text_content = self.join_pages(pages)
+            span.update(pages=len(pages), chars=len(text_content))
+        self._report('extracted', pages=len(pages), chars=len(text_content))
+        return pages, text_content
+    
+    def join_pages(self, pages):
+        """Join per-page text into the single document string used for translation"""
+        return "".join(text + "\n\n" for text in pages).strip()
+    
     def translate_text(self, text, source_lang, target_lang):
-        """Fast translation using Google Translate with optimized processing"""
-        try:
-            # Clean and optimize text before translation
-            cleaned_text = self._clean_text_for_translation(text)
-            
-            # For shorter texts, translate in one go
-            if len(cleaned_text) <= 4500:
-                logging.info(f"Translating text in single request ({len(cleaned_text)} chars)")
-                result = self.translator.translate(
-                    cleaned_text,
-                    src=source_lang,
-                    dest=target_lang
-                )
-                return result.text
-            
-            # For longer texts, use optimized chunking
-            chunks = self._smart_split_text(cleaned_text, 4500)
-            translated_chunks = []
-            
-            logging.info(f"Fast translation: {len(chunks)} chunks from {source_lang} to {target_lang}")
+        """Translate a whole text in one go, without reusing a previous version"""
+        translated, _, _ = self.translate_incremental(text, source_lang, target_lang)
+        return translated
+    
+    def fingerprint(self, text):
+        """Stable hash of a page or paragraph, insensitive to whitespace changes"""
+        return hashlib.sha1(' '.join(text.split()).encode('utf-8')).hexdigest()
+    
+    def language_sections(self, pages, page_languages):
+        """Group consecutive pages detected as the same language into (text, language) sections"""
+        sections = []
+        for page, language in zip(pages, page_languages):
+            if sections and sections[-1][1] == language:
+                sections[-1][0].append(page)
+            else:
+                sections.append(([page], language))
+        return [(self.join_pages(section_pages), language) for section_pages, language in sections]
+    
+    def translate_incremental(self, text, source_lang, target_lang, previous_segments=None, sections=None):
+        """Translate paragraph by paragraph, reusing translations of unchanged paragraphs
+        
+        sections optionally replaces text with (text, source language) parts
+        for mixed-language documents; each language is translated as its own
+        batch and parts already in the target language are kept as they are.
+        Returns the translated text, the paragraph fingerprint -> translation map
+        for this version and a reuse report.
+        """
+        previous_segments = previous_segments or {}
+        if sections is None:
+            sections = [(text, source_lang)]
+        with self._span('clean', chars=sum(len(section_text) for section_text, _ in sections)):
+            cleaned_sections = [(self._clean_text_for_translation(section_text), section_lang)
+                                for section_text, section_lang in sections]
+        
+        with self._span('segment') as span:
+            paragraphs = []
+            languages = []
+            for cleaned_text, section_lang in cleaned_sections:
+                section_paragraphs = [p for p in cleaned_text.split('\n\n') if p.strip()]
+                paragraphs.extend(section_paragraphs)
+                languages.extend([section_lang] * len(section_paragraphs))
+            hashes = [self.fingerprint(p) for p in paragraphs]
             
-            for i, chunk in enumerate(chunks):
-                if chunk.strip():
-                    start_time = time.time()
-                    try:
-                        result = self.translator.translate(
-                            chunk,
-                            src=source_lang,
-                            dest=target_lang
-                        )
-                        translated_chunks.append(result.text)
-                        
-                        # Log timing for performance monitoring
-                        elapsed = time.time() - start_time
-                        logging.debug(f"Chunk {i+1}/{len(chunks)} translated in {elapsed:.2f}s")
-                        
-                    except Exception as chunk_error:
-                        logging.warning(f"Chunk {i+1} failed: {chunk_error}")
-                        # Fallback: try again with smaller chunk
-                        if len(chunk) > 2000:
-                            smaller_chunks = self._smart_split_text(chunk, 2000)
-                            for small_chunk in smaller_chunks:
-                                if small_chunk.strip():
-                                    small_result = self.translator.translate(
-                                        small_chunk,
-                                        src=source_lang,
-                                        dest=target_lang
-                                    )
-                                    translated_chunks.append(small_result.text)
-                        else:
-                            # If still fails, skip this chunk
-                            logging.error(f"Skipping problematic chunk: {chunk[:100]}...")
-                            translated_chunks.append(f"[Translation error for this section]")
-                else:
-                    translated_chunks.append("")
+            # Only send paragraphs that neither the previous version nor this document already covers
+            missing = {}
+            for paragraph, para_hash, language in zip(paragraphs, hashes, languages):
+                if para_hash not in previous_segments and para_hash not in missing:
+                    missing[para_hash] = (paragraph, language)
+            span.update(paragraphs=len(paragraphs), changed=len(missing))
+        
+        logging.info(f"Incremental translation: {len(missing)} of {len(paragraphs)} paragraphs changed")
+        by_language = {}
+        for para_hash, (paragraph, language) in missing.items():
+            by_language.setdefault(language, []).append(para_hash)
+        
+        translated = {}
+        if self.keep_images:
+            # Image markers are layout, not text; keep them out of backend requests
+            from pdf_images import IMAGE_MARKER
+            for para_hash, (paragraph, _) in list(missing.items()):
+                if IMAGE_MARKER.fullmatch(paragraph.strip()):
+                    translated[para_hash] = paragraph.strip()
+                    by_language[missing[para_hash][1]].remove(para_hash)
+        
+        done = 0
+        for language, group in by_language.items():
+            if not group:
+                continue
+            if language == target_lang:
+                translated.update((h, missing[h][0]) for h in group)
+            elif len(by_language) == 1:
+                with self._span('translate', language=language, paragraphs=len(group)):
+                    translated.update(zip(group, self.translate_paragraphs([missing[h][0] for h in group], language, target_lang)))
+            else:
+                # Progress is reported in paragraphs across all language batches
+                def on_progress(completed, total, offset=done, size=len(group)):
+                    self._report('translating', chunk=offset + size * completed // total, total=len(missing), language=language)
+                
+                logging.info(f"Translating {len(group)} {language} paragraph(s) to {target_lang}")
+                with self._span('translate', language=language, paragraphs=len(group)):
+                    translated.update(zip(group, self.translate_paragraphs([missing[h][0] for h in group], language,
+                                                                           target_lang, on_progress=on_progress)))
+            done += len(group)
+        
+        segments = {}
+        translations = []
+        reused_chars = 0
+        for paragraph, para_hash in zip(paragraphs, hashes):
+            if para_hash in previous_segments:
+                translation = previous_segments[para_hash]
+                reused_chars += len(paragraph)
+            else:
+                translation = translated[para_hash]
+            translations.append(translation)
+            # Failed sections are retried on the next revision instead of being reused
+            if translation != self.TRANSLATION_ERROR:
+                segments[para_hash] = translation
+        
+        report = {
+            'paragraphs': len(paragraphs),
+            'reused_paragraphs': sum(1 for h in hashes if h in previous_segments),
+            'translated_paragraphs': len(missing),
+            'total_chars': sum(len(p) for p in paragraphs),
+            'reused_chars': reused_chars,
+        }
+        return "\n\n".join(translations), segments, report
+    
+    def translate_paragraphs(self, paragraphs, source_lang, target_lang, max_size=4500, on_progress=None):
+        """Translate a list of paragraphs, packing several into each backend request"""
+        batches = []
+        current = []
+        current_size = 0
+        oversized = []
+        for index, paragraph in enumerate(paragraphs):
+            if len(paragraph) > max_size:
+                oversized.append(index)
+                continue
+            if current and current_size + len(paragraph) + 2 > max_size:
+                batches.append(current)
+                current, current_size = [], 0
+            current.append(index)
+            current_size += len(paragraph) + 2
+        if current:
+            batches.append(current)
+        
+        results = [None] * len(paragraphs)
+        batch_texts = ["\n\n".join(paragraphs[i] for i in batch) for batch in batches]
+        completed = [0]
+        
+        def on_result(index, result):
+            completed[0] += 1
+            if on_progress is not None:
+                on_progress(completed[0], len(batches) + len(oversized))
+            else:
+                self._report('translating', chunk=completed[0], total=len(batches) + len(oversized))
+        
+        for index in oversized:
+            pieces = self._smart_split_text(paragraphs[index], max_size)
+            with self._span('oversized_paragraph', pieces=len(pieces)):
+                piece_results = self._translate_chunks(pieces, source_lang, target_lang)
+            if any(isinstance(r, Exception) for r in piece_results):
+                results[index] = self._paragraph_result(paragraphs[index], piece_results[0], source_lang, target_lang)
+            else:
+                results[index] = ' '.join(piece_results)
+            on_result(index, results[index])
+        
+        batch_results = self._translate_chunks(batch_texts, source_lang, target_lang, on_result=on_result)
+        for batch, batch_result in zip(batches, batch_results):
+            if len(batch) == 1:
+                results[batch[0]] = self._paragraph_result(paragraphs[batch[0]], batch_result, source_lang, target_lang)
+                continue
             
-            return "\n\n".join(translated_chunks)
+            pieces = None
+            if not isinstance(batch_result, Exception):
+                pieces = [p for p in re.split(r'\n\s*\n', batch_result) if p.strip()]
+            if pieces is not None and len(pieces) == len(batch):
+                for i, piece in zip(batch, pieces):
+                    results[i] = piece.strip()
+                continue
             
-        except Exception as e:
-            logging.error(f"Translation failed: {str(e)}")
-            raise Exception(f"Translation service error: {str(e)}")
+            # Paragraph boundaries were not preserved; translate this batch one paragraph at a time
+            logging.debug(f"Batch of {len(batch)} paragraphs did not split cleanly, retrying individually")
+            with self._span('retry', reason='split' if pieces is not None else 'failed', paragraphs=len(batch)):
+                single_results = self._translate_chunks([paragraphs[i] for i in batch], source_lang, target_lang)
+            for i, single_result in zip(batch, single_results):
+                results[i] = self._paragraph_result(paragraphs[i], single_result, source_lang, target_lang)
+        
+        return results
     
-    def _clean_text_for_translation(self, text):
-        """Clean text to improve translation speed and accuracy"""
-        # Remove excessive whitespace
-        text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
-        text = re.sub(r' +', ' ', text)
+    def _paragraph_result(self, paragraph, result, source_lang, target_lang):
+        """Translation for a single paragraph, splitting oversized or failed ones"""
+        if not isinstance(result, Exception):
+            return result
+        if len(paragraph) > 2000:
+            pieces = self._smart_split_text(paragraph, 2000)
+            with self._span('retry', reason='smaller pieces', pieces=len(pieces)):
+                piece_results = self._translate_chunks(pieces, source_lang, target_lang)
+            if not any(isinstance(r, Exception) for r in piece_results):
+                return ' '.join(piece_results)
+        logging.error(f"Skipping problematic paragraph: {paragraph[:100]}...")
+        return self.TRANSLATION_ERROR
+    
+    def _translate_chunks(self, chunks, source_lang, target_lang, on_result=None):
+        """Translate independent chunks, returning results (or exceptions) in order"""
+        if not chunks:
+            return []
         
-        # Remove page numbers and common PDF artifacts
-        text = re.sub(r'\b\d+\s*$', '', text, flags=re.MULTILINE)
-        text = re.sub(r'^Page \d+.*$', '', text, flags=re.MULTILINE)
+        if self.backend == 'http':
+            from translation_client import get_translation_client
+            client = get_translation_client()
+            results = client.run(client.translate_many(chunks, source_lang, target_lang, on_result=on_result,
+                                                       should_stop=self._should_stop,
+                                                       on_span=self._chunk_spans(chunks)))
+            self.check_cancelled()
+            return results
         
-        return text.strip()
+        results = []
+        for index, chunk in enumerate(chunks):
+            self.check_cancelled()
+            with self._span('chunk', index=index, chars=len(chunk)) as span:
+                try:
+                    result = self.translator.translate(chunk, src=source_lang, dest=target_lang).text
+                except Exception as e:
+                    logging.warning(f"Chunk {index+1} failed: {e}")
+                    result = e
+                span['ok'] = not isinstance(result, Exception)
+            results.append(result)
+            if on_result is not None:
+                on_result(index, result)
+        return results
+    
+    def _clean_text_for_translation(self, text):
+        """Clean text to improve translation speed and accuracy"""
+        return text_rules.clean_for_translation(text)
     
     def _smart_split_text(self, text, max_size):
         """Improved text splitting that preserves sentence and paragraph boundaries"""
@@ -282,41 +535,21 @@ class PDFProcessor:
         
         return chunks
     
-    def _split_text(self, text, max_size):
-        """Split text into chunks while preserving paragraph structure"""
-        paragraphs = text.split('\n\n')
-        chunks = []
-        current_chunk = ""
-        
-        for paragraph in paragraphs:
-            # If adding this paragraph would exceed the limit
-            if len(current_chunk) + len(paragraph) + 2 > max_size:
-                if current_chunk:
-                    chunks.append(current_chunk)
-                    current_chunk = paragraph
-                else:
-                    # If single paragraph is too long, split by sentences
-                    sentences = re.split(r'(?<=[.!?])\s+', paragraph)
-                    for sentence in sentences:
-                        if len(current_chunk) + len(sentence) + 1 > max_size:
-                            if current_chunk:
-                                chunks.append(current_chunk)
-                                current_chunk = sentence
-                            else:
-                                chunks.append(sentence)
-                        else:
-                            current_chunk += " " + sentence if current_chunk else sentence
-            else:
-                current_chunk += "\n\n" + paragraph if current_chunk else paragraph
+    def create_pdf(self, text, output_path, original_filename, target_language='en', source_pdf=None):
+        """Create a new PDF with translated text using ReportLab
         
-        if current_chunk:
-            chunks.append(current_chunk)
+        output_path may be an in-memory buffer (io.BytesIO). Image markers in
+        the text are laid out as placeholders; when the source PDF (path or
+        bytes) is given, its images are then copied into those places without
+        being decoded or recompressed.
+        """
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
         
-        return chunks
-    
-    def create_pdf(self, text, output_path, original_filename, target_language='en'):
-        """Create a new PDF with translated text using ReportLab"""
         try:
+            self._report('rendering')
+            
             # Create document
             doc = SimpleDocTemplate(
                 output_path,
@@ -378,60 +611,112 @@ class PDFProcessor:
             
             # Split text into paragraphs and add to story
             paragraphs = text.split('\n\n')
+            placements = []
+            image_marker = None
+            if self.keep_images:
+                from pdf_images import IMAGE_MARKER, ImagePlaceholder
+                image_marker = IMAGE_MARKER
             
             for para_text in paragraphs:
-                if para_text.strip():
+                marker = image_marker.fullmatch(para_text.strip()) if image_marker else None
+                if marker:
+                    # Without the source PDF there is nothing to copy; leave the image out
+                    if source_pdf:
+                        xref, width, height = (int(value) for value in marker.groups())
+                        story.append(ImagePlaceholder(xref, width, height, doc.width, doc.height, placements))
+                        story.append(Spacer(1, 6))
+                elif para_text.strip():
                     # Clean up text for ReportLab
                     clean_text = self._clean_text_for_pdf(para_text.strip())
                     story.append(Paragraph(clean_text, body_style))
                     story.append(Spacer(1, 6))
             
             # Build PDF
+            self.check_cancelled('rendering')
             doc.build(story)
             
+            if placements:
+                self.check_cancelled('rendering')
+                from pdf_images import embed_images
+                start_time = time.perf_counter()
+                copied = embed_images(source_pdf, output_path, placements)
+                logging.info(f"Carried {len(placements)} image placement(s) ({copied} object(s)) into the PDF "
+                             f"in {(time.perf_counter() - start_time) * 1000:.1f}ms")
+            
+        except JobCancelled:
+            raise
         except Exception as e:
             logging.error(f"Error creating PDF: {str(e)}")
             raise Exception(f"Failed to create translated PDF: {str(e)}")
     
-    def _clean_text_for_pdf(self, text):
-        """Clean text for ReportLab PDF generation with Telugu formatting"""
-        # Escape special characters for ReportLab
-        text = text.replace('&', '&amp;')
-        text = text.replace('<', '&lt;')
-        text = text.replace('>', '&gt;')
-        
-        # Enhanced formatting for Telugu poetry and elegant text
-        if self._is_telugu_text(text):
-            # Preserve poetic line breaks in Telugu
-            lines = text.split('\n')
-            formatted_lines = []
-            
-            for line in lines:
-                line = line.strip()
-                if line:
-                    # Add elegant spacing for Telugu poetry
-                    if self._is_poetic_line(line):
-                        formatted_lines.append(f"<i>{line}</i>")
-                    else:
-                        formatted_lines.append(line)
-            
-            text = '<br/>'.join(formatted_lines)
-        else:
-            # Replace line breaks with proper paragraph breaks for other languages
-            text = text.replace('\n', '<br/>')
+    def compact_pdf(self, pdf_path):
+        """Rewrite a rendered PDF with deduplicated objects and compressed streams
         
-        return text
-    
-    def _is_telugu_text(self, text):
-        """Check if text contains Telugu characters"""
-        telugu_range = range(0x0C00, 0x0C7F)
-        return any(ord(char) in telugu_range for char in text)
+        pdf_path may also be an in-memory buffer (io.BytesIO), which is rewritten in place.
+        """
+        import fitz  # PyMuPDF
+        
+        self.check_cancelled('compacting')
+        self._report('compacting')
+        in_memory = isinstance(pdf_path, io.BytesIO)
+        size_before = pdf_path.getbuffer().nbytes if in_memory else os.path.getsize(pdf_path)
+        options = {
+            'garbage': 4,          # remove unused objects and merge duplicates
+            'deflate': True,       # compress uncompressed streams
+            'deflate_fonts': True, # compress embedded font files
+            'use_objstms': 1,      # pack small objects into object streams
+        }
+        
+        def write(doc, save):
+            try:
+                return save(doc, options)
+            except TypeError:
+                # Older PyMuPDF releases have no object stream support
+                options.pop('use_objstms')
+                return save(doc, options)
+        
+        temp_path = None if in_memory else pdf_path + '.compact'
+        try:
+            if in_memory:
+                doc = fitz.open(stream=pdf_path.getvalue(), filetype='pdf')
+                try:
+                    data = write(doc, lambda d, o: d.tobytes(**o))
+                finally:
+                    doc.close()
+                size_after = len(data)
+                if size_after < size_before:
+                    pdf_path.seek(0)
+                    pdf_path.truncate()
+                    pdf_path.write(data)
+                else:
+                    size_after = size_before
+            else:
+                doc = fitz.open(pdf_path)
+                try:
+                    write(doc, lambda d, o: d.save(temp_path, **o))
+                finally:
+                    doc.close()
+                
+                size_after = os.path.getsize(temp_path)
+                if size_after < size_before:
+                    os.replace(temp_path, pdf_path)
+                else:
+                    os.remove(temp_path)
+                    size_after = size_before
+        except Exception as e:
+            logging.warning(f"PDF compaction skipped: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            size_after = size_before
+        
+        PDFProcessor.compaction.record(size_before, size_after)
+        
+        saved = size_before - size_after
+        percent = 100.0 * saved / size_before if size_before else 0.0
+        name = 'in-memory PDF' if in_memory else os.path.basename(pdf_path)
+        logging.info(f"Compacted {name}: {size_before} -> {size_after} bytes ({percent:.1f}% smaller)")
+        return {'bytes_before': size_before, 'bytes_after': size_after, 'saved_percent': round(percent, 1)}
     
-    def _is_poetic_line(self, line):
-        """Check if a Telugu line appears to be poetic"""
-        poetic_words = [
-            'చైతన్య', 'ఆశలు', 'భావనలు', 'కలలకే', 'విజయం', 'మనసు',
-            'ఆకాశాన్ని', 'మార్గమై', 'కృషి', 'గెలిచిన', 'పుట్టిన', 'నూతన',
-            'మధుర', 'తాకే', 'పల్లకిగా', 'ఆరోహణ', 'సాగిపోవాలి', 'మొదలవుతుంది'
-        ]
-        return any(word in line for word in poetic_words)
+    def _clean_text_for_pdf(self, text):
+        """Clean text for ReportLab PDF generation with per-language layout (see text_rules)"""
+        return text_rules.default_engine.format_for_pdf(text)
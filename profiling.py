@@ -0,0 +1,153 @@
+import contextlib
+import cProfile
+import hmac
+import io
+import itertools
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+
+class JobProfile:
+    """cProfile (and optionally tracemalloc) state for one job
+
+    A job runs partly on the request thread and partly on a scheduler
+    worker, so profiling is enabled per segment and the stats accumulate in
+    one profiler until finish() writes the reports.
+
+    What a segment sees depends on the interpreter. Up to Python 3.11,
+    enable() installs a hook on the calling thread only, so work the segment
+    hands to other threads (concurrent translation chunks) is not in the
+    report. From 3.12 cProfile uses sys.monitoring, which is process-wide:
+    every thread is profiled while a segment is open, and only one profiler
+    may be enabled at a time, so overlapping segments would conflict. That
+    is why a job's segments run one after another and JobProfiler profiles
+    a single job at a time.
+    """
+
+    def __init__(self, profiler, job_id, reason, trace_memory):
+        self.profiler = profiler
+        self.job_id = job_id
+        self.reason = reason
+        self.trace_memory = trace_memory
+        self.profile = cProfile.Profile()
+        self.started_at = time.perf_counter()
+        self.finished = False
+        if trace_memory:
+            tracemalloc.start(profiler.traceback_frames)
+
+    @contextlib.contextmanager
+    def segment(self):
+        """Profile the enclosed code on the current thread"""
+        self.profile.enable()
+        try:
+            yield self
+        finally:
+            self.profile.disable()
+
+    def finish(self):
+        """Write pstats and allocation reports, then release the profiling slot"""
+        if self.finished:
+            return
+        self.finished = True
+        try:
+            self._write_reports()
+        except Exception as e:
+            logging.warning(f"Could not write profile for job {self.job_id}: {e}")
+        finally:
+            if self.trace_memory:
+                tracemalloc.stop()
+            self.profiler._release()
+
+    def _write_reports(self):
+        output_dir = self.profiler.output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        base = os.path.join(output_dir, self.job_id)
+        elapsed = time.perf_counter() - self.started_at
+
+        # Snapshot before report writing adds allocations of its own
+        if self.trace_memory:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ))
+            current, peak = tracemalloc.get_traced_memory()
+
+        self.profile.dump_stats(base + '.pstats')
+
+        summary = io.StringIO()
+        summary.write(f"job {self.job_id} ({self.reason}), wall time {elapsed:.3f}s\n\n")
+        stats = pstats.Stats(self.profile, stream=summary)
+        stats.sort_stats('cumulative').print_stats(self.profiler.top_functions)
+        with open(base + '.txt', 'w') as f:
+            f.write(summary.getvalue())
+
+        if self.trace_memory:
+            with open(base + '.alloc.txt', 'w') as f:
+                f.write(f"job {self.job_id}: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n\n")
+                for stat in snapshot.statistics('lineno')[:self.profiler.top_allocations]:
+                    f.write(f"{stat}\n")
+
+        logging.info(f"Wrote profile for job {self.job_id} to {base}.*")
+
+
+class JobProfiler:
+    """Operator-triggered and sampled profiling of translation jobs
+
+    A job is profiled when profiling is enabled and either the request sent
+    the operator token in the profile header, or the job is picked by
+    1-in-N sampling. Only one job is profiled at a time per process, which
+    bounds the overhead; extra candidates are skipped.
+    """
+
+    def __init__(self, output_dir='profiles', enabled=False, token=None, sample_rate=0,
+                 sample_memory=False, top_functions=40, top_allocations=25, traceback_frames=10):
+        self.output_dir = output_dir
+        self.enabled = enabled
+        self.token = token
+        self.sample_rate = sample_rate
+        self.sample_memory = sample_memory
+        self.top_functions = top_functions
+        self.top_allocations = top_allocations
+        self.traceback_frames = traceback_frames
+        self._counter = itertools.count(1)
+        self._slot = threading.Lock()
+
+        # Metrics
+        self.profiled = 0
+        self.skipped_busy = 0
+
+    def start(self, job_id, header_value=None):
+        """Return a JobProfile if this job should be profiled, else None"""
+        if not self.enabled:
+            return None
+
+        if self.token and header_value and hmac.compare_digest(header_value.encode('utf-8'), self.token.encode('utf-8')):
+            reason, trace_memory = 'requested', True
+        elif self.sample_rate > 0 and next(self._counter) % self.sample_rate == 0:
+            reason, trace_memory = 'sampled', self.sample_memory
+        else:
+            return None
+
+        if not self._slot.acquire(blocking=False):
+            self.skipped_busy += 1
+            return None
+        # tracemalloc is process-wide; leave it alone if something else already runs it
+        if trace_memory and tracemalloc.is_tracing():
+            trace_memory = False
+        self.profiled += 1
+        return JobProfile(self, job_id, reason, trace_memory)
+
+    def _release(self):
+        self._slot.release()
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'profiled': self.profiled,
+            'skipped_busy': self.skipped_busy,
+        }
@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+
+# Terminal events close the stream once delivered
+TERMINAL_EVENTS = ('done', 'error', 'cancelled')
+
+
+def progress_percent(event, data):
+    """Map a pipeline event to an overall progress percentage"""
+    if event == 'queued':
+        return 0
+    if event == 'extracted':
+        return 10
+    if event == 'translating':
+        total = data.get('total') or 1
+        return 10 + int(75 * data.get('chunk', 0) / total)
+    if event == 'rendering':
+        return 90
+    if event == 'compacting':
+        return 95
+    if event in TERMINAL_EVENTS:
+        return 100
+    return None
+
+
+class ProgressChannel:
+    """Ordered event log for a single translation task"""
+
+    def __init__(self):
+        self.events = []
+        self.condition = threading.Condition()
+        self.finished = False
+        self.updated_at = time.time()
+        self.subscribers = 0
+
+
+class ProgressTracker:
+    """In-process pub/sub for job progress, consumed as Server-Sent Events"""
+
+    def __init__(self, ttl=600, max_events=500):
+        self.ttl = ttl
+        self.max_events = max_events
+        self._channels = {}
+        self._lock = threading.Lock()
+        self.subscribers = 0
+
+    def _channel(self, task_id):
+        with self._lock:
+            channel = self._channels.get(task_id)
+            if channel is None:
+                self._prune()
+                channel = self._channels[task_id] = ProgressChannel()
+            return channel
+
+    def _prune(self):
+        """Drop channels nobody has touched within the TTL (lock must be held)
+
+        A channel with an open stream is kept however quiet its task is, so
+        events published later still reach that stream.
+        """
+        cutoff = time.time() - self.ttl
+        for task_id in [t for t, c in self._channels.items() if c.updated_at < cutoff and not c.subscribers]:
+            del self._channels[task_id]
+
+    def _subscribe(self, task_id):
+        """Return the task's channel, counted as having one more open stream"""
+        with self._lock:
+            channel = self._channels.get(task_id)
+            if channel is None:
+                self._prune()
+                channel = self._channels[task_id] = ProgressChannel()
+            # Counted under the tracker lock, which _prune holds while it checks the count
+            channel.subscribers += 1
+            self.subscribers += 1
+            return channel
+
+    def _unsubscribe(self, channel):
+        with self._lock:
+            channel.subscribers -= 1
+            self.subscribers -= 1
+
+    def publish(self, task_id, event, **data):
+        """Append an event to the task's log and wake any waiting streams"""
+        if not task_id:
+            return
+        channel = self._channel(task_id)
+        percent = progress_percent(event, data)
+        if percent is not None:
+            data.setdefault('progress', percent)
+        with channel.condition:
+            if channel.finished:
+                return
+            # Keep the log bounded; subscribers only need the latest state after a gap
+            if len(channel.events) >= self.max_events:
+                channel.events.pop(1)
+            event_id = channel.events[-1][0] + 1 if channel.events else 1
+            channel.events.append((event_id, event, data))
+            channel.finished = event in TERMINAL_EVENTS
+            channel.updated_at = time.time()
+            channel.condition.notify_all()
+
+    def snapshot(self, task_id):
+        """Return the latest event for clients that cannot use event streams"""
+        with self._lock:
+            channel = self._channels.get(task_id)
+        if channel is None or not channel.events:
+            return {'status': 'unknown', 'progress': 0}
+        with channel.condition:
+            _, event, data = channel.events[-1]
+        return dict(data, status=event)
+
+    def listeners(self, task_id):
+        """Number of open progress streams for a task"""
+        with self._lock:
+            channel = self._channels.get(task_id)
+            return channel.subscribers if channel is not None else 0
+
+    def stream(self, task_id, last_event_id=0, heartbeat=15, max_duration=30, on_disconnect=None):
+        """Yield SSE frames for a task until it reaches a terminal event or max_duration passes
+
+        Ending after max_duration keeps a stream from holding a worker thread
+        for the whole job; EventSource reconnects on its own and resumes from
+        Last-Event-ID. on_disconnect(task_id) is called if the client goes
+        away before the terminal event has been sent, but not when the stream
+        ends because its time is up.
+        """
+        channel = self._subscribe(task_id)
+        deadline = time.time() + max_duration
+        ended = False
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                if time.time() >= deadline:
+                    # The client reconnects; only a stream cut off mid-way counts as a closed page
+                    ended = True
+                    return
+                with channel.condition:
+                    pending = [e for e in channel.events if e[0] > last_event_id]
+                    if not pending and not channel.finished:
+                        channel.condition.wait(max(0.0, min(heartbeat, deadline - time.time())))
+                        pending = [e for e in channel.events if e[0] > last_event_id]
+                    finished = channel.finished
+
+                if not pending:
+                    if finished:
+                        ended = True
+                        return
+                    # Comment frame keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+
+                for event_id, event, data in pending:
+                    last_event_id = event_id
+                    yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+                if finished:
+                    ended = True
+                    return
+        finally:
+            self._unsubscribe(channel)
+            if not ended and on_disconnect is not None:
+                on_disconnect(task_id)
+
+    def stats(self):
+        """Return channel and subscriber counts"""
+        with self._lock:
+            active = sum(1 for c in self._channels.values() if not c.finished)
+            total = len(self._channels)
+        return {'channels': total, 'active_tasks': active, 'subscribers': self.subscribers}
@@ -1,49 +1,178 @@
 import os  
+import io
+import sys
+import json
+import hmac
 import uuid
-from flask import render_template, request, redirect, url_for, flash, session, send_file, jsonify
+import re
+from datetime import datetime, timedelta
+from flask import render_template, request, redirect, url_for, flash, session, send_file, jsonify, Response
 from werkzeug.utils import secure_filename
-from app import app, db
-from models import TranslationHistory
-from pdf_processor import PDFProcessor 
+from app import app, db, history_writer, progress_tracker, job_profiler, cancellations, admission
+from models import TranslationHistory, JobTimeline
+from jobs import (TranslationJob, make_processor, run_preview, job_runner, job_queue, submit_job, cancel_job,
+                  profiled, finish_profile, detect_source_language, stop_cancelled_job, artifact_store)
+from cancellation import JobCancelled
+from admission import AdmissionRejected
+from tracing import JobTrace, traced
+from languages import LANGUAGES
 import logging
 
-# Supported languages
-LANGUAGES = {
-    'en': 'English',
-    'es': 'Spanish',
-    'fr': 'French',
-    'de': 'German',
-    'it': 'Italian',
-    'pt': 'Portuguese',
-    'ru': 'Russian',
-    'ja': 'Japanese',
-    'ko': 'Korean',
-    'zh': 'Chinese (Simplified)',
-    'ar': 'Arabic',
-    'hi': 'Hindi',
-    'te': 'Telugu'
-}
-
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() == 'pdf'
 
+def valid_task_id(task_id):
+    return bool(task_id) and re.fullmatch(r'[A-Za-z0-9-]{1,64}', task_id) is not None
+
+def too_many_requests(error):
+    """429 response for a rejected upload, telling the client when to retry"""
+    response = jsonify({'error': str(error), 'reason': error.reason, 'retry_after': error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
 @app.route('/')
 def index():
     # Initialize session ID if not exists
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
     
-    # Get user's translation history
+    # Get user's translation history, newest first, including records still in the write-behind queue
     history = TranslationHistory.query.filter_by(session_id=session['session_id']).order_by(TranslationHistory.created_at.desc()).limit(10).all()
+    pending = list(reversed(history_writer.pending(TranslationHistory, session_id=session['session_id'])))
+    history = (pending + history)[:10]
     
     return render_template('index.html', languages=LANGUAGES, history=history)
 
 @app.route('/translate-progress/<task_id>')
 def translate_progress(task_id):
-    """Get translation progress for a specific task"""
-    # This would be implemented with a task queue like Celery in production
-    # For now, return a simple response
-    return jsonify({'status': 'processing', 'progress': 50})
+    """Stream translation progress for a specific task as Server-Sent Events"""
+    if not valid_task_id(task_id):
+        return jsonify({'error': 'Invalid task id'}), 400
+    
+    # Plain JSON snapshot for clients that poll instead of streaming
+    if 'text/event-stream' not in request.headers.get('Accept', ''):
+        return jsonify(progress_tracker.snapshot(task_id))
+    
+    # With the database queue the job may run elsewhere; relay its progress into this process
+    if job_queue is not None:
+        job_queue.follow(task_id)
+    
+    last_event_id = request.headers.get('Last-Event-ID', 0, type=int)
+    stream = progress_tracker.stream(
+        task_id,
+        last_event_id=last_event_id,
+        heartbeat=app.config['PROGRESS_HEARTBEAT'],
+        max_duration=app.config['PROGRESS_STREAM_WINDOW'],
+        # A closed tab stops the job once no stream has reconnected within the grace period
+        on_disconnect=cancellations.disconnected
+    )
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/translate-cancel/<task_id>', methods=['POST'])
+def cancel_translation(task_id):
+    """Cancel a queued or running translation started by this session"""
+    if not valid_task_id(task_id):
+        return jsonify({'error': 'Invalid task id'}), 400
+    
+    if not cancel_job(task_id, session.get('session_id')):
+        return jsonify({'cancelled': False, 'error': 'No running translation with this id'}), 404
+    
+    # The job stops at its next checkpoint; tell progress subscribers right away
+    progress_tracker.publish(task_id, 'cancelled', reason='cancelled', message=str(JobCancelled('cancelled')))
+    return jsonify({'cancelled': True})
+
+@app.route('/api/metrics')
+def get_metrics():
+    """API endpoint exposing in-process performance counters"""
+    from translation_client import translation_client_stats
+    return jsonify({
+        'history_writer': history_writer.stats(),
+        'progress': progress_tracker.stats(),
+        'translation_client': translation_client_stats(),
+        'compaction': compaction_totals(),
+        'jobs': job_runner.stats(),
+        'profiling': job_profiler.stats(),
+        'artifacts': artifact_store.stats(),
+        'cancellation': cancellations.stats(),
+        'admission': admission.stats(),
+        'queue': job_queue.stats() if job_queue is not None else None
+    })
+
+def compaction_totals():
+    """PDF compaction counters, without importing the PDF stack before the first job"""
+    pdf_module = sys.modules.get('pdf_processor')
+    if pdf_module is None:
+        return {'jobs': 0, 'bytes_before': 0, 'bytes_after': 0}
+    return pdf_module.PDFProcessor.compaction.stats()
+
+def admin_denied():
+    """Error response unless the request carries ADMIN_TOKEN; without a token the admin API does not exist"""
+    token = app.config['ADMIN_TOKEN']
+    if not token:
+        return jsonify({'error': 'Not found'}), 404
+    header_value = request.headers.get(app.config['ADMIN_HEADER'], '')
+    if not hmac.compare_digest(header_value.encode('utf-8'), token.encode('utf-8')):
+        return jsonify({'error': 'Forbidden'}), 403
+    return None
+
+def timeline_fields(row):
+    return {column.name: getattr(row, column.name) for column in JobTimeline.__table__.columns}
+
+def timeline_summary(fields):
+    """JSON view of a stored (or still queued) JobTimeline"""
+    created_at = fields['created_at']
+    return {
+        'task_id': fields['task_id'],
+        'original_filename': fields['original_filename'],
+        'translated_filename': fields['translated_filename'],
+        'source_language': fields['source_language'],
+        'target_language': fields['target_language'],
+        'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S') if created_at else None,
+        'total_ms': fields['total_ms'],
+        'stages': json.loads(fields['stages'] or '{}'),
+        'critical_path': json.loads(fields['critical_path'] or '[]'),
+    }
+
+@app.route('/api/admin/slow-jobs')
+def slow_jobs():
+    """Slowest recent jobs with their stage totals and critical path"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    cutoff = datetime.utcnow() - timedelta(hours=request.args.get('hours', 24, type=float))
+    
+    rows = JobTimeline.query.filter(JobTimeline.created_at >= cutoff) \
+        .order_by(JobTimeline.total_ms.desc()).limit(limit).all()
+    jobs = [timeline_summary(timeline_fields(row)) for row in rows]
+    # Timelines still waiting in the write-behind queue
+    jobs.extend(timeline_summary(fields) for fields in history_writer.pending(JobTimeline)
+                if fields['created_at'] >= cutoff)
+    jobs.sort(key=lambda job: job['total_ms'], reverse=True)
+    return jsonify({'jobs': jobs[:limit]})
+
+@app.route('/api/admin/jobs/<task_id>/timeline')
+def job_timeline(task_id):
+    """Every recorded span of one job"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    if not valid_task_id(task_id):
+        return jsonify({'error': 'Invalid task id'}), 400
+    
+    pending = history_writer.pending(JobTimeline, task_id=task_id)
+    if pending:
+        fields = pending[-1]
+    else:
+        row = JobTimeline.query.filter_by(task_id=task_id).order_by(JobTimeline.created_at.desc()).first()
+        if row is None:
+            return jsonify({'error': 'No timeline for this task'}), 404
+        fields = timeline_fields(row)
+    return jsonify(dict(timeline_summary(fields), trace=json.loads(fields['spans'] or '{}')))
 
 @app.route('/api/history')
 def get_translation_history():
@@ -57,6 +186,18 @@ def get_translation_history():
         ).order_by(TranslationHistory.created_at.desc()).limit(10).all()
         
         history_data = []
+        # Include records still waiting in the write-behind queue
+        for fields in reversed(history_writer.pending(TranslationHistory, session_id=session['session_id'])):
+            history_data.append({
+                'id': None,
+                'original_filename': fields['original_filename'],
+                'translated_filename': fields['translated_filename'],
+                'source_language': fields['source_language'],
+                'target_language': fields['target_language'],
+                'created_at': fields['created_at'].strftime('%Y-%m-%d %H:%M:%S'),
+                'file_size': fields.get('file_size')
+            })
+        
         for entry in history:
             history_data.append({
                 'id': entry.id,
@@ -68,13 +209,36 @@ def get_translation_history():
                 'file_size': entry.file_size
             })
         
-        return jsonify({'history': history_data})
+        return jsonify({'history': history_data[:10]})
     except Exception as e:
         logging.error(f"Error getting history: {e}")
         return jsonify({'history': [], 'error': str(e)})
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    session_id = session.get('session_id', str(uuid.uuid4()))
+    session['session_id'] = session_id
+    # Sent in the query string so 'waiting' events reach the progress stream before the body is read
+    task_id = request.args.get('task_id', '')
+    if not valid_task_id(task_id):
+        task_id = ''
+    trace = JobTrace() if app.config['JOB_TRACE'] else None
+    
+    # Reserve capacity before the body is read or extracted; the character cost is estimated
+    # from the request size here and corrected once the text is known
+    try:
+        with traced(trace, 'admission'):
+            ticket = admission.admit(
+                session_id, admission.estimate_chars(request.content_length),
+                on_wait=lambda position: progress_tracker.publish(task_id, 'waiting', position=position)
+            )
+    except AdmissionRejected as e:
+        logging.warning(f"Upload rejected before reading: {e.reason}")
+        progress_tracker.publish(task_id, 'error', message=str(e), retry_after=e.retry_after)
+        return too_many_requests(e)
+    # Until a job has been handed to the scheduler or queue, the reservation belongs to this request
+    handed_off = False
+    
     try:
         # Debug logging
         logging.debug(f"Form data keys: {list(request.form.keys())}")
@@ -92,6 +256,11 @@ def upload_file():
         source_lang = request.form.get('source_language')
         target_lang = request.form.get('target_language')
         
+        # Client-generated task id lets the browser subscribe to progress before uploading
+        task_id = task_id or request.form.get('task_id', '')
+        if not valid_task_id(task_id):
+            task_id = str(uuid.uuid4())
+        
         logging.debug(f"File object: {file}")
         logging.debug(f"Filename: '{file.filename}'")
         logging.debug(f"File size: {file.content_length if hasattr(file, 'content_length') else 'unknown'}")
@@ -118,6 +287,10 @@ def upload_file():
             flash('Please select both source and target languages', 'error')
             return redirect(url_for('index'))
         
+        if (source_lang != 'auto' and source_lang not in LANGUAGES) or target_lang not in LANGUAGES:
+            flash('Unsupported language selection', 'error')
+            return redirect(url_for('index'))
+        
         if source_lang == target_lang:
             flash('Source and target languages cannot be the same', 'error')
             return redirect(url_for('index'))
@@ -129,70 +302,117 @@ def upload_file():
             # Create unique filename to avoid conflicts
             file_id = str(uuid.uuid4())
             upload_filename = f"{file_id}_{original_filename}"
-            upload_path = os.path.join(app.config['UPLOAD_FOLDER'], upload_filename)
             
-            # Save uploaded file
-            file.save(upload_path)
-            file_size = os.path.getsize(upload_path)
+            # Queued jobs may run on another host, so they always read the upload from (shared) storage
+            with traced(trace, 'upload_save', bytes=file_size):
+                if file_size <= app.config['SMALL_UPLOAD_BYTES'] and job_queue is None \
+                        and isinstance(file.stream, io.BytesIO):
+                    # Small upload parsed into memory (see UploadRequest): BytesIO.getvalue() hands over
+                    # its buffer without copying, and nothing is written to disk
+                    upload_path = None
+                    upload_data = file.stream.getvalue()
+                else:
+                    # Larger request bodies were already spooled to a temp file by werkzeug
+                    # Save uploaded file
+                    upload_path = artifact_store.save('uploads', upload_filename, file)
+                    upload_data = None
+                    file_size = os.path.getsize(upload_path)
             
-            # Process PDF translation
-            processor = PDFProcessor()
+            job = TranslationJob(
+                task_id=task_id,
+                session_id=session_id,
+                file_id=file_id,
+                original_filename=original_filename,
+                upload_path=upload_path,
+                upload_data=upload_data,
+                source_lang=source_lang,
+                target_lang=target_lang,
+                file_size=file_size,
+                parent_id=request.form.get('parent_id', type=int)
+            )
+            job.download_url = url_for('download_file', filename=job.translated_filename)
+            job.trace = trace
+            job.admission = ticket
+            job.cancel_token = cancellations.register(task_id, session_id)
+            job.profile = job_profiler.start(task_id, request.headers.get(app.config['PROFILE_HEADER']))
             
             try:
+                # Process PDF translation, publishing each stage to progress subscribers
+                processor = make_processor(job)
+                
                 # Extract text from PDF
                 logging.info("Starting text extraction...")
-                text_content = processor.extract_text(upload_path)
+                with profiled(job):
+                    pages, text_content = processor.extract_document(job.source)
                 
                 if not text_content.strip():
+                    finish_profile(job)
+                    job.publish('error', message='No readable text found in the PDF')
                     flash('No readable text found in the PDF', 'error')
-                    os.remove(upload_path)  # Clean up
+                    artifact_store.delete(upload_path)  # Clean up
+                    cancellations.finish(task_id)
                     return redirect(url_for('index'))
                 
                 logging.info(f"Extracted {len(text_content)} characters from PDF")
+                ticket.resize(len(text_content))
                 
-                # Translate text
-                logging.info(f"Starting translation from {source_lang} to {target_lang}")
-                translated_text = processor.translate_text(text_content, source_lang, target_lang)
-                
-                # Generate translated PDF
-                logging.info("Generating translated PDF...")
-                translated_filename = f"translated_{file_id}_{original_filename}"
-                translated_path = os.path.join(app.config['DOWNLOAD_FOLDER'], translated_filename)
+                if source_lang == 'auto':
+                    page_languages = detect_source_language(job, pages)
+                    if page_languages is None or set(page_languages) == {target_lang}:
+                        finish_profile(job)
+                        message = ('Could not detect the language of the PDF; please choose the source language'
+                                   if page_languages is None else
+                                   f'The PDF already appears to be in {LANGUAGES[target_lang]}')
+                        job.publish('error', message=message)
+                        flash(message, 'error')
+                        artifact_store.delete(upload_path)
+                        cancellations.finish(task_id)
+                        return redirect(url_for('index'))
+                    source_lang = job.source_lang
+                job.check_cancelled('extracting')
+                job.estimate_cost(len(pages), len(text_content))
                 
-                processor.create_pdf(translated_text, translated_path, original_filename, target_lang)
+                needs_preview = len(pages) > app.config['PREVIEW_PAGES'] or len(text_content) > app.config['PREVIEW_CHARS']
+                if request.form.get('preview') and needs_preview:
+                    # Render the first pages now and finish the document in the background
+                    with profiled(job):
+                        preview_segments = run_preview(job, processor, pages)
+                    preview_url = url_for('download_file', filename=job.preview_filename)
+                    job.publish('preview', preview_url=preview_url)
+                    submit_job(job, processor=processor, pages=pages, text_content=text_content,
+                               seed_segments=preview_segments)
+                    handed_off = True
+                    flash(f'Preview of the first {app.config["PREVIEW_PAGES"]} page(s) is ready; '
+                          f'the full translation continues in the background.', 'info')
+                    return redirect(preview_url)
                 
-                # Clean up uploaded file immediately
-                os.remove(upload_path)
-                
-                # Save to history immediately but efficiently
-                session_id = session.get('session_id', str(uuid.uuid4()))
-                session['session_id'] = session_id
-                
-                try:
-                    history_entry = TranslationHistory()
-                    history_entry.session_id = session_id
-                    history_entry.original_filename = original_filename
-                    history_entry.translated_filename = translated_filename
-                    history_entry.source_language = source_lang
-                    history_entry.target_language = target_lang
-                    history_entry.file_size = file_size
-                    db.session.add(history_entry)
-                    db.session.commit()
-                    logging.info("Translation history saved successfully")
-                except Exception as db_error:
-                    logging.warning(f"History save failed: {db_error}")
-                    db.session.rollback()
-                    # Continue without failing the request
+                # Scheduled like background work so small documents are not stuck behind large ones
+                future = submit_job(job, processor=processor, pages=pages, text_content=text_content)
+                handed_off = True
+                result = future.result()
+                reuse = result['reuse']
                 
                 flash(f'PDF successfully translated from {LANGUAGES[source_lang]} to {LANGUAGES[target_lang]}!', 'success')
-                return redirect(url_for('download_file', filename=translated_filename))
+                if result['reused_previous']:
+                    flash(f"Reused {reuse['reused_paragraphs']} of {reuse['paragraphs']} paragraphs from the previous version", 'info')
+                return redirect(job.download_url)
                 
+            # Once submitted, the job reports its own failure and cleans up after itself
+            except JobCancelled as e:
+                if not handed_off:
+                    finish_profile(job)
+                    stop_cancelled_job(job, e)
+                flash(str(e), 'info')
+                return redirect(url_for('index'))
             except Exception as e:
-                logging.error(f"Translation error: {str(e)}")
+                if not handed_off:
+                    logging.error(f"Translation error: {str(e)}")
+                    finish_profile(job)
+                    job.publish('error', message=f'Translation failed: {str(e)}')
+                    # Clean up files
+                    artifact_store.delete(upload_path)
+                    cancellations.finish(task_id)
                 flash(f'Translation failed: {str(e)}', 'error')
-                # Clean up files
-                if os.path.exists(upload_path):
-                    os.remove(upload_path)
                 return redirect(url_for('index'))
         else:
             flash('Please upload a valid PDF file', 'error')
@@ -202,12 +422,22 @@ def upload_file():
         logging.error(f"Upload error: {str(e)}")
         flash('An error occurred during file upload', 'error')
         return redirect(url_for('index'))
+    finally:
+        if not handed_off:
+            ticket.release()
 
 @app.route('/download/<filename>')
 def download_file(filename):
     try:
-        file_path = os.path.join(app.config['DOWNLOAD_FOLDER'], filename)
-        if os.path.exists(file_path):
+        # Small jobs are served from memory until the background writer has persisted them
+        data = artifact_store.pending_data('downloads', filename)
+        if data is not None:
+            return send_file(io.BytesIO(data), mimetype='application/pdf', as_attachment=True, download_name=filename)
+        
+        # Another worker may still be persisting an in-memory result
+        file_path = artifact_store.find('downloads', filename) or \
+            artifact_store.wait_for('downloads', filename, app.config['DOWNLOAD_PENDING_WAIT'])
+        if file_path is not None:
             return send_file(file_path, as_attachment=True, download_name=filename)
         else:
             flash('File not found', 'error')
@@ -220,6 +450,8 @@ def download_file(filename):
 @app.route('/clear_history')
 def clear_history():
     try:
+        # Commit queued records first so they are cleared as well
+        history_writer.flush()
         # Delete history entries for current session
         TranslationHistory.query.filter_by(session_id=session.get('session_id', '')).delete()
         db.session.commit()
@@ -42,10 +42,9 @@ def main():
         from app import app
         
         # Initialize database if needed
-        from app import db
-        with app.app_context():
-            db.create_all()
-            print("Database initialized")
+        from app import init_db
+        init_db()
+        print("Database initialized")
         
         print("Server starting on http://localhost:5000")
         print("Press Ctrl+C to stop the server")
@@ -0,0 +1,164 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+
+class ScheduledItem:
+    """A queued unit of work with its scheduling metadata"""
+
+    def __init__(self, seq, session_id, cost, priority_class, fn, args, kwargs):
+        self.seq = seq
+        self.session_id = session_id
+        self.cost = cost
+        self.priority_class = priority_class
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = concurrent.futures.Future()
+        self.enqueued_at = time.monotonic()
+
+
+class FairShareScheduler:
+    """Size-aware, fair-share job scheduler with aging
+
+    Each queued item is scored as
+
+        session virtual time + item cost - aging_rate * seconds waited
+
+    and the lowest score runs next. A session's virtual time grows by the cost
+    of every job it has dispatched, so a session submitting many documents
+    falls behind sessions with little recent usage. The cost term puts small
+    documents ahead of large ones, and aging makes every item's score fall
+    steadily, so nothing starves.
+    """
+
+    PRIORITY_CLASSES = ('small', 'medium', 'large')
+
+    def __init__(self, workers=2, small_cost=10, large_cost=100, aging_rate=1.0, name='scheduler'):
+        self.workers = workers
+        self.small_cost = small_cost
+        self.large_cost = large_cost
+        self.aging_rate = aging_rate
+        self.name = name
+
+        self._queue = []
+        self._session_vtime = {}
+        self._vclock = 0.0
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._threads = []
+        self._shutdown = False
+        self.running = 0
+
+        self._class_stats = {
+            name: {'dispatched': 0, 'total_wait': 0.0, 'max_wait': 0.0, 'recent_waits': collections.deque(maxlen=200)}
+            for name in self.PRIORITY_CLASSES
+        }
+
+    def classify(self, cost):
+        """Priority class name for a cost estimate"""
+        if cost < self.small_cost:
+            return 'small'
+        if cost < self.large_cost:
+            return 'medium'
+        return 'large'
+
+    def submit(self, session_id, cost, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) and return a Future for its result"""
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError(f"{self.name} is shut down")
+            self._ensure_workers()
+            self._seq += 1
+            item = ScheduledItem(self._seq, session_id, cost, self.classify(cost), fn, args, kwargs)
+
+            # A session returning from idle starts at the current clock, not with banked credit
+            if not any(queued.session_id == session_id for queued in self._queue):
+                self._session_vtime[session_id] = max(self._session_vtime.get(session_id, 0.0), self._vclock)
+
+            self._queue.append(item)
+            self._condition.notify()
+            return item.future
+
+    def _ensure_workers(self):
+        """Start worker threads on first use (lock must be held)"""
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"{self.name}-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _score(self, item, now):
+        return self._session_vtime.get(item.session_id, 0.0) + item.cost - self.aging_rate * (now - item.enqueued_at)
+
+    def _select(self):
+        """Pop the next item to run (lock must be held)"""
+        now = time.monotonic()
+        item = min(self._queue, key=lambda queued: (self._score(queued, now), queued.seq))
+        self._queue.remove(item)
+
+        start_tag = self._session_vtime.get(item.session_id, 0.0)
+        self._vclock = max(self._vclock, start_tag)
+        self._session_vtime[item.session_id] = start_tag + item.cost
+
+        # Forget idle sessions so the table does not grow without bound
+        active = {queued.session_id for queued in self._queue} | {item.session_id}
+        for session_id in [s for s, v in self._session_vtime.items() if s not in active and v <= self._vclock]:
+            del self._session_vtime[session_id]
+
+        wait = now - item.enqueued_at
+        stats = self._class_stats[item.priority_class]
+        stats['dispatched'] += 1
+        stats['total_wait'] += wait
+        stats['max_wait'] = max(stats['max_wait'], wait)
+        stats['recent_waits'].append(wait)
+        return item
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._shutdown:
+                    self._condition.wait()
+                if self._shutdown and not self._queue:
+                    return
+                item = self._select()
+                self.running += 1
+
+            if item.future.set_running_or_notify_cancel():
+                try:
+                    item.future.set_result(item.fn(*item.args, **item.kwargs))
+                except BaseException as e:
+                    item.future.set_exception(e)
+
+            with self._condition:
+                self.running -= 1
+
+    def shutdown(self, wait=True):
+        """Stop accepting work; queued items still run before workers exit"""
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def stats(self):
+        """Queue depth and wait times per priority class"""
+        with self._condition:
+            now = time.monotonic()
+            result = {'workers': self.workers, 'running': self.running, 'queued': len(self._queue),
+                      'sessions': len(self._session_vtime), 'classes': {}}
+            for name in self.PRIORITY_CLASSES:
+                stats = self._class_stats[name]
+                queued = [item for item in self._queue if item.priority_class == name]
+                waits = sorted(stats['recent_waits'])
+                result['classes'][name] = {
+                    'queued': len(queued),
+                    'oldest_wait_s': round(max((now - item.enqueued_at for item in queued), default=0.0), 3),
+                    'dispatched': stats['dispatched'],
+                    'avg_wait_s': round(stats['total_wait'] / stats['dispatched'], 3) if stats['dispatched'] else 0.0,
+                    'p95_wait_s': round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+                    'max_wait_s': round(stats['max_wait'], 3),
+                }
+            return result
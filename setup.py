@@ -64,9 +64,8 @@ def initialize_database():
     print("🗄️ Initializing database...")
     try:
         # Create the database file and tables
-        from app import app, db
-        with app.app_context():
-            db.create_all()
+        from app import init_db
+        init_db()
         print("✅ Database initialized successfully")
     except Exception as e:
         print(f"❌ Database initialization failed: {e}")
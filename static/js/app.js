@@ -15,10 +15,18 @@ document.addEventListener('DOMContentLoaded', function() {
     const removeFileBtn = document.getElementById('removeFile');
     const uploadForm = document.getElementById('uploadForm');
     
+    // Progress stream for the current upload
+    let progressSource = null;
+    
+    // Task still running on the server (including background jobs after a preview)
+    let activeTaskId = null;
+    let cancelledTaskId = null;
+    
     // Language elements
     const sourceLanguage = document.getElementById('sourceLanguage');
     const targetLanguage = document.getElementById('targetLanguage');
     const swapLanguagesBtn = document.getElementById('swapLanguages');
+    const previewMode = document.getElementById('previewMode');
     
     // Initialize page
     init();
@@ -210,7 +218,9 @@ document.addEventListener('DOMContentLoaded', function() {
         const sourceValue = sourceLanguage.value;
         const targetValue = targetLanguage.value;
         
-        if (sourceValue && targetValue) {
+        if (sourceValue === 'auto') {
+            showAlert('Choose a specific source language to swap.', 'warning');
+        } else if (sourceValue && targetValue) {
             sourceLanguage.value = targetValue;
             targetLanguage.value = sourceValue;
             
@@ -280,6 +290,22 @@ document.addEventListener('DOMContentLoaded', function() {
         formData.append('source_language', sourceLanguage.value);
         formData.append('target_language', targetLanguage.value);
         
+        // Task id lets us subscribe to server progress before the upload finishes
+        const taskId = generateTaskId();
+        formData.append('task_id', taskId);
+        
+        // A new upload replaces any background job still running for the previous one
+        if (activeTaskId) {
+            cancelTranslation(activeTaskId);
+        }
+        activeTaskId = taskId;
+        
+        // Preview mode returns the first pages early and keeps translating in the background
+        const previewRequested = previewMode && previewMode.checked;
+        if (previewRequested) {
+            formData.append('preview', '1');
+        }
+        
         console.log('FormData contents:');
         for (let pair of formData.entries()) {
             console.log(pair[0] + ': ' + pair[1]);
@@ -287,25 +313,52 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Show loading state
         showLoadingState();
-        showProgress();
+        showProgress(taskId);
         
-        // Submit with fetch
-        fetch(uploadForm.action, {
+        // Submit with fetch; the task id also goes in the URL so the server can report
+        // waiting for capacity before it reads the upload
+        const uploadUrl = new URL(uploadForm.action, window.location.href);
+        uploadUrl.searchParams.set('task_id', taskId);
+        fetch(uploadUrl, {
             method: 'POST',
             body: formData
         })
         .then(response => {
             console.log('Response received:', response.status);
-            if (response.redirected) {
+            if (cancelledTaskId === taskId) {
+                resetFormState();
+                showAlert('Translation cancelled.', 'info');
+                return;
+            }
+            if (response.status === 429) {
+                // Admission control turned the upload away; nothing was started
+                closeProgressStream();
+                activeTaskId = null;
+                return response.json().catch(() => ({})).then(data => {
+                    const retryAfter = data.retry_after || response.headers.get('Retry-After');
+                    const message = data.error || 'The server is busy.';
+                    showAlert(retryAfter ? `${message} Try again in about ${retryAfter} second(s).` : message, 'warning');
+                    resetFormState();
+                });
+            }
+            const isPreview = response.redirected && response.url.indexOf('/download/preview_') !== -1;
+            if (isPreview) {
+                document.querySelector('.progress-container').dataset.background = '1';
+            } else {
+                closeProgressStream();
+                activeTaskId = null;
+            }
+            // Failures and stopped jobs redirect back to the index page with a flash message
+            if (response.redirected && response.url.indexOf('/download/') !== -1) {
                 // After successful translation, refresh the history and reset form
                 refreshTranslationHistory().then(() => {
-                    // Reset form state immediately
-                    resetFormState();
+                    // Reset form state immediately, keeping the progress stream of a background job
+                    resetFormState(isPreview);
                     
                     // Show success message with download option
                     const successMessage = `
                         <div class="d-flex align-items-center justify-content-between">
-                            <span>Translation completed successfully!</span>
+                            <span>${isPreview ? 'Preview ready! The full translation is still running.' : 'Translation completed successfully!'}</span>
                             <a href="${response.url}" class="btn btn-sm btn-primary ms-2">
                                 <i class="fas fa-download"></i> Download Now
                             </a>
@@ -333,6 +386,7 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .catch(error => {
             console.error('Upload error:', error);
+            activeTaskId = null;
             showAlert('An error occurred during upload. Please try again.', 'error');
             resetFormState();
         });
@@ -368,7 +422,11 @@ document.addEventListener('DOMContentLoaded', function() {
         return true;
     }
     
-    function resetFormState() {
+    function resetFormState(keepProgress) {
+        if (!keepProgress) {
+            closeProgressStream();
+        }
+        
         const submitBtn = document.getElementById('translateSubmit');
         if (submitBtn) {
             submitBtn.innerHTML = '<i class="fas fa-magic"></i> Translate PDF';
@@ -385,7 +443,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Hide progress
         const progressContainer = document.querySelector('.progress-container');
-        if (progressContainer) {
+        if (progressContainer && !keepProgress) {
             progressContainer.style.display = 'none';
         }
         
@@ -419,7 +477,7 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
-    function showProgress() {
+    function showProgress(taskId) {
         // Create progress bar if it doesn't exist
         let progressContainer = document.querySelector('.progress-container');
         if (!progressContainer) {
@@ -429,25 +487,130 @@ document.addEventListener('DOMContentLoaded', function() {
                 <div class="progress">
                     <div class="progress-bar" role="progressbar" style="width: 0%"></div>
                 </div>
-                <p class="text-center mt-2">Processing your PDF...</p>
+                <p class="text-center mt-2 progress-status">Processing your PDF...</p>
+                <div class="text-center">
+                    <button type="button" class="btn btn-sm btn-outline-danger cancel-translation">
+                        <i class="fas fa-times"></i> Cancel
+                    </button>
+                </div>
             `;
             uploadForm.appendChild(progressContainer);
         }
         
+        const cancelBtn = progressContainer.querySelector('.cancel-translation');
+        cancelBtn.disabled = false;
+        cancelBtn.onclick = () => {
+            cancelBtn.disabled = true;
+            cancelTranslation(taskId);
+        };
+        
         progressContainer.style.display = 'block';
+        progressContainer.dataset.background = '0';
         
-        // Simulate progress
         const progressBar = progressContainer.querySelector('.progress-bar');
-        let progress = 0;
-        const interval = setInterval(() => {
-            progress += Math.random() * 15;
-            if (progress > 90) progress = 90;
-            progressBar.style.width = progress + '%';
+        const progressStatus = progressContainer.querySelector('.progress-status');
+        progressBar.style.width = '0%';
+        progressStatus.textContent = 'Uploading your PDF...';
+        
+        if (!window.EventSource || !taskId) {
+            return;
+        }
+        
+        // Real progress pushed by the server as Server-Sent Events
+        closeProgressStream();
+        progressSource = new EventSource(`/translate-progress/${encodeURIComponent(taskId)}`);
+        
+        const updateProgress = (e, describe) => {
+            const data = JSON.parse(e.data);
+            if (typeof data.progress === 'number') {
+                progressBar.style.width = data.progress + '%';
+            }
+            progressStatus.textContent = describe(data);
+            return data;
+        };
+        
+        progressSource.addEventListener('extracted', e => updateProgress(e, data =>
+            `Extracted ${data.pages} page(s), ${data.chars} characters`));
+        progressSource.addEventListener('detected', e => updateProgress(e, data => {
+            const languages = Object.keys(data.languages || {});
+            return languages.length > 1
+                ? `Detected a mixed-language document: ${languages.map(getLanguageName).join(', ')}`
+                : `Detected source language: ${getLanguageName(data.language)}`;
+        }));
+        progressSource.addEventListener('waiting', e => updateProgress(e, data =>
+            `Server busy, waiting for a free slot (position ${data.position})...`));
+        progressSource.addEventListener('translating', e => updateProgress(e, data =>
+            `Translated chunk ${data.chunk} of ${data.total}`));
+        progressSource.addEventListener('rendering', e => updateProgress(e, () =>
+            'Rendering translated PDF...'));
+        progressSource.addEventListener('compacting', e => updateProgress(e, () =>
+            'Optimising PDF size...'));
+        progressSource.addEventListener('preview', e => updateProgress(e, () =>
+            'Preview ready, translating the remaining pages...'));
+        progressSource.addEventListener('cancelled', e => {
+            updateProgress(e, data => data.message || 'Translation cancelled');
+            closeProgressStream();
+            if (activeTaskId === taskId) {
+                activeTaskId = null;
+            }
+            if (progressContainer.dataset.background === '1') {
+                progressContainer.style.display = 'none';
+            }
+        });
+        progressSource.addEventListener('done', e => {
+            const data = updateProgress(e, () => 'Translation complete');
+            closeProgressStream();
+            if (activeTaskId === taskId) {
+                activeTaskId = null;
+            }
             
-            if (progress >= 90) {
-                clearInterval(interval);
+            // Background jobs finish after the upload request has returned
+            if (data.download_url && progressContainer.dataset.background === '1') {
+                refreshTranslationHistory();
+                showAlert(`
+                    <div class="d-flex align-items-center justify-content-between">
+                        <span>Full translation completed!</span>
+                        <a href="${data.download_url}" class="btn btn-sm btn-primary ms-2">
+                            <i class="fas fa-download"></i> Download Now
+                        </a>
+                    </div>
+                `, 'success');
+                progressContainer.style.display = 'none';
+            }
+        });
+        progressSource.addEventListener('error', e => {
+            // Server-sent error events carry data; connection errors do not
+            if (e.data) {
+                updateProgress(e, data => data.message || 'Translation failed');
+                closeProgressStream();
+                if (activeTaskId === taskId) {
+                    activeTaskId = null;
+                }
             }
-        }, 500);
+        });
+    }
+    
+    function cancelTranslation(taskId) {
+        cancelledTaskId = taskId;
+        if (activeTaskId === taskId) {
+            activeTaskId = null;
+        }
+        return fetch(`/translate-cancel/${encodeURIComponent(taskId)}`, {method: 'POST'})
+            .catch(error => console.error('Cancel failed:', error));
+    }
+    
+    function closeProgressStream() {
+        if (progressSource) {
+            progressSource.close();
+            progressSource = null;
+        }
+    }
+    
+    function generateTaskId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return 'task-' + Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 10);
     }
     
     function showAlert(message, type) {
@@ -541,6 +704,13 @@ document.addEventListener('DOMContentLoaded', function() {
         return languages[code] || code;
     }
     
+    // Closing the tab stops the job straight away instead of waiting for the server to notice
+    window.addEventListener('pagehide', function() {
+        if (activeTaskId && navigator.sendBeacon) {
+            navigator.sendBeacon(`/translate-cancel/${encodeURIComponent(activeTaskId)}`);
+        }
+    });
+    
     // Handle browser back/forward buttons
     window.addEventListener('popstate', function() {
         const hash = window.location.hash;
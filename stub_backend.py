@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the translation backend, used by benchmarks and load tests.
+Speaks the gtx `translate_a/single` protocol used by translation_client.py and
+counts connections so keep-alive reuse can be measured.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubStats:
+    """Thread-safe request and connection counters"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+        self.chars = 0
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'connections': self.connections,
+                'requests': self.requests,
+                'errors': self.errors,
+                'chars': self.chars,
+            }
+
+
+class StubTranslationHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.stats.lock:
+            self.server.stats.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/stats':
+            self._send_json(200, self.server.stats.snapshot())
+        elif url.path == '/stats/reset':
+            with self.server.stats.lock:
+                self.server.stats.reset()
+            self._send_json(200, {'ok': True})
+        elif url.path == '/translate_a/single':
+            self._translate(parse_qs(url.query))
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        params = parse_qs(url.query)
+        params.update(parse_qs(body))
+        if url.path == '/translate_a/single':
+            self._translate(params)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def _translate(self, params):
+        server = self.server
+        text = params.get('q', [''])[0]
+        target = params.get('tl', ['en'])[0]
+
+        delay = server.latency + random.uniform(0, server.jitter)
+        if random.random() < server.tail_probability:
+            delay += server.tail_latency
+        time.sleep(delay)
+
+        if random.random() < server.error_rate:
+            with server.stats.lock:
+                server.stats.errors += 1
+            self._send_json(503, {'error': 'stub backend error'})
+            return
+
+        with server.stats.lock:
+            server.stats.requests += 1
+            server.stats.chars += len(text)
+
+        translated = f"[{target}] {text}"
+        self._send_json(200, [[[translated, text, None, None]], None, params.get('sl', ['auto'])[0]])
+
+
+class StubTranslationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.05, jitter=0.0, tail_latency=0.0, tail_probability=0.0,
+                 error_rate=0.0):
+        super().__init__(address, StubTranslationHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_latency = tail_latency
+        self.tail_probability = tail_probability
+        self.error_rate = error_rate
+        self.stats = StubStats()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub_backend(host='127.0.0.1', port=0, **options):
+    """Start a stub server on a background thread and return it"""
+    server = StubTranslationServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, name='stub-backend', daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stub translation backend')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=50, help='Base latency per request')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Uniform random extra latency')
+    parser.add_argument('--tail-ms', type=float, default=0, help='Extra latency for tail requests')
+    parser.add_argument('--tail-prob', type=float, default=0, help='Probability of a tail request')
+    parser.add_argument('--error-rate', type=float, default=0, help='Probability of a 503 response')
+    args = parser.parse_args()
+
+    server = StubTranslationServer(
+        (args.host, args.port),
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        tail_latency=args.tail_ms / 1000,
+        tail_probability=args.tail_prob,
+        error_rate=args.error_rate
+    )
+    print(f"Stub translation backend listening on {server.url}")
+    print(f"Point the app at it with TRANSLATE_BACKEND=http TRANSLATE_BACKEND_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStub backend stopped")
+
+
+if __name__ == "__main__":
+    main()
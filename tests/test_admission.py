@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def test_job_limit_and_release():
+    controller = AdmissionController(max_jobs=2, max_session_jobs=0, max_waiting=0)
+    first = controller.admit('a', 100)
+    controller.admit('b', 100)
+    with pytest.raises(AdmissionRejected) as error:
+        controller.admit('c', 100)
+    assert error.value.reason == 'busy'
+    assert error.value.retry_after >= 1
+    first.release()
+    first.release()  # a second release is a no-op
+    assert controller.in_flight == 1
+    controller.admit('c', 100)
+    assert controller.stats()['rejected'] == {'busy': 1}
+
+
+def test_session_limit():
+    controller = AdmissionController(max_jobs=10, max_session_jobs=1)
+    ticket = controller.admit('a', 10)
+    with pytest.raises(AdmissionRejected) as error:
+        controller.admit('a', 10)
+    assert error.value.reason == 'session'
+    controller.admit('b', 10)
+    ticket.release()
+    controller.admit('a', 10)
+
+
+def test_character_budget_admits_an_oversized_document_alone():
+    controller = AdmissionController(max_jobs=10, max_chars=1000, max_session_jobs=0, max_waiting=0)
+    big = controller.admit('a', 5000)
+    with pytest.raises(AdmissionRejected):
+        controller.admit('b', 10)
+    big.release()
+    controller.admit('b', 10)
+
+
+def test_estimate_chars_from_content_length():
+    controller = AdmissionController(chars_per_byte=0.5)
+    assert controller.estimate_chars(1000) == 500
+    assert controller.estimate_chars(None) == 0
+
+
+def test_resize_corrects_the_estimate_and_wakes_waiters():
+    controller = AdmissionController(max_jobs=10, max_chars=1000, max_session_jobs=0, max_wait=2.0)
+    estimated = controller.admit('a', 900)
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(controller.admit('b', 500)))
+    waiter.start()
+    time.sleep(0.05)
+    assert not admitted
+    estimated.resize(300)
+    waiter.join(timeout=1)
+    assert admitted
+    assert controller.chars_in_flight == 800
+
+    estimated.release()
+    estimated.resize(5000)  # ignored once released
+    assert controller.chars_in_flight == 500
+
+
+def test_waiters_are_served_in_order_and_time_out():
+    controller = AdmissionController(max_jobs=1, max_session_jobs=0, max_waiting=2, max_wait=0.1)
+    held = controller.admit('a', 1)
+    positions = []
+    with pytest.raises(AdmissionRejected):
+        controller.admit('b', 1, on_wait=positions.append)
+    assert positions == [1]
+    assert controller.stats()['waiting'] == 0
+
+    controller.max_wait = 2.0
+    tickets = []
+    first = threading.Thread(target=lambda: tickets.append(controller.admit('first', 1)))
+    first.start()
+    time.sleep(0.05)
+    second = threading.Thread(target=lambda: tickets.append(controller.admit('second', 1)))
+    second.start()
+    time.sleep(0.05)
+    held.release()
+    first.join(timeout=1)
+    assert [ticket.session_id for ticket in tickets] == ['first']
+    assert second.is_alive()  # still needs the slot the first waiter took
+    tickets[0].release()
+    second.join(timeout=1)
+    assert [ticket.session_id for ticket in tickets] == ['first', 'second']
+
+
+def test_degraded_backend_shrinks_the_job_limit():
+    error_rate = [0.0]
+    controller = AdmissionController(max_jobs=10, max_session_jobs=0, max_waiting=0,
+                                     health=lambda: error_rate[0])
+    assert controller.job_limit() == 10
+    error_rate[0] = 0.5
+    assert controller.job_limit() == 5
+    for _ in range(5):
+        controller.admit('a', 1)
+    with pytest.raises(AdmissionRejected) as error:
+        controller.admit('a', 1)
+    assert error.value.reason == 'backend'
@@ -0,0 +1,65 @@
+import os
+import time
+
+from artifact_store import ArtifactStore
+
+
+def make_store(tmp_path, **options):
+    options.setdefault('janitor_interval', 0)
+    return ArtifactStore({'uploads': str(tmp_path / 'uploads'), 'downloads': str(tmp_path / 'downloads')},
+                         **options)
+
+
+def write(store, kind, name, data):
+    with store.writing(kind, name) as temp_path:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+    return store.find(kind, name)
+
+
+def test_artifacts_are_sharded_by_name(tmp_path):
+    store = make_store(tmp_path)
+    path = write(store, 'downloads', 'translated_report.pdf', b'pdf')
+    shard = os.path.relpath(os.path.dirname(path), tmp_path / 'downloads')
+    assert len(shard.split(os.sep)) == 2
+    assert store.find('downloads', 'missing.pdf') is None
+
+
+def test_rewrite_replaces_usage(tmp_path):
+    store = make_store(tmp_path)
+    write(store, 'downloads', 'a.pdf', b'x' * 100)
+    write(store, 'downloads', 'a.pdf', b'x' * 40)
+    assert store.stats()['usage']['downloads'] == {'files': 1, 'bytes': 40}
+    store.delete(store.find('downloads', 'a.pdf'))
+    assert store.stats()['usage']['downloads'] == {'files': 0, 'bytes': 0}
+
+
+def test_failed_write_leaves_nothing_behind(tmp_path):
+    store = make_store(tmp_path)
+    try:
+        with store.writing('downloads', 'b.pdf') as temp_path:
+            with open(temp_path, 'wb') as f:
+                f.write(b'partial')
+            raise RuntimeError('render failed')
+    except RuntimeError:
+        pass
+    assert store.find('downloads', 'b.pdf') is None
+    assert [files for _, _, files in os.walk(tmp_path / 'downloads') if files] == []
+
+
+def test_quota_evicts_least_recently_used_unprotected(tmp_path):
+    store = make_store(tmp_path, quota_bytes=250, min_age=0, protected=lambda: {'keep.pdf'})
+    for name in ('old.pdf', 'keep.pdf', 'new.pdf'):
+        path = write(store, 'downloads', name, b'x' * 100)
+        stamp = time.time() - (1000 if name != 'new.pdf' else 0)
+        os.utime(path, (stamp, stamp))
+    assert store.collect() == 1
+    assert store.find('downloads', 'old.pdf') is None
+    assert store.find('downloads', 'keep.pdf') is not None
+    assert store.stats()['usage']['downloads'] == {'files': 2, 'bytes': 200}
+
+
+def test_invalid_names_are_rejected(tmp_path):
+    store = make_store(tmp_path)
+    assert store.find('downloads', '../etc/passwd') is None
+    assert store.find('downloads', '.hidden.tmp') is None
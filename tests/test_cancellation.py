@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from cancellation import CancelToken, CancellationRegistry, JobCancelled
+
+
+def test_token_check_raises_with_reason_and_stage():
+    token = CancelToken()
+    token.check('extracting')
+    token.cancel('cancelled')
+    token.cancel('deadline')  # the first reason wins
+    with pytest.raises(JobCancelled) as error:
+        token.check('translating')
+    assert error.value.reason == 'cancelled'
+    assert error.value.stage == 'translating'
+    assert str(error.value) == 'Translation cancelled'
+
+
+def test_token_deadline():
+    token = CancelToken(deadline=time.monotonic() - 1)
+    assert token.cancelled
+    assert token.reason == 'deadline'
+
+
+def test_explicit_cancel_is_limited_to_the_owning_session():
+    registry = CancellationRegistry()
+    token = registry.register('t1', 'session-a')
+    assert not registry.cancel('t1', session_id='session-b')
+    assert not token.cancelled
+    assert registry.cancel('t1', session_id='session-a')
+    assert token.reason == 'cancelled'
+    assert not registry.cancel('unknown')
+
+
+def test_disconnect_cancels_after_grace_without_listeners():
+    listeners = {'t1': 0}
+    registry = CancellationRegistry(disconnect_grace=0.05, listeners=listeners.get)
+    token = registry.register('t1', 's')
+    assert not token.cancelled
+    registry.disconnected('t1')
+    assert not token.cancelled  # still within the grace period
+    time.sleep(0.06)
+    listeners['t1'] = 1  # the stream reconnected
+    assert not token.cancelled
+    listeners['t1'] = 0
+    assert token.cancelled
+    assert token.reason == 'disconnected'
+
+
+def test_disconnect_ignored_when_disabled():
+    registry = CancellationRegistry(disconnect_grace=0, cancel_on_disconnect=False, listeners=lambda task_id: 0)
+    token = registry.register('t1', 's')
+    registry.disconnected('t1')
+    assert not token.cancelled
+
+
+def test_finish_counts_stops_once():
+    registry = CancellationRegistry()
+    registry.register('t1', 's')
+    error = JobCancelled('cancelled', 'translating')
+    registry.finish('t1', error)
+    registry.finish('t1', error)
+    stats = registry.stats()
+    assert stats['stopped'] == {'cancelled': 1}
+    assert stats['stopped_at_stage'] == {'translating': 1}
+    assert stats['active'] == 0
+
+
+def test_registry_deadline():
+    registry = CancellationRegistry(deadline=0.01)
+    token = registry.register('t1', 's')
+    time.sleep(0.02)
+    with pytest.raises(JobCancelled) as error:
+        token.check()
+    assert error.value.reason == 'deadline'
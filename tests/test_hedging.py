@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('httpx')
+
+from stub_backend import start_stub_backend
+from translation_client import AsyncTranslationClient
+
+
+@pytest.fixture
+def backend():
+    server = start_stub_backend(latency=0.2)
+    yield server
+    server.shutdown()
+
+
+def hedging_client(url, max_concurrency):
+    """A client that hedges every request still running after 10ms"""
+    client = AsyncTranslationClient(url, max_concurrency=max_concurrency, hedge_percentile=50,
+                                    hedge_min_delay=0.01, hedge_budget=1.0)
+    client.latencies.extend([0.01] * client.HEDGE_MIN_SAMPLES)
+    return client
+
+
+def test_hedging_is_off_by_default(backend):
+    client = AsyncTranslationClient(backend.url)
+    try:
+        client.latencies.extend([0.01] * client.HEDGE_MIN_SAMPLES)
+        assert client.hedge_delay() is None
+        assert client.run(client.translate('hello', 'en', 'hi')) == '[hi] hello'
+        assert client.stats()['hedges'] == 0
+    finally:
+        client.close()
+
+
+def test_hedge_is_skipped_without_a_free_slot(backend):
+    client = hedging_client(backend.url, max_concurrency=1)
+    try:
+        assert client.run(client.translate('hello', 'en', 'hi')) == '[hi] hello'
+        stats = client.stats()
+        assert stats['hedges'] == 0
+        assert stats['hedges_skipped'] == 1
+        assert backend.stats.snapshot()['requests'] == 1
+    finally:
+        client.close()
+
+
+def test_hedge_takes_and_returns_a_slot(backend):
+    client = hedging_client(backend.url, max_concurrency=2)
+    try:
+        assert client.run(client.translate('hello', 'en', 'hi')) == '[hi] hello'
+        assert client.stats()['hedges'] == 1
+        # Both slots are free again, so two chunks can be sent at once
+        start = time.perf_counter()
+        client.run(client.translate_many(['a', 'b'], 'en', 'hi'))
+        assert time.perf_counter() - start < 0.35
+    finally:
+        client.close()
+
+
+def test_requests_in_flight_stay_within_the_concurrency_limit(backend):
+    client = hedging_client(backend.url, max_concurrency=2)
+    peak = [0]
+    done = threading.Event()
+
+    def watch():
+        while not done.is_set():
+            peak[0] = max(peak[0], client.in_flight)
+            time.sleep(0.002)
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    try:
+        results = client.run(client.translate_many(['a', 'b', 'c', 'd', 'e'], 'en', 'hi'))
+        assert results == ['[hi] a', '[hi] b', '[hi] c', '[hi] d', '[hi] e']
+    finally:
+        done.set()
+        watcher.join()
+        client.close()
+    assert 0 < peak[0] <= 2
@@ -0,0 +1,75 @@
+import contextlib
+
+from history_writer import HistoryWriter
+
+
+class Record:
+    pass
+
+
+class FakeSession:
+    """Session whose commit fails while any added record is in the `bad` set"""
+
+    def __init__(self, failures=0, bad=()):
+        self.failures = failures
+        self.bad = set(bad)
+        self.added = []
+        self.committed = []
+
+    def add(self, entry):
+        self.added.append(entry)
+
+    def commit(self):
+        if self.failures or any(getattr(entry, 'name', None) in self.bad for entry in self.added):
+            self.failures = max(0, self.failures - 1)
+            raise RuntimeError('commit failed')
+        self.committed.extend(self.added)
+        self.added = []
+
+    def rollback(self):
+        self.added = []
+
+    def remove(self):
+        pass
+
+
+class FakeApp:
+    config = {}
+
+    @contextlib.contextmanager
+    def app_context(self):
+        yield
+
+
+class FakeDB:
+    def __init__(self, session):
+        self.session = session
+
+
+def make_writer(session):
+    writer = HistoryWriter(retry_delay=0)
+    writer.app, writer.db = FakeApp(), FakeDB(session)
+    return writer
+
+
+def test_failed_batch_is_retried_once():
+    session = FakeSession(failures=1)
+    writer = make_writer(session)
+    writer._flush_batch([(Record, {'name': 'a'}), (Record, {'name': 'b'})])
+    assert [entry.name for entry in session.committed] == ['a', 'b']
+    assert writer.written == 2 and writer.failed == 0 and writer.retries == 1
+
+
+def test_bad_row_only_loses_itself():
+    session = FakeSession(bad={'b'})
+    writer = make_writer(session)
+    writer._flush_batch([(Record, {'name': 'a'}), (Record, {'name': 'b'}), (Record, {'name': 'c'})])
+    assert [entry.name for entry in session.committed] == ['a', 'c']
+    assert writer.written == 2 and writer.failed == 1 and writer.row_fallbacks == 1
+
+
+def test_pending_filters_queued_records():
+    writer = HistoryWriter()
+    writer._queue.put((Record, {'session_id': 's1', 'name': 'a'}))
+    writer._queue.put((Record, {'session_id': 's2', 'name': 'b'}))
+    assert writer.pending(Record, session_id='s1') == [{'session_id': 's1', 'name': 'a'}]
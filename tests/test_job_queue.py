@@ -0,0 +1,157 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+sqlalchemy = pytest.importorskip('sqlalchemy')
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, Text, create_engine, select, update
+
+from job_queue import JobQueue
+
+metadata = MetaData()
+# Same columns as models.QueuedJob, without importing Flask-SQLAlchemy
+queued_job = Table(
+    'queued_job', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('task_id', String(64), nullable=False, unique=True),
+    Column('session_id', String(128), nullable=False),
+    Column('state', String(16), nullable=False, default='queued'),
+    Column('sort_key', Float, nullable=False),
+    Column('payload', Text, nullable=False),
+    Column('worker_id', String(128)),
+    Column('attempts', Integer, nullable=False, default=0),
+    Column('lease_expires_at', DateTime),
+    Column('heartbeat_at', DateTime),
+    Column('cancel_reason', String(16)),
+    Column('watched_at', DateTime),
+    Column('progress_seq', Integer, nullable=False, default=0),
+    Column('progress_event', String(32)),
+    Column('progress_data', Text),
+    Column('result', Text),
+    Column('error', Text),
+    Column('created_at', DateTime),
+    Column('started_at', DateTime),
+    Column('finished_at', DateTime),
+)
+
+
+@pytest.fixture
+def database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'queue.db'}"
+    engine = create_engine(url, connect_args={'timeout': 30})
+    metadata.create_all(engine)
+    yield url
+    engine.dispose()
+
+
+def make_queue(url, worker_id, **options):
+    """A queue with its own engine, as on a separate host"""
+    engine = create_engine(url, connect_args={'timeout': 30})
+    queue = JobQueue(queued_job, lambda: engine, **options)
+    queue._worker_id = worker_id
+    return queue
+
+
+def enqueue(queue, count):
+    for i in range(count):
+        # Futures are not needed here; insert rows the way submit() does without starting the relay
+        with queue.engine().begin() as conn:
+            conn.execute(queued_job.insert().values(task_id=f't{i}', session_id='s', state='queued', sort_key=i,
+                                                    payload='{}', attempts=0, progress_seq=0,
+                                                    created_at=datetime.utcnow()))
+
+
+def rows(queue):
+    with queue.engine().connect() as conn:
+        return {row.task_id: row for row in conn.execute(select(queued_job)).all()}
+
+
+def test_concurrent_claimers_take_each_job_once(database):
+    enqueue(make_queue(database, 'setup'), 40)
+    claimed = {'a': [], 'b': []}
+
+    def claim_all(worker_id):
+        queue = make_queue(database, worker_id)
+        idle = 0
+        while idle < 3:
+            try:
+                row = queue.claim()
+            except sqlalchemy.exc.OperationalError:
+                continue  # SQLite refused the write lock; a queue worker would poll again
+            if row is None:
+                idle += 1
+                continue
+            claimed[worker_id].append(row['task_id'])
+
+    threads = [threading.Thread(target=claim_all, args=(worker_id,)) for worker_id in claimed]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    everything = claimed['a'] + claimed['b']
+    assert sorted(everything) == sorted(f't{i}' for i in range(40))
+    assert len(set(everything)) == len(everything)
+    state = rows(make_queue(database, 'check'))
+    assert all(row.state == 'running' and row.worker_id == ('a' if row.task_id in claimed['a'] else 'b')
+               for row in state.values())
+
+
+def test_jobs_are_claimed_in_sort_key_order(database):
+    queue = make_queue(database, 'a')
+    enqueue(queue, 3)
+    assert [queue.claim()['task_id'] for _ in range(3)] == ['t0', 't1', 't2']
+    assert queue.claim() is None
+
+
+def test_expired_lease_is_requeued_and_the_old_worker_stops(database):
+    first = make_queue(database, 'a', lease=0.05)
+    second = make_queue(database, 'b')
+    enqueue(first, 1)
+    row = first.claim()
+    time.sleep(0.1)
+
+    assert first.requeue_expired() == 1
+    assert rows(first)['t0'].state == 'queued'
+    again = second.claim()
+    assert again['id'] == row['id'] and again['attempts'] == 2
+
+    # The first worker finds out at its next heartbeat, and its late outcome is not recorded
+    assert first.heartbeat([row['id']]) == {row['id']: 'lease_lost'}
+    assert second.heartbeat([row['id']]) == {}
+    first.finish(row['id'], 'done', result={'stale': True})
+    state = rows(first)['t0']
+    assert state.state == 'running' and state.worker_id == 'b'
+    second.finish(row['id'], 'done', result={'ok': True})
+    assert rows(first)['t0'].state == 'done'
+
+
+def test_job_fails_after_max_attempts(database):
+    queue = make_queue(database, 'a', lease=0.01, max_attempts=1)
+    enqueue(queue, 1)
+    queue.claim()
+    time.sleep(0.05)
+    assert queue.requeue_expired() == 0
+    state = rows(queue)['t0']
+    assert state.state == 'failed' and queue.expired == 1
+
+
+def test_heartbeat_reports_cancels_and_abandoned_streams(database):
+    queue = make_queue(database, 'a', disconnect_grace=5)
+    enqueue(queue, 2)
+    first, second = queue.claim(), queue.claim()
+    assert queue.request_cancel('t0')
+    with queue.engine().begin() as conn:
+        conn.execute(update(queued_job).where(queued_job.c.task_id == 't1')
+                     .values(watched_at=datetime.utcnow() - timedelta(seconds=10)))
+    assert queue.heartbeat([first['id'], second['id']]) == {first['id']: 'cancelled', second['id']: 'disconnected'}
+
+
+def test_finished_job_is_not_reported_as_lost(database):
+    queue = make_queue(database, 'a')
+    enqueue(queue, 1)
+    row = queue.claim()
+    queue.finish(row['id'], 'done', result={})
+    assert queue.heartbeat([row['id']]) == {}
+    assert queue.lost_leases == 0
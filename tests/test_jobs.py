@@ -0,0 +1,211 @@
+import io
+import json
+import os
+import types
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+pytest.importorskip('reportlab')
+fitz = pytest.importorskip('fitz')
+
+# The app reads its database from the environment when it is imported
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app, db  # before jobs, as main.py imports them
+import jobs
+from artifact_store import ArtifactStore
+from cancellation import JobCancelled
+from models import DocumentVersion, TranslationHistory
+from pdf_processor import PDFProcessor
+from profiling import JobProfiler
+
+
+class StubTranslator:
+    """googletrans-style translator that prefixes each paragraph with the target language"""
+
+    def __init__(self):
+        self.requests = []
+
+    def translate(self, text, src, dest):
+        self.requests.append(text)
+        return types.SimpleNamespace(text='\n\n'.join(f"{dest}:{p}" for p in text.split('\n\n')))
+
+    def paragraphs(self):
+        return [p for text in self.requests for p in text.split('\n\n')]
+
+
+def source_pdf(pages):
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = ArtifactStore({'uploads': str(tmp_path / 'uploads'), 'downloads': str(tmp_path / 'downloads')},
+                          janitor_interval=0)
+    monkeypatch.setattr(jobs, 'artifact_store', store)
+    return store
+
+
+@pytest.fixture
+def database(monkeypatch):
+    # History rows stay queued until the test flushes them, instead of going through the writer thread
+    monkeypatch.setattr(jobs.history_writer, '_ensure_started', lambda: None)
+    with app.app_context():
+        db.create_all()
+        yield db
+        jobs.history_writer.flush()
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    monkeypatch.setenv('TRANSLATE_BACKEND', 'stub')
+    monkeypatch.setattr(PDFProcessor, '_fonts_ready', True)
+    processor = PDFProcessor()
+    processor.translator = StubTranslator()
+    return processor
+
+
+def make_job(store, pages, file_id='f1', upload_data=None):
+    data = source_pdf(pages)
+    upload_path = None
+    if upload_data is None:
+        upload_path = store.path('uploads', f"{file_id}_report.pdf")
+        with open(upload_path, 'wb') as f:
+            f.write(data)
+    return jobs.TranslationJob(task_id=f"task-{file_id}", session_id='s1', file_id=file_id,
+                               original_filename='report.pdf', upload_path=upload_path, source_lang='en',
+                               target_lang='es', file_size=len(data),
+                               upload_data=data if upload_data else None)
+
+
+def test_revision_reuses_paragraphs_of_the_stored_version(database, store, processor):
+    database.session.add(DocumentVersion(
+        session_id='s1', original_filename='report.pdf', translated_filename='translated_f0_report.pdf',
+        source_language='en', target_language='es', page_hashes='[]',
+        segments=json.dumps({processor.fingerprint('Unchanged page'): 'es:stored translation'}),
+        total_paragraphs=1, reused_paragraphs=0, created_at=datetime.utcnow()
+    ))
+    database.session.commit()
+
+    job = make_job(store, ['Unchanged page', 'New page'])
+    result = jobs.run_translation_job(job, processor=processor, pages=['Unchanged page', 'New page'])
+
+    assert result['reused_previous']
+    assert processor.translator.paragraphs() == ['New page']
+    assert (result['reuse']['paragraphs'], result['reuse']['reused_paragraphs']) == (2, 1)
+    assert store.find('downloads', job.translated_filename) is not None
+    assert store.find('uploads', 'f1_report.pdf') is None
+
+    # The new version is recorded with both paragraphs, for the next revision
+    jobs.history_writer.flush()
+    version = DocumentVersion.query.order_by(DocumentVersion.id.desc()).first()
+    assert set(json.loads(version.segments).values()) == {'es:stored translation', 'es:New page'}
+    assert TranslationHistory.query.count() == 1
+
+
+def test_preview_segments_seed_the_full_job(monkeypatch, database, store, processor):
+    monkeypatch.setitem(app.config, 'PREVIEW_PAGES', 2)
+    pages = ['Page one text', 'Page two text', 'Page three text', 'Page four text']
+    job = make_job(store, pages)
+
+    segments = jobs.run_preview(job, processor, pages)
+    assert processor.translator.paragraphs() == pages[:2]
+    assert store.find('downloads', job.preview_filename) is not None
+
+    processor.translator.requests.clear()
+    result = jobs.run_translation_job(job, processor=processor, pages=pages, seed_segments=segments)
+    assert processor.translator.paragraphs() == pages[2:]
+    assert result['reuse']['reused_paragraphs'] == 2
+    assert not result['reused_previous']
+
+
+def test_preview_stops_at_the_character_budget(monkeypatch, database, store, processor):
+    monkeypatch.setitem(app.config, 'PREVIEW_CHARS', 20)
+    pages = ['First paragraph\n\nSecond paragraph', 'Next page']
+    job = make_job(store, pages)
+    jobs.run_preview(job, processor, pages)
+    # Cut at a paragraph boundary, so the translated paragraph can be reused as it is
+    assert processor.translator.paragraphs() == ['First paragraph']
+
+
+def test_small_upload_never_touches_disk(monkeypatch, database, store, processor):
+    import routes
+    monkeypatch.setattr(routes, 'artifact_store', store)
+    monkeypatch.setattr(routes, 'make_processor', lambda job: processor)
+    written = []
+    original_writing = store.writing
+
+    def writing(kind, name):
+        written.append(kind)
+        return original_writing(kind, name)
+
+    monkeypatch.setattr(store, 'writing', writing)
+    monkeypatch.setattr(store, 'save', lambda *args: pytest.fail('upload was saved to disk'))
+
+    data = source_pdf(['Small document'])
+    response = app.test_client().post('/upload?task_id=small-1', content_type='multipart/form-data', data={
+        'file': (io.BytesIO(data), 'small.pdf'),
+        'source_language': 'en',
+        'target_language': 'es',
+    })
+
+    assert response.status_code == 302
+    assert '/download/translated_' in response.headers['Location']
+    assert processor.translator.paragraphs() == ['Small document']
+    # The rendered PDF is served from memory until the background write has finished
+    translated_filename = response.headers['Location'].rsplit('/', 1)[1]
+    persisted = store.pending_data('downloads', translated_filename) is not None \
+        or store.find('downloads', translated_filename) is not None
+    assert persisted
+    assert 'uploads' not in written
+    assert not any(files for _, _, files in os.walk(store.directories['uploads']))
+
+
+def test_larger_upload_is_saved_to_disk(monkeypatch, database, store, processor):
+    import routes
+    monkeypatch.setattr(routes, 'artifact_store', store)
+    monkeypatch.setattr(routes, 'make_processor', lambda job: processor)
+    monkeypatch.setitem(app.config, 'SMALL_UPLOAD_BYTES', 100)
+    saved = []
+    original_save = store.save
+    monkeypatch.setattr(store, 'save', lambda *args: saved.append(args[1]) or original_save(*args))
+
+    response = app.test_client().post('/upload', content_type='multipart/form-data', data={
+        'file': (io.BytesIO(source_pdf(['Larger document'])), 'large.pdf'),
+        'source_language': 'en',
+        'target_language': 'es',
+    })
+    assert response.status_code == 302
+    assert len(saved) == 1
+    # The job removes its upload once the translation is written
+    assert store.find('uploads', saved[0]) is None
+
+
+@pytest.mark.parametrize('error', [RuntimeError('backend down'), JobCancelled('lease_lost', stage='translating')])
+def test_profiling_slot_is_released_when_the_job_stops(monkeypatch, tmp_path, store, error):
+    profiler = JobProfiler(output_dir=str(tmp_path / 'profiles'), enabled=True, token='secret')
+
+    def failing(job, **kwargs):
+        raise error
+
+    monkeypatch.setattr(jobs, 'run_translation_job', failing)
+    job = make_job(store, ['Page'])
+    job.profile = profiler.start(job.task_id, 'secret')
+
+    with pytest.raises(type(error)):
+        jobs.job_runner.submit(job).result(timeout=5)
+    assert job.profile.finished
+    assert (tmp_path / 'profiles' / f"{job.task_id}.txt").exists()
+    # The next requested job gets the slot
+    following = profiler.start('next', 'secret')
+    assert following is not None
+    following.finish()
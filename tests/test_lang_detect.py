@@ -0,0 +1,43 @@
+import pytest
+
+from lang_detect import detect_language, detect_pages, summarize_detections
+
+
+@pytest.mark.parametrize('text, language', [
+    ("Please send the signed contract back to our office before the end of next week.", 'en'),
+    ("Por favor, envíe el contrato firmado a nuestra oficina antes del final de la próxima semana.", 'es'),
+    ("Veuillez renvoyer le contrat signé à notre bureau avant la fin de la semaine prochaine.", 'fr'),
+    ("Bitte senden Sie den unterschriebenen Vertrag bis Ende nächster Woche an unser Büro zurück.", 'de'),
+    ("Пожалуйста, отправьте подписанный договор в наш офис до конца следующей недели.", 'ru'),
+    ("कृपया हस्ताक्षरित अनुबंध अगले सप्ताह के अंत तक हमारे कार्यालय को वापस भेजें।", 'hi'),
+    ("దయచేసి సంతకం చేసిన ఒప్పందాన్ని వచ్చే వారం చివరిలోగా మా కార్యాలయానికి పంపండి.", 'te'),
+    ("署名済みの契約書を来週末までに当社の事務所へご返送ください。よろしくお願いします。", 'ja'),
+    ("请在下周末之前将签好的合同寄回我们的办公室，谢谢您的配合与支持。", 'zh'),
+])
+def test_detects_language(text, language):
+    detected, confidence = detect_language(text)
+    assert detected == language
+    assert 0 < confidence <= 1
+
+
+def test_short_text_is_undetected():
+    assert detect_language("OK 42") == (None, 0.0)
+
+
+def test_candidates_restrict_the_result():
+    text = "Пожалуйста, отправьте подписанный договор в наш офис до конца недели."
+    assert detect_language(text, candidates={'en', 'hi'}) == (None, 0.0)
+
+
+def test_undetected_pages_follow_the_page_before():
+    pages = ["The quarterly report describes the results of the work during the year. " * 3,
+             "12",
+             "Der Bericht beschreibt die Ergebnisse der Arbeit und die Änderungen des Jahres. " * 2]
+    language, confidence, page_languages = summarize_detections(detect_pages(pages), pages)
+    assert language == 'en'
+    assert confidence > 0
+    assert page_languages == ['en', 'en', 'de']
+
+
+def test_nothing_detected():
+    assert summarize_detections(detect_pages(["1", "2"]), ["1", "2"]) == (None, 0.0, [None, None])
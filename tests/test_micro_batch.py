@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from micro_batch import MicroBatcher
+
+
+class Skipped(Exception):
+    pass
+
+
+class FakeBackend:
+    """Translates by upper-casing; records every request it receives"""
+
+    def __init__(self, drop_markers=False, fail_packed=False):
+        self.requests = []
+        self.drop_markers = drop_markers
+        self.fail_packed = fail_packed
+
+    async def send(self, text, source_lang, target_lang):
+        self.requests.append(text)
+        packed = '[[' in text
+        if packed and self.fail_packed:
+            raise RuntimeError('backend error')
+        if packed and self.drop_markers:
+            text = text.replace('[[1]]', '')
+        return f"  {text.upper()}\n"
+
+
+def translate_all(batcher, texts, should_stop=None):
+    async def run():
+        return await asyncio.gather(*(batcher.translate(text, 'en', 'hi', should_stop=should_stop)
+                                      for text in texts), return_exceptions=True)
+    return asyncio.run(run())
+
+
+def test_concurrent_chunks_share_one_request():
+    backend = FakeBackend()
+    batcher = MicroBatcher(backend.send, window=0.01)
+    assert translate_all(batcher, ['one', 'two', 'three']) == ['ONE', 'TWO', 'THREE']
+    assert len(backend.requests) == 1
+    assert batcher.stats()['requests_saved'] == 2
+
+
+def test_batch_is_sent_early_at_max_chars():
+    backend = FakeBackend()
+    batcher = MicroBatcher(backend.send, window=0.01, max_chars=60)
+    assert translate_all(batcher, ['a' * 15, 'b' * 15, 'c' * 15]) == ['A' * 15, 'B' * 15, 'C' * 15]
+    assert len(backend.requests) == 2
+
+
+def test_lost_markers_fall_back_to_one_request_per_chunk():
+    backend = FakeBackend(drop_markers=True)
+    batcher = MicroBatcher(backend.send, window=0.01)
+    assert translate_all(batcher, ['one', 'two']) == ['ONE', 'TWO']
+    assert len(backend.requests) == 3
+    assert batcher.stats()['fallbacks'] == 1
+
+
+def test_failed_packed_request_falls_back():
+    backend = FakeBackend(fail_packed=True)
+    batcher = MicroBatcher(backend.send, window=0.01)
+    assert translate_all(batcher, ['one', 'two']) == ['ONE', 'TWO']
+
+
+def test_single_and_packed_results_are_normalised_alike():
+    backend = FakeBackend()
+    alone = translate_all(MicroBatcher(backend.send, window=0.01), ['one'])
+    packed = translate_all(MicroBatcher(backend.send, window=0.01), ['one', 'two'])
+    assert alone[0] == packed[0] == 'ONE'
+
+
+def test_stopped_chunks_are_not_sent():
+    backend = FakeBackend()
+    batcher = MicroBatcher(backend.send, window=0.01, skip_error=Skipped)
+    results = translate_all(batcher, ['one', 'two'], should_stop=lambda: True)
+    assert all(isinstance(result, Skipped) for result in results)
+    assert backend.requests == []
+    assert batcher.stats()['skipped'] == 2
+
+
+@pytest.mark.parametrize('translated, count, expected', [
+    ('a\n[[1]]\nb\n[[2]]\nc', 3, ['a', 'b', 'c']),
+    ('a [[ 1 ]] b', 2, ['a', 'b']),
+    ('a\n[[2]]\nb', 2, None),
+    ('a\n[[1]]\nb\n[[1]]\nc', 3, None),
+    ('a b', 2, None),
+])
+def test_split(translated, count, expected):
+    assert MicroBatcher.split(translated, count) == expected
+
+
+def test_marker_like_text_is_not_batched():
+    batcher = MicroBatcher(FakeBackend().send, max_chars=100)
+    assert batcher.accepts('plain text')
+    assert not batcher.accepts('see [[3]] above')
+    assert not batcher.accepts('x' * 51)
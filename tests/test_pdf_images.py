@@ -0,0 +1,118 @@
+import io
+
+import pytest
+
+fitz = pytest.importorskip('fitz')
+pytest.importorskip('reportlab')
+
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+from pdf_images import IMAGE_MARKER, ImagePlaceholder, copy_object, embed_images, image_marker, page_text_with_images
+
+
+def pixmap(width=40, height=30):
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, width, height), False)
+    pix.clear_with(90)
+    return pix
+
+
+def document_with_image():
+    """One page: a heading, an 80x60pt image below it, then a paragraph under the image"""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Heading above")
+    page.insert_image(fitz.Rect(72, 100, 152, 160), pixmap=pixmap())
+    page.insert_text((72, 200), "Text below")
+    return doc
+
+
+def test_marker_is_placed_before_the_text_below_the_image():
+    doc = document_with_image()
+    page = doc[0]
+    xref = page.get_images()[0][0]
+    text = page_text_with_images(page)
+    heading, marker, below = [part.strip() for part in text.split('\n\n') if part.strip()]
+    assert heading == 'Heading above'
+    assert marker == image_marker(xref, 80, 60)
+    assert IMAGE_MARKER.fullmatch(marker).groups() == (str(xref), '80', '60')
+    assert below == 'Text below'
+
+
+def test_pages_without_images_are_left_to_plain_extraction():
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Only text")
+    assert page_text_with_images(doc[0]) is None
+
+
+def test_small_images_are_ignored():
+    doc = document_with_image()
+    assert page_text_with_images(doc[0], min_size=100) is None
+
+
+def test_placeholder_scales_to_the_frame_and_records_its_position():
+    placements = []
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, leftMargin=72, rightMargin=72, topMargin=72, bottomMargin=72)
+    placeholder = ImagePlaceholder(7, 1000, 500, doc.width, doc.height, placements)
+    assert placeholder.width == pytest.approx(doc.width)
+    assert placeholder.height == pytest.approx(doc.width / 2)
+    doc.build([Paragraph("Before", getSampleStyleSheet()['Normal']), placeholder])
+
+    [(page_index, x, y, width, height, xref)] = placements
+    # The frame pads its content by 6pt inside the margin
+    assert (page_index, x, xref) == (0, 78, 7)
+    assert (width, height) == (placeholder.width, placeholder.height)
+    assert 72 <= y < doc.pagesize[1] - 72 - height
+
+
+def test_copy_leaves_strings_alone_and_drops_unknown_references():
+    source = fitz.open()
+    source.new_page()
+    referenced = source.get_new_xref()
+    source.update_object(referenced, '<< /Type /Referenced >>')
+    xref = source.get_new_xref()
+    source.update_object(xref, f'<< /Note (see {referenced} 0 R) /Hex <4142> /Ref {referenced} 0 R '
+                               f'/List [{referenced} 0 R 5] /Missing 9999 0 R >>')
+
+    target = fitz.open()
+    for _ in range(3):
+        target.new_page()
+    copied = {}
+    new_xref = copy_object(source, target, xref, copied)
+
+    new_referenced = copied[referenced]
+    assert new_referenced != referenced
+    assert target.xref_get_key(new_xref, 'Note') == ('string', f'see {referenced} 0 R')
+    assert target.xref_get_key(new_xref, 'Ref') == ('xref', f'{new_referenced} 0 R')
+    assert target.xref_get_key(new_xref, 'List') == ('array', f'[{new_referenced} 0 R 5]')
+    assert target.xref_get_key(new_xref, 'Missing')[0] == 'null'
+    assert target.xref_get_key(new_referenced, 'Type') == ('name', '/Referenced')
+
+
+def test_embedded_image_keeps_its_encoded_stream():
+    source = document_with_image()
+    xref = source[0].get_images()[0][0]
+    source_bytes = source.tobytes()
+
+    rendered = fitz.open()
+    rendered.new_page()
+    output = io.BytesIO(rendered.tobytes())
+    placements = [(0, 72, 500, 80, 60, xref), (0, 72, 300, 40, 30, xref)]
+    assert embed_images(source_bytes, output, placements) >= 1
+
+    result = fitz.open(stream=output.getvalue(), filetype='pdf')
+    [image_xref] = {image[0] for image in result[0].get_images()}  # placed twice, copied once
+    assert result.xref_stream_raw(image_xref) == source.xref_stream_raw(xref)
+    rects = sorted(result[0].get_image_rects(image_xref), key=lambda rect: rect.y0)
+    # ReportLab's bottom-left y is turned into PyMuPDF's top-left y
+    height = result[0].rect.height
+    assert [(rect.x0, rect.y0, rect.width, rect.height) for rect in rects] == [
+        pytest.approx((72, height - 500 - 60, 80, 60)), pytest.approx((72, height - 300 - 30, 40, 30)),
+    ]
+
+
+def test_nothing_is_embedded_without_placements():
+    output = io.BytesIO(b'untouched')
+    assert embed_images(b'', output, []) == 0
+    assert output.getvalue() == b'untouched'
@@ -0,0 +1,175 @@
+import io
+import sys
+import threading
+import types
+
+import pytest
+
+from pdf_processor import CompactionStats, PDFProcessor
+
+
+class FakeDocument:
+    """Stands in for a fitz document; 'rewrites' to output of a fixed size"""
+
+    def __init__(self, output_size, objstms=True):
+        self.output_size = output_size
+        self.objstms = objstms
+        self.calls = []
+        self.closed = False
+
+    def _output(self, options):
+        self.calls.append(dict(options))
+        if 'use_objstms' in options and not self.objstms:
+            raise TypeError("save() got an unexpected keyword argument 'use_objstms'")
+        return b'c' * self.output_size
+
+    def tobytes(self, **options):
+        return self._output(options)
+
+    def save(self, path, **options):
+        data = self._output(options)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    # No googletrans client and no font download; translation tests install their own translator
+    monkeypatch.setenv('TRANSLATE_BACKEND', 'stub')
+    monkeypatch.setattr(PDFProcessor, '_fonts_ready', True)
+    monkeypatch.setattr(PDFProcessor, 'compaction', CompactionStats())
+    return PDFProcessor()
+
+
+@pytest.fixture
+def fake_fitz(monkeypatch):
+    """Installs a fitz module whose open() returns the document set on it"""
+    module = types.SimpleNamespace(document=None)
+    module.open = lambda *args, **kwargs: module.document
+    monkeypatch.setitem(sys.modules, 'fitz', module)
+    return module
+
+
+def test_smaller_result_replaces_the_buffer(processor, fake_fitz):
+    fake_fitz.document = FakeDocument(output_size=40)
+    buffer = io.BytesIO(b'o' * 100)
+    report = processor.compact_pdf(buffer)
+    assert buffer.getvalue() == b'c' * 40
+    assert report == {'bytes_before': 100, 'bytes_after': 40, 'saved_percent': 60.0}
+    assert fake_fitz.document.closed
+    assert PDFProcessor.compaction.stats() == {'jobs': 1, 'bytes_before': 100, 'bytes_after': 40}
+
+
+def test_larger_result_is_discarded(processor, fake_fitz):
+    fake_fitz.document = FakeDocument(output_size=150)
+    buffer = io.BytesIO(b'o' * 100)
+    report = processor.compact_pdf(buffer)
+    assert buffer.getvalue() == b'o' * 100
+    assert report['bytes_after'] == 100
+    assert report['saved_percent'] == 0.0
+
+
+@pytest.mark.parametrize('output_size, expected', [(40, b'c' * 40), (150, b'o' * 100)])
+def test_file_is_replaced_only_when_smaller(processor, fake_fitz, tmp_path, output_size, expected):
+    fake_fitz.document = FakeDocument(output_size=output_size)
+    path = tmp_path / 'out.pdf'
+    path.write_bytes(b'o' * 100)
+    processor.compact_pdf(str(path))
+    assert path.read_bytes() == expected
+    assert [p.name for p in tmp_path.iterdir()] == ['out.pdf']
+
+
+def test_falls_back_without_object_streams(processor, fake_fitz):
+    fake_fitz.document = FakeDocument(output_size=40, objstms=False)
+    buffer = io.BytesIO(b'o' * 100)
+    processor.compact_pdf(buffer)
+    assert buffer.getvalue() == b'c' * 40
+    first, second = fake_fitz.document.calls
+    assert first['use_objstms'] == 1
+    assert 'use_objstms' not in second
+    assert second['garbage'] == 4
+
+
+def test_failed_compaction_keeps_the_original(processor, fake_fitz):
+    def broken(*args, **kwargs):
+        raise RuntimeError('broken PDF')
+
+    fake_fitz.open = broken
+    buffer = io.BytesIO(b'o' * 100)
+    assert processor.compact_pdf(buffer)['bytes_after'] == 100
+    assert buffer.getvalue() == b'o' * 100
+
+
+def test_compaction_stats_are_thread_safe():
+    stats = CompactionStats()
+
+    def record():
+        for _ in range(2000):
+            stats.record(3, 1)
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stats.stats() == {'jobs': 16000, 'bytes_before': 48000, 'bytes_after': 16000}
+
+
+class StubTranslator:
+    """googletrans-style translator: prefixes every paragraph, optionally merging packed ones"""
+
+    def __init__(self, merge_paragraphs=False):
+        self.merge_paragraphs = merge_paragraphs
+        self.requests = []
+
+    def translate(self, text, src, dest):
+        self.requests.append(text)
+        paragraphs = text.split('\n\n')
+        separator = '\n' if self.merge_paragraphs else '\n\n'
+        return types.SimpleNamespace(text=separator.join(f"{dest}:{p}" for p in paragraphs))
+
+
+@pytest.fixture
+def translating(processor):
+    processor.translator = StubTranslator()
+    processor.keep_images = False
+    return processor
+
+
+def test_incremental_translation_reuses_unchanged_paragraphs(translating):
+    first, segments, report = translating.translate_incremental("One\n\nTwo", 'en', 'es')
+    assert first == "es:One\n\nes:Two"
+    assert report['reused_paragraphs'] == 0
+
+    translating.translator.requests.clear()
+    # Whitespace changes keep a paragraph's fingerprint
+    second, _, report = translating.translate_incremental("One\n\nTwo  \n\nThree", 'en', 'es',
+                                                          previous_segments=segments)
+    assert second == "es:One\n\nes:Two\n\nes:Three"
+    assert translating.translator.requests == ["Three"]
+    assert (report['paragraphs'], report['reused_paragraphs'], report['translated_paragraphs']) == (3, 2, 1)
+
+
+def test_failed_paragraphs_are_not_kept_for_reuse(translating):
+    def unavailable(text, src, dest):
+        raise RuntimeError('backend down')
+
+    translating.translator.translate = unavailable
+    translated, segments, _ = translating.translate_incremental("One", 'en', 'es')
+    assert translated == PDFProcessor.TRANSLATION_ERROR
+    assert segments == {}
+
+
+def test_batch_that_does_not_split_is_retried_per_paragraph(translating):
+    translating.translator.merge_paragraphs = True
+    results = translating.translate_paragraphs(["One", "Two", "Three"], 'en', 'es')
+    assert results == ["es:One", "es:Two", "es:Three"]
+    assert translating.translator.requests == ["One\n\nTwo\n\nThree", "One", "Two", "Three"]
+
+
+def test_translate_text_uses_the_paragraph_pipeline(translating):
+    assert translating.translate_text("One\n\n\n\nTwo 12", 'en', 'es') == "es:One\n\nes:Two"
+    assert translating.translator.requests == ["One\n\nTwo"]
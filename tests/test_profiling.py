@@ -0,0 +1,79 @@
+import os
+import tracemalloc
+
+import pytest
+
+from profiling import JobProfiler
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    return JobProfiler(output_dir=str(tmp_path), enabled=True, token='secret', sample_rate=3)
+
+
+def test_nothing_is_profiled_when_disabled(tmp_path):
+    profiler = JobProfiler(output_dir=str(tmp_path), enabled=False, token='secret', sample_rate=1)
+    assert profiler.start('job', 'secret') is None
+    assert profiler.stats()['profiled'] == 0
+
+
+def test_operator_token_requests_a_profile(profiler):
+    assert profiler.start('wrong', 'not-the-token') is None
+    profile = profiler.start('job', 'secret')
+    try:
+        assert profile.reason == 'requested'
+        assert profile.trace_memory or tracemalloc.is_tracing()
+    finally:
+        profile.finish()
+
+
+def test_every_nth_job_is_sampled(profiler):
+    picked = []
+    for index in range(1, 10):
+        profile = profiler.start(f"job-{index}")
+        if profile is not None:
+            picked.append((index, profile.reason, profile.trace_memory))
+            profile.finish()
+    assert picked == [(3, 'sampled', False), (6, 'sampled', False), (9, 'sampled', False)]
+
+
+def test_one_job_is_profiled_at_a_time(profiler):
+    first = profiler.start('first', 'secret')
+    assert profiler.start('second', 'secret') is None
+    assert profiler.stats()['skipped_busy'] == 1
+
+    first.finish()
+    first.finish()  # a second finish does not release the slot twice
+    second = profiler.start('second', 'secret')
+    assert second is not None
+    assert profiler.start('third', 'secret') is None
+    second.finish()
+
+
+def test_reports_are_written(profiler, tmp_path):
+    profile = profiler.start('job-1', 'secret')
+
+    def work():
+        return sorted(str(n) for n in range(2000))
+
+    with profile.segment():
+        work()
+    profile.finish()
+
+    assert os.path.getsize(tmp_path / 'job-1.pstats') > 0
+    summary = (tmp_path / 'job-1.txt').read_text()
+    assert summary.startswith('job job-1 (requested), wall time')
+    assert 'work' in summary
+    if profile.trace_memory:
+        assert (tmp_path / 'job-1.alloc.txt').read_text().startswith('job job-1: current')
+    assert not tracemalloc.is_tracing() or not profile.trace_memory
+
+
+def test_slot_is_released_when_reports_cannot_be_written(tmp_path):
+    blocked = tmp_path / 'file'
+    blocked.write_text('')
+    profiler = JobProfiler(output_dir=str(blocked / 'profiles'), enabled=True, token='secret')
+    profiler.start('job-1', 'secret').finish()
+    profile = profiler.start('job-2', 'secret')
+    assert profile is not None
+    profile.finish()
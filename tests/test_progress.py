@@ -0,0 +1,91 @@
+import threading
+
+from progress import ProgressTracker, progress_percent
+
+
+def test_stream_delivers_events_and_ends_on_terminal_event():
+    tracker = ProgressTracker()
+    tracker.publish('t1', 'extracted', pages=1, chars=10)
+    tracker.publish('t1', 'done', download_url='/download/x')
+    disconnected = []
+    frames = list(tracker.stream('t1', heartbeat=0.01, on_disconnect=disconnected.append))
+    assert frames[0].startswith('retry:')
+    assert any('event: extracted' in frame for frame in frames)
+    assert 'event: done' in frames[-1]
+    assert disconnected == []
+    assert tracker.listeners('t1') == 0
+
+
+def test_stream_resumes_after_last_event_id():
+    tracker = ProgressTracker()
+    tracker.publish('t1', 'extracted', pages=1, chars=10)
+    tracker.publish('t1', 'done')
+    frames = list(tracker.stream('t1', last_event_id=1, heartbeat=0.01))
+    assert not any('event: extracted' in frame for frame in frames)
+
+
+def test_stream_window_ends_without_counting_as_disconnect():
+    tracker = ProgressTracker()
+    tracker.publish('t1', 'queued')
+    disconnected = []
+    frames = list(tracker.stream('t1', heartbeat=0.01, max_duration=0.05, on_disconnect=disconnected.append))
+    assert 'event: queued' in ''.join(frames)
+    assert disconnected == []
+
+
+def test_closed_stream_reports_disconnect():
+    tracker = ProgressTracker()
+    tracker.publish('t1', 'queued')
+    disconnected = []
+    stream = tracker.stream('t1', heartbeat=0.01, on_disconnect=disconnected.append)
+    next(stream)
+    next(stream)
+    assert tracker.listeners('t1') == 1
+    stream.close()
+    assert disconnected == ['t1']
+    assert tracker.listeners('t1') == 0
+
+
+def test_publish_wakes_waiting_stream():
+    tracker = ProgressTracker()
+    stream = tracker.stream('t1', heartbeat=5)
+    next(stream)
+    threading.Timer(0.05, tracker.publish, args=('t1', 'done')).start()
+    assert 'event: done' in next(stream)
+
+
+def test_progress_percent():
+    assert progress_percent('translating', {'chunk': 5, 'total': 10}) == 47
+    assert progress_percent('done', {}) == 100
+    assert progress_percent('detected', {}) is None
+
+
+def test_prune_keeps_channels_with_open_streams():
+    tracker = ProgressTracker(ttl=0)
+    tracker.publish('watched', 'queued')
+    tracker.publish('abandoned', 'queued')
+    stream = tracker.stream('watched', heartbeat=0.01)
+    next(stream)
+    # Creating a channel prunes every idle one, but not the one still being streamed
+    tracker.publish('new', 'queued')
+    assert tracker.snapshot('abandoned')['status'] == 'unknown'
+    tracker.publish('watched', 'done')
+    assert 'event: done' in ''.join(stream)
+    assert tracker.listeners('watched') == 0
+
+
+def test_subscriber_counts_survive_concurrent_streams():
+    tracker = ProgressTracker()
+    tracker.publish('t1', 'done')
+
+    def read():
+        for _ in range(200):
+            list(tracker.stream('t1', heartbeat=0.01))
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tracker.listeners('t1') == 0
+    assert tracker.stats()['subscribers'] == 0
@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from scheduler import FairShareScheduler
+
+
+def run_order(scheduler, submissions):
+    """Queue (session, cost, label) items behind a blocked worker, then return the order they ran in"""
+    gate = threading.Event()
+    order = []
+    blocker = scheduler.submit('blocker', 0, gate.wait)
+    futures = [scheduler.submit(session_id, cost, order.append, label) for session_id, cost, label in submissions]
+    gate.set()
+    blocker.result(timeout=5)
+    for future in futures:
+        future.result(timeout=5)
+    return order
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = FairShareScheduler(workers=1, aging_rate=0.0)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_small_jobs_run_before_large_ones(scheduler):
+    order = run_order(scheduler, [('a', 500, 'large'), ('b', 5, 'small'), ('c', 50, 'medium')])
+    assert order == ['small', 'medium', 'large']
+
+
+def test_busy_session_falls_behind_others(scheduler):
+    order = run_order(scheduler, [('a', 10, 'a1'), ('a', 10, 'a2'), ('a', 10, 'a3'), ('b', 10, 'b1')])
+    assert order.index('b1') < order.index('a3')
+    assert order[0] == 'a1'
+
+
+def test_aging_lets_large_jobs_through():
+    scheduler = FairShareScheduler(workers=1, aging_rate=1e6)
+    try:
+        gate = threading.Event()
+        order = []
+        blocker = scheduler.submit('blocker', 0, gate.wait)
+        large = scheduler.submit('a', 1000, order.append, 'large')
+        threading.Event().wait(0.05)
+        small = scheduler.submit('b', 1, order.append, 'small')
+        gate.set()
+        for future in (blocker, large, small):
+            future.result(timeout=5)
+        assert order == ['large', 'small']
+    finally:
+        scheduler.shutdown()
+
+
+def test_exceptions_reach_the_future(scheduler):
+    future = scheduler.submit('a', 1, lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        future.result(timeout=5)
+
+
+def test_stats_count_dispatches_per_class(scheduler):
+    run_order(scheduler, [('a', 5, 'x'), ('b', 500, 'y')])
+    classes = scheduler.stats()['classes']
+    assert classes['small']['dispatched'] == 2  # includes the blocker
+    assert classes['large']['dispatched'] == 1
+    assert scheduler.stats()['queued'] == 0
+
+
+def test_submit_after_shutdown_fails(scheduler):
+    scheduler.shutdown()
+    with pytest.raises(RuntimeError):
+        scheduler.submit('a', 1, print)
@@ -0,0 +1,85 @@
+import random
+import re
+
+import pytest
+
+from text_rules import (KeywordSet, LanguageRules, RulesEngine, TELUGU_POETIC_WORDS, clean_for_translation,
+                        default_engine, trie_pattern)
+
+
+# The clean-up and formatting code before text_rules.py, kept as the reference behaviour
+def baseline_clean(text):
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+    text = re.sub(r' +', ' ', text)
+    text = re.sub(r'\b\d+\s*$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^Page \d+.*$', '', text, flags=re.MULTILINE)
+    return text.strip()
+
+
+def baseline_format(text):
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    if any(ord(char) in range(0x0C00, 0x0C7F) for char in text):
+        lines = [line.strip() for line in text.split('\n')]
+        return '<br/>'.join(f"<i>{line}</i>" if any(word in line for word in TELUGU_POETIC_WORDS) else line
+                            for line in lines if line)
+    return text.replace('\n', '<br/>')
+
+
+TOKENS = ['word', 'Page 3 of 9', 'Page 12', '42', ' ', '  ', '\t', '\n', '\n\n', '\n \n', 'x1', 'a 7', '.',
+          'Page', ' 5', '&', '<b>', 'మనసు', 'ఒక', 'विजय', 'गाँव']
+
+
+def fuzz_inputs(count=5000, seed=7):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield ''.join(rng.choice(TOKENS) for _ in range(rng.randint(1, 14)))
+
+
+def test_cleanup_matches_baseline():
+    for text in fuzz_inputs():
+        assert clean_for_translation(text) == baseline_clean(text), repr(text)
+
+
+# Old and new output pinned on the same inputs, including the line breaks a trailing number takes
+@pytest.mark.parametrize('text, expected', [
+    ("Total 12\nNext paragraph", "Total \nNext paragraph"),
+    ("Intro 3\n\nBody", "Intro \nBody"),
+    ("Intro 3 \n \n\nBody", "Intro \nBody"),
+    ("Page 3 of 10\nBody", "Body"),
+    ("Page 12\nBody", "Page \nBody"),
+    ("a\n\n\n\nb   c", "a\n\nb c"),
+])
+def test_cleanup_examples(text, expected):
+    assert baseline_clean(text) == expected
+    assert clean_for_translation(text) == expected
+
+
+def test_formatting_matches_baseline():
+    for text in fuzz_inputs(seed=11):
+        assert default_engine.format_for_pdf(text) == baseline_format(text), repr(text)
+
+
+def test_hindi_keeps_plain_layout():
+    assert default_engine.rules_for("गाँव").name == 'hi'
+    text = "विजय का दिन\n\nनया गाँव & <खेत>"
+    assert default_engine.format_for_pdf(text) == "विजय का दिन<br/><br/>नया गाँव &amp; &lt;खेत&gt;"
+
+
+def test_telugu_verse_lines_are_emphasised():
+    assert default_engine.format_for_pdf("మనసు పాట\n\nఒక కథ") == "<i>మనసు పాట</i><br/>ఒక కథ"
+    # Telugu rules come first, so mixed text keeps the Telugu layout as before
+    assert default_engine.format_for_pdf("మనసు\n\nगाँव") == "<i>మనసు</i><br/>गाँव"
+
+
+def test_rules_are_an_extension_point():
+    engine = RulesEngine([LanguageRules('xx', [(0x0900, 0x097F)], ('विजय',), emphasis_tag='b')])
+    assert engine.format_for_pdf("विजय\nगाँव") == "<b>विजय</b><br/>गाँव"
+    assert engine.format_for_pdf("plain\ntext") == "plain<br/>text"
+
+
+def test_keyword_trie():
+    words = ('he', 'her', 'hers', 'his', 'she')
+    assert re.fullmatch(trie_pattern(words), 'hers')
+    keywords = KeywordSet(words)
+    assert keywords.find_all('ushers his') == [(1, 'she'), (7, 'his')]
+    assert not KeywordSet(()).search('anything')
@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+
+from tracing import JobTrace, traced
+
+
+def make_trace(spans):
+    """A trace from (id, name, start_ms, duration_ms, parent) tuples"""
+    return JobTrace(started_at=0, spans=[
+        dict({'id': span_id, 'name': name, 'start_ms': start, 'duration_ms': duration},
+             **({'parent': parent} if parent is not None else {}))
+        for span_id, name, start, duration, parent in spans
+    ])
+
+
+def test_nested_spans_record_their_parent():
+    trace = JobTrace()
+    with trace.span('translate') as attrs:
+        with trace.span('chunk', index=0):
+            pass
+        attrs['chunks'] = 1
+    chunk, translate = trace.spans
+    assert chunk['parent'] == translate['id']
+    assert chunk['attrs'] == {'index': 0}
+    assert translate['attrs'] == {'chunks': 1}
+    assert 'parent' not in translate
+
+
+def test_span_records_errors():
+    trace = JobTrace()
+    with pytest.raises(ValueError):
+        with trace.span('extract'):
+            raise ValueError()
+    assert trace.spans[0]['attrs'] == {'error': 'ValueError'}
+
+
+def test_spans_on_other_threads_do_not_nest():
+    trace = JobTrace()
+    seen = []
+    with trace.span('outer'):
+        worker = threading.Thread(target=lambda: seen.append(trace.current()))
+        worker.start()
+        worker.join()
+        assert trace.current() is not None
+    assert seen == [None]
+    assert trace.current() is None
+
+
+def test_stage_ms_sums_top_level_spans():
+    trace = make_trace([
+        (1, 'extract', 0, 10, None),
+        (2, 'translate', 10, 50, None),
+        (3, 'chunk', 10, 40, 2),
+        (4, 'translate', 60, 5, None),
+    ])
+    assert trace.stage_ms() == {'extract': 10, 'translate': 55}
+    assert trace.total_ms() == 65
+
+
+def test_critical_path_follows_the_slowest_parallel_chunk():
+    trace = make_trace([
+        (1, 'upload_save', 0, 5, None),
+        (2, 'extract', 5, 15, None),
+        (3, 'translate', 20, 100, None),
+        (4, 'chunk', 20, 30, 3),
+        (5, 'chunk', 20, 95, 3),
+        (6, 'chunk', 25, 40, 3),
+        (7, 'render', 120, 10, None),
+    ])
+    path = trace.critical_path()
+    assert [(step['name'], step['depth']) for step in path] == [
+        ('upload_save', 0), ('extract', 0), ('translate', 0), ('chunk', 1), ('render', 0),
+    ]
+    assert path[3]['duration_ms'] == 95
+
+
+def test_critical_path_leaves_out_short_nested_spans():
+    trace = make_trace([
+        (1, 'extract', 0, 1000, None),
+        (2, 'page', 0, 5, 1),
+        (3, 'page', 5, 995, 1),
+    ])
+    assert [step['duration_ms'] for step in trace.critical_path(min_fraction=0.01)] == [1000, 995]
+
+
+def test_span_limit_keeps_top_level_stages():
+    trace = JobTrace()
+    trace.MAX_SPANS = 3
+    with trace.span('translate'):
+        for _ in range(5):
+            with trace.span('chunk'):
+                pass
+    with trace.span('render'):
+        pass
+    names = [span['name'] for span in trace.spans]
+    assert names.count('chunk') == 3
+    assert 'translate' in names and 'render' in names
+    assert trace.dropped == 2
+
+
+def test_round_trip_continues_ids():
+    trace = JobTrace()
+    with trace.span('extract'):
+        pass
+    restored = JobTrace.from_dict(trace.to_dict())
+    assert restored.spans == trace.spans
+    with restored.span('translate'):
+        pass
+    assert restored.spans[-1]['id'] == trace.spans[0]['id'] + 1
+
+
+def test_traced_without_a_trace():
+    with traced(None, 'extract', pages=3) as attrs:
+        attrs['chars'] = 10
+    assert attrs == {'pages': 3, 'chars': 10}
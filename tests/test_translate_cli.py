@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+import translate_cli
+from translate_cli import collect_inputs, input_root, output_path_for
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+
+
+def test_recursive_inputs_keep_their_directories(tmp_path):
+    touch(tmp_path / 'in' / 'a' / 'report.pdf')
+    touch(tmp_path / 'in' / 'b' / 'report.pdf')
+    inputs = collect_inputs([str(tmp_path / 'in')], recursive=True)
+    outputs = [output_path_for(relative, 'out', 'hi') for _, relative in inputs]
+    assert outputs == [os.path.join('out', 'a', 'report_hi.pdf'), os.path.join('out', 'b', 'report_hi.pdf')]
+
+
+def test_glob_inputs_are_relative_to_the_pattern_prefix(tmp_path):
+    touch(tmp_path / 'archive' / '2023' / 'x.pdf')
+    inputs = collect_inputs([str(tmp_path / 'archive' / '**' / '*.pdf')], recursive=False)
+    assert [relative for _, relative in inputs] == [os.path.join('2023', 'x.pdf')]
+
+
+def test_input_root():
+    assert input_root('x.pdf') == os.curdir
+    assert input_root(os.path.join('docs', 'x.pdf')) == 'docs'
+    assert input_root(os.path.join('docs', '*', '*.pdf')) == 'docs'
+    assert input_root('*.pdf') == os.curdir
+
+
+def run_main(monkeypatch, *argv):
+    monkeypatch.setattr('sys.argv', ['translate_cli.py', *argv])
+    return translate_cli.main()
+
+
+def test_colliding_outputs_are_refused(tmp_path, monkeypatch):
+    touch(tmp_path / 'a' / 'report.pdf')
+    touch(tmp_path / 'b' / 'report.pdf')
+    with pytest.raises(SystemExit) as exit_info:
+        run_main(monkeypatch, str(tmp_path / 'a'), str(tmp_path / 'b'), '-s', 'en', '-t', 'hi',
+                 '-o', str(tmp_path / 'out'))
+    assert exit_info.value.code == 2
+    assert not (tmp_path / 'out').exists()
+
+
+@pytest.mark.parametrize('source, target', [('xx', 'hi'), ('en', 'auto'), ('en', 'klingon')])
+def test_unsupported_languages_are_rejected(tmp_path, monkeypatch, source, target):
+    with pytest.raises(SystemExit) as exit_info:
+        run_main(monkeypatch, str(tmp_path), '-s', source, '-t', target)
+    assert exit_info.value.code == 2
+
+
+@pytest.mark.parametrize('workers', ['0', '-2', 'many'])
+def test_invalid_worker_counts_are_rejected(tmp_path, monkeypatch, capsys, workers):
+    with pytest.raises(SystemExit) as exit_info:
+        run_main(monkeypatch, str(tmp_path), '-s', 'en', '-t', 'hi', '--workers', workers)
+    assert exit_info.value.code == 2
+    assert 'argument -w/--workers' in capsys.readouterr().err
@@ -0,0 +1,78 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip('httpx')
+
+import translation_client
+from stub_backend import start_stub_backend
+from translation_client import AsyncTranslationClient
+
+
+@pytest.fixture
+def backend():
+    server = start_stub_backend(latency=0.05)
+    yield server
+    server.shutdown()
+
+
+def test_calls_share_one_keep_alive_connection(backend):
+    client = AsyncTranslationClient(backend.url)
+    try:
+        for word in ['one', 'two', 'three', 'four']:
+            assert client.run(client.translate(word, 'en', 'hi')) == f'[hi] {word}'
+        stats = backend.stats.snapshot()
+        assert (stats['requests'], stats['connections']) == (4, 1)
+    finally:
+        client.close()
+
+
+def test_concurrency_limit_bounds_requests_and_connections(backend):
+    client = AsyncTranslationClient(backend.url, max_concurrency=2)
+    try:
+        start = time.perf_counter()
+        results = client.run(client.translate_many(['a', 'b', 'c', 'd', 'e', 'f'], 'en', 'hi'))
+        elapsed = time.perf_counter() - start
+        assert results == [f'[hi] {text}' for text in 'abcdef']
+        # Six 50ms requests, two at a time, over no more than two connections
+        assert elapsed >= 0.15
+        assert backend.stats.snapshot()['connections'] <= 2
+        assert client.stats()['in_flight'] == 0
+    finally:
+        client.close()
+
+
+@pytest.fixture
+def process_client(monkeypatch, backend):
+    monkeypatch.setenv('TRANSLATE_BACKEND_URL', backend.url)
+    monkeypatch.setattr(translation_client, '_client', None)
+    monkeypatch.setattr(translation_client, '_client_pid', None)
+    created = []
+    monkeypatch.setattr(translation_client, 'AsyncTranslationClient',
+                        lambda **options: created.append(AsyncTranslationClient(**options)) or created[-1])
+    yield created
+    for client in created:
+        client.close()
+
+
+def test_process_client_is_reused(process_client):
+    client = translation_client.get_translation_client()
+    assert translation_client.get_translation_client() is client
+    assert client.run(client.translate('hello', 'en', 'hi')) == '[hi] hello'
+    assert translation_client.translation_client_stats()['requests'] == 1
+    assert len(process_client) == 1
+
+
+def test_forked_process_gets_its_own_client(monkeypatch, process_client):
+    parent = translation_client.get_translation_client()
+    parent_pid = os.getpid()
+    # A forked worker inherits the parent's client, but not its event loop thread
+    monkeypatch.setattr(translation_client.os, 'getpid', lambda: parent_pid + 1)
+    assert translation_client.translation_client_stats() is None
+    assert translation_client.translation_error_rate() == 0.0
+
+    child = translation_client.get_translation_client()
+    assert child is not parent
+    assert translation_client.get_translation_client() is child
+    assert child.run(child.translate('hello', 'en', 'hi')) == '[hi] hello'
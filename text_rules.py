@@ -0,0 +1,141 @@
+import re
+
+# Translation clean-up passes, in order; later passes see the output of
+# earlier ones (a trailing "12" is gone before "Page 12" could match a header),
+# which is why they are not fused into one alternation: that changes the output
+_TRANSLATION_CLEANUP = (
+    (re.compile(r'\n\s*\n\s*\n+'), '\n\n'),                # runs of blank lines
+    (re.compile(r' +'), ' '),                               # repeated spaces
+    (re.compile(r'\b\d+\s*$', re.MULTILINE), ''),           # page numbers at the end of a line
+    (re.compile(r'^Page \d+.*$', re.MULTILINE), ''),       # "Page 3 of 10" header lines
+)
+
+
+def clean_for_translation(text):
+    """Strip page furniture and normalise whitespace before translation"""
+    for pattern, replacement in _TRANSLATION_CLEANUP:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def escape_markup(text):
+    """Escape text for ReportLab paragraph markup
+
+    Chained str.replace calls beat a fused regex with per-match dispatch
+    and str.translate on multi-MB text; see benchmarks/bench_text_rules.py.
+    """
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def trie_pattern(words):
+    """Regex source matching any of the words, factored into a character trie
+
+    Alternatives at each node start with distinct characters, so the regex
+    engine walks the trie like an Aho-Corasick goto function instead of
+    retrying every word at every position.
+    """
+    root = {}
+    for word in words:
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node):
+        is_word = '' in node
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not is_word:
+            return branches[0]
+        group = '(?:' + '|'.join(branches) + ')'
+        return group + '?' if is_word else group
+
+    return emit(root)
+
+
+class KeywordSet:
+    """A keyword list compiled into a single trie-shaped pattern"""
+
+    def __init__(self, words):
+        self.words = tuple(words)
+        self._pattern = re.compile(trie_pattern(self.words)) if self.words else None
+
+    def search(self, text):
+        """True if any keyword occurs in the text"""
+        return self._pattern is not None and self._pattern.search(text) is not None
+
+    def find_all(self, text):
+        """Every keyword occurrence as (offset, keyword), leftmost-longest and non-overlapping"""
+        if self._pattern is None:
+            return []
+        return [(match.start(), match.group()) for match in self._pattern.finditer(text)]
+
+
+class LanguageRules:
+    """How text in one script is laid out for ReportLab
+
+    With verse layout, text containing any character of the script keeps
+    its line breaks, with blank lines dropped, and lines containing one of
+    the emphasis words are wrapped in the emphasis tag. Otherwise every line
+    break, blank lines included, becomes a <br/>.
+    """
+
+    def __init__(self, name, script_ranges, emphasis_words=(), emphasis_tag='i', verse=True):
+        self.name = name
+        self.verse = verse
+        self.script_ranges = script_ranges
+        self.emphasis = KeywordSet(emphasis_words)
+        self.emphasis_tag = emphasis_tag
+        self._script = re.compile('[' + ''.join(f'\\u{low:04x}-\\u{high:04x}' for low, high in script_ranges) + ']')
+
+    def applies_to(self, text):
+        return self._script.search(text) is not None
+
+    def format(self, escaped_text):
+        """Markup for already-escaped text"""
+        if not self.verse:
+            return escaped_text.replace('\n', '<br/>')
+        open_tag, close_tag = f'<{self.emphasis_tag}>', f'</{self.emphasis_tag}>'
+        formatted_lines = []
+        for line in escaped_text.split('\n'):
+            line = line.strip()
+            if line:
+                formatted_lines.append(f"{open_tag}{line}{close_tag}" if self.emphasis.search(line) else line)
+        return '<br/>'.join(formatted_lines)
+
+
+class RulesEngine:
+    """Per-language text post-processing; the first rule set whose script appears wins"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+    def rules_for(self, text):
+        for rules in self.rules:
+            if rules.applies_to(text):
+                return rules
+        return None
+
+    def format_for_pdf(self, text):
+        """Escape text for ReportLab and apply the matching language's layout rules"""
+        rules = self.rules_for(text)
+        if rules is None:
+            return escape_markup(text).replace('\n', '<br/>')
+        return rules.format(escape_markup(text))
+
+
+# Words that mark a line as verse, for the poetic layout of Telugu
+TELUGU_POETIC_WORDS = (
+    'చైతన్య', 'ఆశలు', 'భావనలు', 'కలలకే', 'విజయం', 'మనసు',
+    'ఆకాశాన్ని', 'మార్గమై', 'కృషి', 'గెలిచిన', 'పుట్టిన', 'నూతన',
+    'మధుర', 'తాకే', 'పల్లకిగా', 'ఆరోహణ', 'సాగిపోవాలి', 'మొదలవుతుంది',
+)
+
+# Checked in order, so text mixing Telugu and Devanagari gets the Telugu layout
+LANGUAGE_RULES = [
+    LanguageRules('te', [(0x0C00, 0x0C7E)], TELUGU_POETIC_WORDS),
+    LanguageRules('hi', [(0x0900, 0x097F)], verse=False),
+]
+
+default_engine = RulesEngine(LANGUAGE_RULES)
@@ -0,0 +1,151 @@
+import contextlib
+import threading
+import time
+
+
+class JobTrace:
+    """Span timeline of one job, from upload to the history write
+
+    Spans are recorded with their start offset and duration in ms from the
+    start of the job. A span opened while another is open on the same
+    thread becomes its child; work finished on other threads (chunk
+    requests on the translation client's loop) names its parent
+    explicitly. The trace is JSON-serializable, so a queued job carries
+    it to the host that runs it.
+    """
+
+    # Bounds the stored timeline of very large documents (per-page and per-chunk spans)
+    MAX_SPANS = 2000
+
+    def __init__(self, started_at=None, spans=None, dropped=0):
+        # Wall-clock start; offsets are measured with perf_counter from the matching point
+        self.started_at = started_at if started_at is not None else time.time()
+        self._origin = time.perf_counter() - (time.time() - self.started_at)
+        self.spans = list(spans or [])
+        self.dropped = dropped
+        self._next_id = max((span['id'] for span in self.spans), default=0) + 1
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(started_at=data['started_at'], spans=data['spans'], dropped=data.get('dropped', 0))
+
+    def _new_id(self):
+        with self._lock:
+            span_id = self._next_id
+            self._next_id += 1
+            return span_id
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self):
+        """Id of the innermost span open on this thread, or None"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """Record the enclosed code as a span; yields its attribute dict, which may be extended"""
+        span_id = self._new_id()
+        parent = self.current()
+        stack = self._stack()
+        stack.append(span_id)
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs['error'] = type(e).__name__
+            raise
+        finally:
+            stack.pop()
+            self.record(name, start, time.perf_counter(), parent=parent, span_id=span_id, **attrs)
+
+    def record(self, name, start, end, parent=None, span_id=None, **attrs):
+        """Add a span measured elsewhere; start and end are time.perf_counter() values"""
+        span = {
+            'id': span_id if span_id is not None else self._new_id(),
+            'name': name,
+            'start_ms': round((start - self._origin) * 1000, 2),
+            'duration_ms': round((end - start) * 1000, 2),
+        }
+        if parent is not None:
+            span['parent'] = parent
+        if attrs:
+            span['attrs'] = attrs
+        with self._lock:
+            # Past the limit only nested spans are dropped; the top-level stages stay complete
+            if len(self.spans) >= self.MAX_SPANS and parent is not None:
+                self.dropped += 1
+                return
+            self.spans.append(span)
+
+    def total_ms(self):
+        """Milliseconds from the start of the job to the end of its last span"""
+        with self._lock:
+            return round(max((span['start_ms'] + span['duration_ms'] for span in self.spans), default=0.0), 2)
+
+    def stage_ms(self):
+        """Total duration of each top-level stage"""
+        stages = {}
+        with self._lock:
+            for span in self.spans:
+                if 'parent' not in span:
+                    stages[span['name']] = round(stages.get(span['name'], 0.0) + span['duration_ms'], 2)
+        return stages
+
+    def critical_path(self, min_fraction=0.01):
+        """The chain of spans that determined the job's wall time, outermost first
+
+        Among siblings, the path is walked back from the span that ended
+        last to the latest one that ended before it started, and so on;
+        of chunks running in parallel this picks the slowest. Each span on
+        the path is followed by the critical path of its children. Nested
+        spans shorter than min_fraction of the job are left out, so a
+        500-page extraction does not list every page.
+        """
+        threshold = self.total_ms() * min_fraction
+        with self._lock:
+            spans = list(self.spans)
+        children = {}
+        for span in spans:
+            children.setdefault(span.get('parent'), []).append(span)
+
+        def walk(siblings, depth):
+            chain = []
+            cursor = None
+            for span in sorted(siblings, key=lambda s: s['start_ms'] + s['duration_ms'], reverse=True):
+                end = span['start_ms'] + span['duration_ms']
+                if cursor is None or end <= cursor + 0.01:
+                    chain.append(span)
+                    cursor = span['start_ms']
+            path = []
+            for span in reversed(chain):
+                if depth and span['duration_ms'] < threshold:
+                    continue
+                entry = {'name': span['name'], 'start_ms': span['start_ms'], 'duration_ms': span['duration_ms'],
+                         'depth': depth}
+                if 'attrs' in span:
+                    entry['attrs'] = span['attrs']
+                path.append(entry)
+                path.extend(walk(children.get(span['id'], []), depth + 1))
+            return path
+
+        return walk(children.get(None, []), 0)
+
+    def to_dict(self):
+        with self._lock:
+            return {'started_at': self.started_at, 'spans': list(self.spans), 'dropped': self.dropped}
+
+
+@contextlib.contextmanager
+def traced(trace, name, **attrs):
+    """trace.span(), or nothing when the job is not traced"""
+    if trace is None:
+        yield attrs
+        return
+    with trace.span(name, **attrs) as span_attrs:
+        yield span_attrs
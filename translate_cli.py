@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Headless bulk translator for directories of PDFs.
+Uses the same PDFProcessor extraction, translation and rendering code as the
+web app, without Flask, sessions or upload size limits.
+
+    python translate_cli.py ./contracts --source en --target hi --workers 4
+    python translate_cli.py "archive/**/*.pdf" -s en -t te -o translated/
+    python translate_cli.py ./inbox -s auto -t en
+"""
+
+import argparse
+import glob
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from languages import LANGUAGES
+
+# One processor per worker process so fonts are registered only once
+_processor = None
+
+
+def _init_worker(log_level):
+    global _processor
+    logging.basicConfig(level=log_level)
+    from pdf_processor import PDFProcessor
+    _processor = PDFProcessor()
+
+
+def output_path_for(relative_path, output_dir, target_lang):
+    """Translated file path for an input PDF, given its path relative to the input root"""
+    stem = os.path.splitext(relative_path)[0]
+    return os.path.join(output_dir, f"{stem}_{target_lang}.pdf")
+
+
+def is_up_to_date(input_path, output_path):
+    """True if the output exists and is newer than its input"""
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+
+
+def translate_file(input_path, output_path, source_lang, target_lang, compact=True):
+    """Translate one PDF in a worker process and return its stats"""
+    start_time = time.perf_counter()
+    result = {'input': input_path, 'output': output_path, 'pages': 0, 'chars': 0}
+    temp_path = output_path + '.tmp'
+    try:
+        pages = _processor.extract_pages(input_path)
+        text_content = _processor.join_pages(pages)
+        result['pages'] = len(pages)
+        result['chars'] = len(text_content)
+        if not text_content.strip():
+            result['status'] = 'empty'
+            return result
+
+        sections = None
+        if source_lang == 'auto':
+            from lang_detect import detect_pages, summarize_detections
+            source_lang, _, page_languages = summarize_detections(detect_pages(pages), pages)
+            if source_lang is None:
+                raise ValueError('Could not detect the language of the document')
+            result['language'] = source_lang
+            sections = _processor.language_sections(pages, page_languages)
+        # Paragraph-level translation keeps image markers out of backend requests
+        translated_text = _processor.translate_incremental(text_content, source_lang, target_lang, sections=sections)[0]
+
+        # Render to a temp name so an interrupted run never leaves a "fresh" partial output
+        _processor.create_pdf(translated_text, temp_path, os.path.basename(input_path), target_lang,
+                              source_pdf=input_path)
+        if compact:
+            compaction = _processor.compact_pdf(temp_path)
+            result['bytes_before'] = compaction['bytes_before']
+            result['bytes_after'] = compaction['bytes_after']
+        os.replace(temp_path, output_path)
+        result['status'] = 'translated'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    finally:
+        result['seconds'] = time.perf_counter() - start_time
+    return result
+
+
+def input_root(pattern):
+    """Directory that matches of an input are made relative to: the input directory,
+    the leading part of a glob pattern without wildcards, or a single file's directory"""
+    if os.path.isdir(pattern):
+        return pattern
+    if not glob.has_magic(pattern):
+        return os.path.dirname(pattern) or os.curdir
+    parts = []
+    for part in os.path.normpath(pattern).split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or (os.sep if parts else os.curdir)
+
+
+def collect_inputs(patterns, recursive):
+    """Expand directories and glob patterns into a sorted list of (PDF path, path relative to its input)"""
+    paths = {}
+    for pattern in patterns:
+        root = input_root(pattern)
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '**', '*.pdf') if recursive else os.path.join(pattern, '*.pdf')
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isfile(path) and path.lower().endswith('.pdf'):
+                paths.setdefault(path, os.path.relpath(path, root))
+    return sorted(paths.items())
+
+
+def positive_int(value):
+    """argparse type for counts that must be at least 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='Input directories, files or glob patterns')
+    parser.add_argument('-s', '--source', required=True, help="Source language code, or 'auto' to detect it per page")
+    parser.add_argument('-t', '--target', required=True, help='Target language code')
+    # Not downloads/: the web app's artifact store evicts files there under its quota
+    parser.add_argument('-o', '--output-dir', default='translated', help='Directory for translated PDFs')
+    parser.add_argument('-w', '--workers', type=positive_int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('-r', '--recursive', action='store_true', help='Recurse into input directories')
+    parser.add_argument('--no-compact', action='store_true', help='Skip the post-render compaction pass')
+    parser.add_argument('-f', '--force', action='store_true', help='Re-translate up-to-date outputs')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if args.source != 'auto' and args.source not in LANGUAGES:
+        parser.error(f"Unsupported source language '{args.source}' (choose from auto, {', '.join(LANGUAGES)})")
+    if args.target not in LANGUAGES:
+        parser.error(f"Unsupported target language '{args.target}' (choose from {', '.join(LANGUAGES)})")
+    if args.source == args.target:
+        parser.error('Source and target languages cannot be the same')
+
+    inputs = collect_inputs(args.inputs, args.recursive)
+    if not inputs:
+        print("No PDF files found")
+        return 1
+
+    targets = {}
+    for input_path, relative_path in inputs:
+        targets.setdefault(output_path_for(relative_path, args.output_dir, args.target), []).append(input_path)
+    collisions = {output: sources for output, sources in targets.items() if len(sources) > 1}
+    if collisions:
+        for output, sources in sorted(collisions.items()):
+            print(f"{output} would be written by: {', '.join(sources)}", file=sys.stderr)
+        parser.error('Several inputs map to the same output file; translate them in separate runs')
+
+    jobs = []
+    skipped = 0
+    for output_path, (input_path,) in targets.items():
+        os.makedirs(os.path.dirname(output_path) or os.curdir, exist_ok=True)
+        if not args.force and is_up_to_date(input_path, output_path):
+            skipped += 1
+        else:
+            jobs.append((input_path, output_path))
+
+    print(f"Found {len(inputs)} PDF(s): {len(jobs)} to translate, {skipped} up to date")
+    if not jobs:
+        return 0
+
+    log_level = logging.DEBUG if args.verbose else logging.WARNING
+    totals = {'translated': 0, 'failed': 0, 'empty': 0, 'pages': 0, 'chars': 0,
+              'bytes_before': 0, 'bytes_after': 0}
+    start_time = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(log_level,)) as pool:
+        futures = [
+            pool.submit(translate_file, input_path, output_path, args.source, args.target, not args.no_compact)
+            for input_path, output_path in jobs
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # translate_file reports its own errors, so this is a worker that failed to start or crashed
+                for pending in futures:
+                    pending.cancel()
+                print("Error: a worker process failed to start or died (missing dependency or fonts?); "
+                      "see the log above", file=sys.stderr)
+                return 2
+            totals[result['status']] += 1
+            totals['pages'] += result['pages']
+            totals['chars'] += result['chars']
+            totals['bytes_before'] += result.get('bytes_before', 0)
+            totals['bytes_after'] += result.get('bytes_after', 0)
+            line = f"[{done}/{len(jobs)}] {result['status']:<10} {result['input']} ({result['seconds']:.1f}s)"
+            if result['status'] == 'failed':
+                line += f": {result['error']}"
+            print(line)
+
+    elapsed = time.perf_counter() - start_time
+    processed = totals['translated'] + totals['empty'] + totals['failed']
+    print("\nSummary")
+    print(f"  translated: {totals['translated']}  failed: {totals['failed']}  "
+          f"no text: {totals['empty']}  skipped: {skipped}")
+    print(f"  elapsed:    {elapsed:.1f}s with {args.workers} worker(s)")
+    print(f"  throughput: {processed / elapsed:.2f} files/s, {totals['pages'] / elapsed:.1f} pages/s, "
+          f"{totals['chars'] / elapsed:.0f} chars/s")
+    if totals['bytes_before']:
+        saved = totals['bytes_before'] - totals['bytes_after']
+        print(f"  compaction: {totals['bytes_before']} -> {totals['bytes_after']} bytes "
+              f"({100.0 * saved / totals['bytes_before']:.1f}% smaller)")
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
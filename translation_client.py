@@ -0,0 +1,320 @@
+import asyncio
+import collections
+import logging
+import os
+import threading
+import time
+
+import httpx
+
+from micro_batch import MicroBatcher
+
+
+class RequestSkipped(Exception):
+    """A queued chunk that was never sent because its job was stopped"""
+
+
+class AsyncTranslationClient:
+    """Pooled keep-alive HTTP translation client running on its own event loop
+
+    One instance is shared per worker process (see get_translation_client).
+    Requests from any thread are scheduled onto the client's loop, so many
+    chunks can be awaited concurrently over a small set of reused connections.
+    With a batch window, small chunks from concurrent jobs share requests
+    (see MicroBatcher).
+
+    base_url may list several backends, comma-separated: failed requests
+    fail over to the next one in order. With a hedge percentile, a request
+    still running after that percentile of recent latencies is duplicated
+    to the next backend and the first response wins. A hedge takes a
+    connection slot of its own and is only sent when one is free, so
+    max_concurrency bounds hedged requests too.
+    """
+
+    # Successful requests needed before the latency percentile is trusted for hedging
+    HEDGE_MIN_SAMPLES = 20
+
+    def __init__(self, base_url, max_connections=20, max_keepalive=10, keepalive_expiry=30.0,
+                 timeout=30.0, max_concurrency=8, batch_window=0.0, batch_max_chars=4500,
+                 hedge_percentile=0, hedge_min_delay=0.05, hedge_budget=0.1):
+        urls = base_url.split(',') if isinstance(base_url, str) else base_url
+        self.base_urls = [url.strip().rstrip('/') for url in urls if url.strip()]
+        self.base_url = self.base_urls[0]
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_budget = hedge_budget
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='translation-client', daemon=True)
+        self._thread.start()
+        self._client = None
+        self._semaphore = None
+        self._batcher = None
+        if batch_window > 0:
+            self._batcher = MicroBatcher(self._send, window=batch_window, max_chars=batch_max_chars,
+                                         skip_error=RequestSkipped)
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+        # Metrics
+        self.requests = 0
+        self.errors = 0
+        self.skipped = 0
+        self.in_flight = 0
+        self.total_latency = 0.0
+        self.hedges = 0
+        self.hedges_skipped = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.backend_stats = {url: {'requests': 0, 'errors': 0} for url in self.base_urls}
+        # (finish time, succeeded) of recent requests, for backend health
+        self.recent = collections.deque(maxlen=200)
+        # Latencies of recent successful requests, for the hedge delay
+        self.latencies = collections.deque(maxlen=500)
+
+    async def _start(self):
+        self._client = httpx.AsyncClient(timeout=self.timeout, **self._pool_options())
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _pool_options(self):
+        """Connection pool settings for both current and googletrans-pinned httpx"""
+        if hasattr(httpx, 'Limits'):
+            return {'limits': httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry
+            )}
+        # httpx 0.13 (pinned by googletrans 4.0.0rc1) has no keep-alive expiry setting
+        return {'pool_limits': httpx.PoolLimits(soft_limit=self.max_keepalive, hard_limit=self.max_connections)}
+
+    async def translate(self, text, source_lang, target_lang, should_stop=None):
+        """Translate a single chunk of text
+
+        should_stop is checked once a connection slot is free, so chunks
+        still queued behind the concurrency limit are dropped when a job stops.
+        """
+        if self._batcher is not None and self._batcher.accepts(text):
+            return await self._batcher.translate(text, source_lang, target_lang, should_stop=should_stop)
+        return await self._send(text, source_lang, target_lang, should_stop=should_stop)
+
+    async def _send(self, text, source_lang, target_lang, should_stop=None):
+        """One logical backend request, holding a connection slot; hedged and failed over as needed"""
+        async with self._semaphore:
+            if should_stop is not None and should_stop():
+                self.skipped += 1
+                raise RequestSkipped()
+            return await self._hedged(text, source_lang, target_lang)
+
+    async def _hedged(self, text, source_lang, target_lang):
+        """Send to the backends in order; if that is slower than the hedge delay, race a duplicate
+
+        The duplicate starts at the next backend in the list (the same one if
+        only one is configured) and the first successful response wins; the
+        slower request is cancelled. The caller holds the primary's connection
+        slot; the duplicate needs a second one and is skipped when none is free.
+        """
+        primary = asyncio.ensure_future(self._failover(text, source_lang, target_lang, 0))
+        attempts = [primary]
+        try:
+            delay = self.hedge_delay()
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if done or not self._hedge_allowed():
+                return await primary
+            if self._semaphore.locked():
+                # Every slot is busy (or chunks are queued for one): hedging would exceed the limit
+                self.hedges_skipped += 1
+                return await primary
+
+            self.hedges += 1
+            await self._semaphore.acquire()
+            hedge = asyncio.ensure_future(self._failover(text, source_lang, target_lang, 1))
+            # Released however the hedge ends, including cancellation before it starts
+            hedge.add_done_callback(lambda _: self._semaphore.release())
+            attempts.append(hedge)
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is hedge:
+                            self.hedge_wins += 1
+                        return attempt.result()
+                    error = attempt.exception()
+            raise error
+        finally:
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
+                elif not attempt.cancelled():
+                    attempt.exception()  # a losing attempt's error is expected, not "never retrieved"
+
+    async def _failover(self, text, source_lang, target_lang, start):
+        """Try each backend once, in configured order from start; raises the last error"""
+        error = None
+        for offset in range(len(self.base_urls)):
+            if offset:
+                self.failovers += 1
+            try:
+                return await self._post(self.base_urls[(start + offset) % len(self.base_urls)],
+                                        text, source_lang, target_lang)
+            except Exception as e:
+                error = e
+        raise error
+
+    async def _post(self, base_url, text, source_lang, target_lang):
+        """One HTTP request to one backend"""
+        backend = self.backend_stats[base_url]
+        self.in_flight += 1
+        start_time = time.perf_counter()
+        try:
+            response = await self._client.post(
+                f"{base_url}/translate_a/single",
+                params={'client': 'gtx', 'sl': source_lang, 'tl': target_lang, 'dt': 't'},
+                data={'q': text}
+            )
+            response.raise_for_status()
+            data = response.json()
+            latency = time.perf_counter() - start_time
+            self.requests += 1
+            self.total_latency += latency
+            self.latencies.append(latency)
+            self.recent.append((time.monotonic(), True))
+            backend['requests'] += 1
+            # Stripped like the pieces of a packed request, so a chunk reads the same batched or not
+            return ''.join(segment[0] for segment in data[0] if segment and segment[0]).strip()
+        except Exception:
+            self.errors += 1
+            self.recent.append((time.monotonic(), False))
+            backend['errors'] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def latency_percentile(self, percentile):
+        """Latency in seconds below which the given percentage of recent successful requests finished"""
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100.0))]
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None while hedging is off or latency history is thin"""
+        if not self.hedge_percentile or len(self.latencies) < self.HEDGE_MIN_SAMPLES:
+            return None
+        return max(self.hedge_min_delay, self.latency_percentile(self.hedge_percentile))
+
+    def _hedge_allowed(self):
+        # Hedges are capped at a share of all requests so a slow backend is not hit twice as hard
+        return self.hedges < self.hedge_budget * max(self.requests, self.HEDGE_MIN_SAMPLES)
+
+    async def translate_many(self, texts, source_lang, target_lang, on_result=None, should_stop=None, on_span=None):
+        """Translate chunks concurrently, returning results (or exceptions) in order
+
+        on_span(index, start, end, result) receives each chunk's perf_counter
+        start and end, including time spent waiting for a connection slot,
+        in a batch window, on hedges and on failover.
+        """
+        async def run(index, text):
+            start = time.perf_counter()
+            try:
+                result = await self.translate(text, source_lang, target_lang, should_stop=should_stop)
+            except Exception as e:
+                result = e
+            if on_span is not None:
+                on_span(index, start, time.perf_counter(), result)
+            if on_result is not None:
+                on_result(index, result)
+            return result
+
+        return await asyncio.gather(*(run(i, text) for i, text in enumerate(texts)))
+
+    def error_rate(self, window=60.0):
+        """Share of failed requests among those finished within the last window seconds"""
+        cutoff = time.monotonic() - window
+        outcomes = [ok for finished, ok in list(self.recent) if finished >= cutoff]
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def run(self, coro):
+        """Run a coroutine on the client's event loop from synchronous code"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self):
+        """Close pooled connections and stop the event loop"""
+        if self._client is not None:
+            self.run(self._client.aclose())
+            self._client = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    def stats(self):
+        """Return request counters and latency"""
+        p50, p99, hedge_delay = self.latency_percentile(50), self.latency_percentile(99), self.hedge_delay()
+        return {
+            'base_url': self.base_url,
+            'backends': {url: dict(counts) for url, counts in self.backend_stats.items()},
+            'requests': self.requests,
+            'errors': self.errors,
+            'skipped': self.skipped,
+            'in_flight': self.in_flight,
+            'error_rate_60s': round(self.error_rate(), 3),
+            'avg_latency_ms': round(self.total_latency * 1000 / self.requests, 2) if self.requests else 0.0,
+            'p50_latency_ms': round(p50 * 1000, 2) if p50 is not None else None,
+            'p99_latency_ms': round(p99 * 1000, 2) if p99 is not None else None,
+            'hedge_delay_ms': round(hedge_delay * 1000, 2) if hedge_delay is not None else None,
+            'hedges': self.hedges,
+            'hedges_skipped': self.hedges_skipped,
+            'hedge_wins': self.hedge_wins,
+            'failovers': self.failovers,
+            'max_connections': self.max_connections,
+            'max_keepalive': self.max_keepalive,
+            'batching': self._batcher.stats() if self._batcher is not None else None,
+        }
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_translation_client():
+    """Return the process-wide translation client, creating it after fork if needed"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = AsyncTranslationClient(
+                base_url=os.environ.get('TRANSLATE_BACKEND_URL', 'https://translate.googleapis.com'),
+                max_connections=int(os.environ.get('TRANSLATE_MAX_CONNECTIONS', 20)),
+                max_keepalive=int(os.environ.get('TRANSLATE_MAX_KEEPALIVE', 10)),
+                keepalive_expiry=float(os.environ.get('TRANSLATE_KEEPALIVE_EXPIRY', 30)),
+                timeout=float(os.environ.get('TRANSLATE_TIMEOUT', 30)),
+                max_concurrency=int(os.environ.get('TRANSLATE_CONCURRENCY', 8)),
+                batch_window=float(os.environ.get('TRANSLATE_BATCH_WINDOW_MS', 0)) / 1000,
+                batch_max_chars=int(os.environ.get('TRANSLATE_BATCH_MAX_CHARS', 4500)),
+                hedge_percentile=float(os.environ.get('TRANSLATE_HEDGE_PERCENTILE', 0)),
+                hedge_min_delay=float(os.environ.get('TRANSLATE_HEDGE_MIN_MS', 50)) / 1000,
+                hedge_budget=float(os.environ.get('TRANSLATE_HEDGE_BUDGET', 0.1))
+            )
+            _client_pid = os.getpid()
+            logging.info(f"Created pooled translation client for {', '.join(_client.base_urls)}")
+        return _client
+
+
+def translation_client_stats():
+    """Return stats for this process's client without creating one"""
+    if _client is None or _client_pid != os.getpid():
+        return None
+    return _client.stats()
+
+
+def translation_error_rate():
+    """Recent error rate of this process's client (0.0 before it exists)"""
+    if _client is None or _client_pid != os.getpid():
+        return 0.0
+    return _client.error_rate()